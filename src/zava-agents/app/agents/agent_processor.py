@@ -4,6 +4,7 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from typing import List, Callable, Set, Any, Dict
 from azure.ai.projects.models import FunctionTool
+from openai import NotFoundError
 from openai.types.responses.response_input_param import (
     FunctionCallOutput,
     ResponseInputParam,
@@ -18,20 +19,14 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 from app.servers.mcp_inventory_client import MCPShopperToolsClient
 
 from opentelemetry import trace
-from azure.monitor.opentelemetry import configure_azure_monitor
 from azure.ai.agents.telemetry import trace_function
 import asyncio
+import threading
 from concurrent.futures import ThreadPoolExecutor
 import time
 
-from opentelemetry.instrumentation.openai_v2 import OpenAIInstrumentor
-
-# # Enable Azure Monitor tracing
-application_insights_connection_string = os.environ[
-    "APPLICATIONINSIGHTS_CONNECTION_STRING"
-]
-configure_azure_monitor(connection_string=application_insights_connection_string)
-OpenAIInstrumentor().instrument()
+from utils.telemetry_utils import configure_telemetry
+from services.conversation_registry import ConversationNotFoundError
 
 # scenario = os.path.basename(__file__)
 # tracer = trace.get_tracer(__name__)
@@ -129,6 +124,32 @@ def mcp_calculate_discount(customer_id: str) -> str:
     return loop.run_until_complete(_calculate())
 
 
+def mcp_find_similar_paint_colors(colors: str, count: int = 3) -> list:
+    """
+    Find the Zava paints closest to the given colors using MCP client.
+
+    Args:
+        colors (str): Comma-separated hex codes or color names.
+        count (int): Matching paints per color.
+
+    Returns:
+        list: For each color, the closest paints with name, hex code, ProductID and delta_e.
+    """
+
+    async def _find_similar():
+        mcp_client = await get_mcp_client(_mcp_server_url)
+        return await mcp_client.find_similar_paint_colors(colors, count)
+
+    # Run async function in event loop
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+    return loop.run_until_complete(_find_similar())
+
+
 # Create wrapper function that uses MCP client
 def mcp_inventory_check(product_list: List[str]) -> list:
     """
@@ -164,14 +185,30 @@ def mcp_inventory_check(product_list: List[str]) -> list:
 
 
 class AgentProcessor:
-    def __init__(self, project_client, assistant_id, agent_type: str, thread_id=None):
-        self.project_client = project_client
-        self.agent_id = assistant_id
-        self.agent_type = agent_type
-        self.thread_id = thread_id
+    """
+    Runs turns of one Foundry agent.
+
+    Processors are cached and shared by all sessions using the agent (see
+    services/agent_service.py), so a processor only holds what they share,
+    fixed at creation: the project client, the agent reference and the
+    toolset. Per-request state, the session's conversation, is passed to
+    each call; setting attributes afterwards raises AttributeError.
+    """
 
+    def __init__(self, project_client, assistant_id, agent_type: str):
+        # Enable Azure Monitor tracing (once per process, i.e. once per worker)
+        configure_telemetry()
+        object.__setattr__(self, "project_client", project_client)
+        object.__setattr__(self, "agent_id", assistant_id)
+        object.__setattr__(self, "agent_type", agent_type)
         # Use cached toolset or create new one
-        self.toolset = self._get_or_create_toolset(agent_type)
+        object.__setattr__(self, "toolset", tuple(self._get_or_create_toolset(agent_type)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(
+            f"AgentProcessor is shared between sessions, cannot set {name!r}: "
+            "pass per-request state (the conversation) to the call instead"
+        )
 
     def _get_or_create_toolset(self, agent_type: str) -> List[FunctionTool]:
         """Get cached toolset or create new one to avoid repeated initialization."""
@@ -184,25 +221,47 @@ class AgentProcessor:
         _toolset_cache[agent_type] = functions
         return functions
 
-    def run_conversation_with_text(self, input_message: str = ""):
+    def _add_user_message(self, openai_client, input_message: str, conversation=None) -> str:
+        """
+        Add the user message to the turn's conversation and return its id.
+
+        With a ``conversation`` (an AgentConversation of the session, see
+        services/conversation_registry.py) the message is appended to it, and
+        it is created on the first turn; without one every turn starts a new
+        conversation. Only the caller's own ``conversation`` is updated.
+
+        Raises:
+            ConversationNotFoundError: The conversation is gone on the server
+                (404). ``conversation`` is reset; ``input_message`` only holds
+                what the agent had not seen, so the caller rebuilds the full
+                context and runs the turn again.
+        """
+        conversation_id = conversation.conversation_id if conversation is not None else None
+        if conversation_id:
+            try:
+                openai_client.conversations.items.create(
+                    conversation_id=conversation_id,
+                    items=[
+                        {"type": "message", "role": "user", "content": input_message}
+                    ],
+                )
+            except NotFoundError as e:
+                print(f"[WARNING] Conversation {conversation_id} not found, starting over: {str(e)}")
+                conversation.reset()
+                raise ConversationNotFoundError(conversation_id) from e
+            return conversation_id
+        new_conversation = openai_client.conversations.create(
+            items=[{"role": "user", "content": input_message}]
+        )
+        if conversation is not None:
+            conversation.conversation_id = new_conversation.id
+        return new_conversation.id
+
+    def run_conversation_with_text(self, input_message: str = "", conversation=None):
         print("Running async!")
         start_time = time.time()
         openai_client = self.project_client.get_openai_client()
-        thread_id = self.thread_id
-        if thread_id:
-            conversation = openai_client.conversations.retrieve(
-                conversation_id=thread_id
-            )
-            openai_client.conversations.items.create(
-                conversation_id=thread_id,
-                items=[{"type": "message", "role": "user", "content": input_message}],
-            )
-        else:
-            conversation = openai_client.conversations.create(
-                items=[{"role": "user", "content": input_message}]
-            )
-            thread_id = conversation.id
-            self.thread_id = thread_id
+        thread_id = self._add_user_message(openai_client, input_message, conversation)
         print(f"[TIMELOG] Message creation took: {time.time() - start_time:.2f}s")
         messages = openai_client.responses.create(
             conversation=thread_id,
@@ -216,34 +275,46 @@ class AgentProcessor:
             f"[TIMELOG] Total run_conversation_with_text time: {time.time() - start_time:.2f}s"
         )
 
-    def _run_conversation_sync(self, input_message: str = ""):
+    def _execute_function_calls(self, output) -> ResponseInputParam:
+        """Execute the function calls requested in a response and collect their outputs."""
+        input_list: ResponseInputParam = []
+        for item in output:
+            if item.type == "function_call":
+                # Perform the function call first, then extract final text value below
+                if item.name == "mcp_create_image":
+                    func_result = mcp_create_image(**json.loads(item.arguments))
+                elif item.name == "mcp_product_recommendations":
+                    func_result = mcp_product_recommendations(
+                        **json.loads(item.arguments)
+                    )
+                elif item.name == "mcp_calculate_discount":
+                    func_result = mcp_calculate_discount(**json.loads(item.arguments))
+                elif item.name == "mcp_inventory_check":
+                    func_result = mcp_inventory_check(**json.loads(item.arguments))
+                elif item.name == "mcp_find_similar_paint_colors":
+                    func_result = mcp_find_similar_paint_colors(**json.loads(item.arguments))
+                else:
+                    func_result = f"Unknown function: {item.name}"
+                print(f"[DEBUG] Function {item.name} executed with result: {func_result}")
+
+                input_list.append(
+                    FunctionCallOutput(
+                        type="function_call_output",
+                        call_id=item.call_id,
+                        output=json.dumps({"result": func_result}),
+                    )
+                )
+        return input_list
+
+    def _run_conversation_sync(self, input_message: str = "", conversation=None):
         """Optimized synchronous conversation runner with better error handling."""
-        thread_id = self.thread_id
         start_time = time.time()
         print("Running sync!")
 
         try:
             openai_client = self.project_client.get_openai_client()
             # Create message
-            if thread_id:
-                print(f"Using existing thread_id: {thread_id}")
-                conversation = openai_client.conversations.retrieve(
-                    conversation_id=thread_id
-                )
-                openai_client.conversations.items.create(
-                    conversation_id=thread_id,
-                    items=[
-                        {"type": "message", "role": "user", "content": input_message}
-                    ],
-                )
-            else:
-                print("Creating new conversation thread")
-                conversation = openai_client.conversations.create(
-                    items=[{"role": "user", "content": input_message}]
-                )
-                print("Conversation created:", conversation)
-                thread_id = conversation.id
-                self.thread_id = thread_id
+            thread_id = self._add_user_message(openai_client, input_message, conversation)
             print(f"[TIMELOG] Message creation took: {time.time() - start_time:.2f}s")
 
             # Message retrieval
@@ -266,37 +337,7 @@ class AgentProcessor:
                     "[DEBUG] No output text found in message. Looking for function calls."
                 )
                 # No output text, check for function calls
-                input_list: ResponseInputParam = []
-                for item in message.output:
-                    if item.type == "function_call":
-                        # Perform the function call first, then extract final text value below
-                        if item.name == "mcp_create_image":
-                            func_result = mcp_create_image(**json.loads(item.arguments))
-                        elif item.name == "mcp_product_recommendations":
-                            func_result = mcp_product_recommendations(
-                                **json.loads(item.arguments)
-                            )
-                        elif item.name == "mcp_calculate_discount":
-                            func_result = mcp_calculate_discount(
-                                **json.loads(item.arguments)
-                            )
-                        elif item.name == "mcp_inventory_check":
-                            func_result = mcp_inventory_check(
-                                **json.loads(item.arguments)
-                            )
-                        else:
-                            func_result = f"Unknown function: {item.name}"
-                        print(
-                            f"[DEBUG] Function {item.name} executed with result: {func_result}"
-                        )
-
-                        input_list.append(
-                            FunctionCallOutput(
-                                type="function_call_output",
-                                call_id=item.call_id,
-                                output=json.dumps({"result": func_result}),
-                            )
-                        )
+                input_list = self._execute_function_calls(message.output)
 
                 # Re-run response creation to get final text output after function calls
                 print(
@@ -333,26 +374,137 @@ class AgentProcessor:
             result = [str(content)]
             return result
 
+        except ConversationNotFoundError:
+            raise
         except Exception as e:
             print(f"[ERROR] Conversation failed: {str(e)}")
             return [f"Error processing message: {str(e)}"]
 
-    async def run_conversation_with_text_stream(self, input_message: str = ""):
-        """Async wrapper for conversation processing with better error handling."""
+    def _stream_conversation_sync(
+        self, input_message: str, emit, stop_event, conversation=None
+    ) -> None:
+        """
+        Stream a conversation turn, forwarding text deltas through ``emit``.
+
+        Runs in a worker thread. ``emit`` receives ``("delta", text)`` for every
+        output_text delta, then exactly one ``("done", full_text)`` or
+        ``("error", exc)``. Function calls requested by the agent are executed
+        and the follow-up response is streamed the same way. Setting
+        ``stop_event`` closes the underlying stream at the next event.
+        ``conversation`` is the session's conversation with this agent, see
+        _add_user_message.
+        """
+        start_time = time.time()
+        first_token_time = None
+        try:
+            openai_client = self.project_client.get_openai_client()
+            thread_id = self._add_user_message(openai_client, input_message, conversation)
+            print(f"[TIMELOG] Message creation took: {time.time() - start_time:.2f}s")
+
+            request = {
+                "conversation": thread_id,
+                "input": "",
+            }
+            while True:
+                stream = openai_client.responses.create(
+                    extra_body={
+                        "agent": {"name": self.agent_id, "type": "agent_reference"}
+                    },
+                    stream=True,
+                    **request,
+                )
+                text_parts = []
+                final_response = None
+                try:
+                    for event in stream:
+                        if stop_event.is_set():
+                            print("[DEBUG] Streaming cancelled by consumer")
+                            return
+                        if event.type == "response.output_text.delta":
+                            if first_token_time is None:
+                                first_token_time = time.time()
+                                print(
+                                    f"[TIMELOG] Time to first token: {first_token_time - start_time:.2f}s"
+                                )
+                            text_parts.append(event.delta)
+                            emit(("delta", event.delta))
+                        elif event.type == "response.completed":
+                            final_response = event.response
+                        elif event.type in ("response.failed", "error"):
+                            raise RuntimeError(f"Agent stream failed: {event}")
+                finally:
+                    stream.close()
+
+                if text_parts or final_response is None:
+                    break
+
+                # No output text, the agent asked for function calls instead
+                input_list = self._execute_function_calls(final_response.output)
+                if not input_list:
+                    break
+                request = {
+                    "input": input_list,
+                    "previous_response_id": final_response.id,
+                }
+
+            full_text = "".join(text_parts)
+            if not full_text and final_response is not None:
+                full_text = final_response.output_text or ""
+            print(
+                f"[TIMELOG] Total streamed conversation time: {time.time() - start_time:.2f}s"
+            )
+            emit(("done", full_text))
+        except Exception as e:
+            print(f"[ERROR] Streaming conversation failed: {str(e)}")
+            emit(("error", e))
+
+    async def run_conversation_with_text_stream(
+        self, input_message: str = "", on_delta=None, conversation=None
+    ):
+        """
+        Run a conversation turn with true token streaming.
+
+        Text deltas are passed to the optional ``on_delta`` coroutine as soon as
+        they arrive, so callers can forward partial output while the agent is
+        still generating. The complete reply is yielded once at the end, which
+        keeps callers that only use the final message working unchanged.
+        ``conversation`` continues the session's conversation with this agent
+        (see services.conversation_registry); without one the turn starts a
+        new conversation. ConversationNotFoundError is raised (before any
+        delta) if that conversation is gone on the server.
+        """
         print(
             f"[DEBUG] Async conversation pipeline initiated - commencing message processing protocol",
             flush=True,
         )
-        loop = asyncio.get_event_loop()
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop_event = threading.Event()
+
+        def emit(item):
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        worker = loop.run_in_executor(
+            _executor, self._stream_conversation_sync, input_message, emit, stop_event, conversation
+        )
         try:
-            messages = await loop.run_in_executor(
-                _executor, self._run_conversation_sync, input_message
-            )
-            for i, msg in enumerate(messages):
-                yield msg
-        except Exception as e:
-            print(f"[ERROR] Async conversation failed: {str(e)}")
-            yield f"Error processing message: {str(e)}"
+            while True:
+                kind, payload = await queue.get()
+                if kind == "delta":
+                    if on_delta is not None:
+                        await on_delta(payload)
+                elif kind == "done":
+                    yield payload
+                    break
+                elif isinstance(payload, ConversationNotFoundError):
+                    raise payload
+                else:
+                    yield f"Error processing message: {str(payload)}"
+                    break
+        finally:
+            # Stop the worker thread if the consumer goes away mid-stream
+            stop_event.set()
+        await worker
 
     @classmethod
     def clear_toolset_cache(cls):
@@ -435,15 +587,39 @@ def create_function_tool_for_agent(agent_type: str) -> List[Any]:
         description="Check inventory for a product using MCP client.",
         strict=True,
     )
+    define_mcp_find_similar_paint_colors = FunctionTool(
+        name="mcp_find_similar_paint_colors",
+        parameters={
+            "type": "object",
+            "properties": {
+                "colors": {
+                    "type": "string",
+                    "description": "Comma-separated hex codes or color names, e.g. \"#a0b0c0, light blue\".",
+                },
+                "count": {
+                    "type": "integer",
+                    "description": "Number of matching paints to return per color (1-10).",
+                },
+            },
+            "required": ["colors", "count"],
+            "additionalProperties": False,
+        },
+        description="Find the Zava paints closest to the given colors, with their product IDs.",
+        strict=True,
+    )
 
     functions = []
 
     if agent_type == "interior_designer":
-        functions = [define_mcp_create_image, define_mcp_product_recommendations]
+        functions = [
+            define_mcp_create_image,
+            define_mcp_product_recommendations,
+            define_mcp_find_similar_paint_colors,
+        ]
     elif agent_type == "customer_loyalty":
         functions = [define_mcp_calculate_discount]
     elif agent_type == "inventory_agent":
-        functions = [define_mcp_inventory_check]
+        functions = [define_mcp_inventory_check, define_mcp_find_similar_paint_colors]
     elif agent_type == "cart_manager":
         # Cart manager uses conversation context, minimal tools needed
         functions = []
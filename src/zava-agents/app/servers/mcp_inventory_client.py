@@ -139,6 +139,10 @@ class MCPShopperToolsClient:
         """Calculate discount for a customer based on their purchase history."""
         return await self.call_tool("get_customer_discount", {"customer_id": customer_id})
     
+    async def find_similar_paint_colors(self, colors: str, count: int = 3) -> List[Dict[str, Any]]:
+        """Find the Zava paints closest to comma-separated hex codes or color names."""
+        return await self.call_tool("find_similar_paint_colors", {"colors": colors, "count": count})
+    
     async def create_image(self, prompt: str, size: str = "1024x1024") -> str:
         """Generate an image from a prompt."""
         return await self.call_tool("generate_product_image", {"prompt": prompt, "size": size})
@@ -16,6 +16,7 @@ else:
 src_path = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(src_path))
 from app.tools import product_recommendations, inventory_check, calculate_discount, create_image
+from utils.palette_utils import find_similar_paints, validate_paint_request
 
 
 """
@@ -74,6 +75,21 @@ def get_customer_discount(customer_id: str) -> str:
     result = calculate_discount(customer_id)
     return json.dumps(result) if not isinstance(result, str) else result
 
+@mcp.tool()
+def find_similar_paint_colors(colors: str, count: int = 3) -> str:
+    """
+    Find the Zava paints closest to one or more colors, ranked by perceptual distance (CIEDE2000).
+    
+    Args:
+        colors: Comma-separated hex codes or color names, e.g. "#a0b0c0, light blue, Sage Harmony"
+        count: Number of matching paints to return per color, defaults to 3
+    
+    Returns:
+        For each color, the matching paints with name, hex code, ProductID and delta_e (lower is closer)
+    """
+    queries = [color for color in (part.strip() for part in colors.split(",")) if color]
+    return json.dumps(find_similar_paints(queries, count=max(1, min(count, 10))))
+
 @mcp.tool()
 def generate_product_image(prompt: str, size: str = "1024x1024") -> str:
     """
@@ -86,6 +102,9 @@ def generate_product_image(prompt: str, size: str = "1024x1024") -> str:
     Returns:
         URL or path to the generated image
     """
+    palette_check = validate_paint_request(prompt)
+    if not palette_check.is_valid:
+        return json.dumps({"error": palette_check.message, "suggestions": palette_check.suggestions})
     result = create_image(prompt, size)
     return json.dumps(result) if not isinstance(result, str) else result
 
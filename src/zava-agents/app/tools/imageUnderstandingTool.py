@@ -4,6 +4,9 @@ import os
 import base64
 from openai import AzureOpenAI  
 from dotenv import load_dotenv
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+from utils.image_utils import prepare_image
 load_dotenv()
 
 azure_deployment = os.environ.get("gpt_deployment")
@@ -62,6 +65,16 @@ def image_describing_tool(image_input, conversation_history, query = None, mime_
     except Exception as e:
         return f"Error reading image: {str(e)}"
 
+    # ----------------------------
+    # Downscale and recompress before sending (falls back to the original input)
+    try:
+        prepared = prepare_image(image_url if image_mode == "url" else image_bytes)
+        image_mode = "bytes"
+        image_bytes = prepared.data
+        mime_type = prepared.mime_type
+    except Exception as e:
+        print(f"Image preprocessing failed, sending original image: {e}")
+
     # ----------------------------
     # Construct chat prompt
 
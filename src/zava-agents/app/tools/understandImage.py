@@ -1,6 +1,9 @@
 import os
 from openai import AzureOpenAI
 import time
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+from utils.image_utils import prepare_image
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -18,6 +21,20 @@ client = AzureOpenAI(
     api_version=api_version,
 )
 
+def _prepared_image_url(image_url):
+    """Downscaled data URI of the image, or the original URL if it cannot be preprocessed."""
+    try:
+        prepared = prepare_image(image_url)
+    except Exception as e:
+        print(f"Image preprocessing failed, sending original URL: {e}")
+        return image_url
+    print(
+        f"Prepared image {prepared.width}x{prepared.height}: "
+        f"{prepared.original_size} -> {len(prepared.data)} bytes"
+    )
+    return prepared.to_data_uri()
+
+
 def get_image_description(image_url):
     start_time = time.time()
     """
@@ -39,7 +56,15 @@ def get_image_description(image_url):
                 }
             ]
         },
-        {"role": "user", "content": image_url}
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "image_url",
+                    "image_url": {"url": _prepared_image_url(image_url)}
+                }
+            ]
+        }
     ]
 
     # Call Azure OpenAI chat API
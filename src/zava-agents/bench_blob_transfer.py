@@ -0,0 +1,132 @@
+"""
+Throughput and peak memory of large blob transfers through StorageManager.
+
+Runs against blob_stub_server.py in a separate process, with a per-request
+bandwidth cap and latency so that a single connection behaves like one stream
+to a remote storage account. Compares the previous behaviour (one connection,
+download_blob().readall() into memory) with parallel chunked uploads and
+downloads streamed to a file.
+
+Each variant runs in its own process so peak RSS is comparable.
+
+    python bench_blob_transfer.py --size-mb 256 --bandwidth-mbps 100 --latency 0.02
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from utils.storage_utils import StorageManager
+
+BLOB_NAME = "bench/large.bin"
+
+VARIANTS = {
+    # name: (operation, max_concurrency)
+    "upload c=1": ("upload", 1),
+    "upload c=4": ("upload", 4),
+    "upload c=8": ("upload", 8),
+    "readall c=1": ("readall", 1),
+    "readall c=8": ("readall", 8),
+    "to_file c=4": ("to_file", 4),
+    "to_file c=8": ("to_file", 8),
+}
+
+
+def run_variant(name: str, connection_string: str, payload_path: str, chunk_mb: int) -> None:
+    """Child process: run one transfer and print a JSON result."""
+    operation, concurrency = VARIANTS[name]
+    manager = StorageManager(
+        connection_string=connection_string,
+        container_name="zava",
+        max_concurrency=concurrency,
+        chunk_size=chunk_mb * 1024 * 1024,
+        single_transfer_size=chunk_mb * 1024 * 1024,
+    )
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if operation == "upload":
+        with open(payload_path, "rb") as payload:
+            manager.upload_blob(BLOB_NAME, payload)
+        transferred = os.path.getsize(payload_path)
+    elif operation == "readall":
+        transferred = len(manager.download_blob(BLOB_NAME))
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            transferred = manager.download_blob_to(BLOB_NAME, os.path.join(directory, "large.bin"))
+    seconds = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "seconds": seconds,
+        "mb_per_s": transferred / seconds / (1024 * 1024),
+        "peak_extra_mb": (peak_rss - baseline_rss) / 1024,  # ru_maxrss is in KB on Linux
+        "bytes": transferred,
+    }))
+
+
+def write_payload(path: str, size_mb: int) -> None:
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as payload:
+        for _ in range(size_mb):
+            payload.write(block)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--chunk-mb", type=int, default=8)
+    parser.add_argument("--bandwidth-mbps", type=float, default=100.0, help="Per-connection cap of the stand-in")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to every request")
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument("--connection-string", help=argparse.SUPPRESS)
+    parser.add_argument("--payload", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.connection_string, args.payload, args.chunk_mb)
+        return
+
+    server = subprocess.Popen(
+        [
+            sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "blob_stub_server.py"),
+            "--port", "0", "--latency", str(args.latency), "--bandwidth-mbps", str(args.bandwidth_mbps),
+        ],
+        stdout=subprocess.PIPE, text=True,
+    )
+    results = {}
+    try:
+        connection_string = server.stdout.readline().strip()
+        with tempfile.NamedTemporaryFile(suffix=".bin") as payload_file:
+            write_payload(payload_file.name, args.size_mb)
+            for name in VARIANTS:
+                output = subprocess.run(
+                    [
+                        sys.executable, __file__, "--variant", name, "--chunk-mb", str(args.chunk_mb),
+                        "--connection-string", connection_string, "--payload", payload_file.name,
+                    ],
+                    capture_output=True, text=True, check=True,
+                ).stdout
+                results[name] = json.loads(output)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(
+        f"{args.size_mb} MB blob, {args.chunk_mb} MB chunks, stand-in capped at "
+        f"{args.bandwidth_mbps:g} MB/s per connection with {args.latency * 1000:g} ms latency"
+    )
+    print(f"{'':>12} {'seconds':>8} {'MB/s':>8} {'peak +MB':>9}")
+    for name, result in results.items():
+        print(f"{name:>12} {result['seconds']:>8.2f} {result['mb_per_s']:>8.1f} {result['peak_extra_mb']:>9.1f}")
+    print(
+        f"Download vs previous readall c=1: "
+        f"{results['to_file c=8']['mb_per_s'] / results['readall c=1']['mb_per_s']:.1f}x throughput, "
+        f"{results['readall c=1']['peak_extra_mb'] - results['to_file c=8']['peak_extra_mb']:.0f} MB less peak memory"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Latency of the handoff classification modes against a simulated agent endpoint.
+
+The simulated client charges one network round trip per call, a
+time-to-first-token for responses, and a per-token generation time for the
+IntentClassification JSON (whose reasoning field is the longest part):
+
+- conversation: conversations.create + responses.create (legacy)
+- inline:       one responses.create with the prompt as input
+- stream:       inline, streamed; routing fields are parsed as they arrive and
+                the stream is closed before the reasoning is generated
+
+    python bench_handoff_classification.py --rtt-ms 60 --ttft-ms 350 --token-ms 12
+"""
+import argparse
+import statistics
+import time
+from types import SimpleNamespace
+
+import orjson
+
+from services.handoff_service import CLASSIFICATION_MODES, HandoffService
+
+OUTPUT = orjson.dumps({
+    "domain": "cart_manager",
+    "is_domain_change": True,
+    "confidence": 0.9,
+    "reasoning": (
+        "The user explicitly asked to check out the items they selected, which is a shopping "
+        "cart operation, so the request belongs to the cart manager rather than the designer."
+    ),
+}).decode()
+CHARS_PER_TOKEN = 4
+
+
+class SimulatedClient:
+    def __init__(self, rtt: float, ttft: float, per_token: float):
+        self.rtt, self.ttft, self.per_token = rtt, ttft, per_token
+        self.conversations = SimpleNamespace(create=self._create_conversation, delete=lambda conversation_id: None)
+        self.responses = SimpleNamespace(create=self._create_response)
+        self.conversations_created = 0
+
+    def _create_conversation(self, **kwargs):
+        time.sleep(self.rtt)
+        self.conversations_created += 1
+        return SimpleNamespace(id=f"conv_{self.conversations_created}")
+
+    def _tokens(self):
+        return [OUTPUT[i:i + CHARS_PER_TOKEN] for i in range(0, len(OUTPUT), CHARS_PER_TOKEN)]
+
+    def _create_response(self, stream=False, **kwargs):
+        if not stream:
+            time.sleep(self.rtt + self.ttft + self.per_token * len(self._tokens()))
+            return SimpleNamespace(output_text=OUTPUT)
+        return self._stream()
+
+    def _stream(self):
+        client = self
+
+        class Stream:
+            def __iter__(self):
+                time.sleep(client.rtt + client.ttft)
+                for token in client._tokens():
+                    time.sleep(client.per_token)
+                    yield SimpleNamespace(type="response.output_text.delta", delta=token)
+
+            def close(self):
+                pass
+
+        return Stream()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rtt-ms", type=float, default=60)
+    parser.add_argument("--ttft-ms", type=float, default=350)
+    parser.add_argument("--token-ms", type=float, default=12)
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    print(
+        f"Simulated endpoint: {args.rtt_ms:g} ms round trip, {args.ttft_ms:g} ms to first token, "
+        f"{args.token_ms:g} ms/token, {len(OUTPUT) // CHARS_PER_TOKEN} output tokens"
+    )
+    print(f"{'mode':>12} {'median ms':>10} {'conversations':>14}")
+    medians = {}
+    for mode in CLASSIFICATION_MODES:
+        client = SimulatedClient(args.rtt_ms / 1000, args.ttft_ms / 1000, args.token_ms / 1000)
+        service = HandoffService(client, "gpt", classification_mode=mode)
+        timings = []
+        for i in range(args.iterations):
+            service.set_domain(f"s{i}", "interior_designer")
+            start = time.perf_counter()
+            service.classify_intent("checkout?", f"s{i}")
+            timings.append((time.perf_counter() - start) * 1000)
+        medians[mode] = statistics.median(timings)
+        print(f"{mode:>12} {medians[mode]:>10.0f} {client.conversations_created:>14}")
+    print(
+        f"inline saves {medians['conversation'] - medians['inline']:.0f} ms per classification, "
+        f"stream {medians['conversation'] - medians['stream']:.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
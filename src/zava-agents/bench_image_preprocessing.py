@@ -0,0 +1,88 @@
+"""
+Report what image preprocessing (utils/image_utils.prepare_image) saves.
+
+Generates phone-sized test photos, runs them through prepare_image and reports,
+per size: bytes sent before/after, base64 payload, estimated vision input
+tokens (high detail), preprocessing time, estimated upload time at the given
+uplink speed, the cost of a repeat (cached) request and the time of the local
+room color analysis on the prepared image.
+
+    python bench_image_preprocessing.py --uplink-mbps 20
+    python bench_image_preprocessing.py --image path/to/photo.jpg
+"""
+import argparse
+import math
+import time
+from io import BytesIO
+
+from PIL import Image, ImageFilter
+
+from utils.image_utils import IMAGE_MAX_DIMENSION, image_preprocessing_report, prepare_image
+from utils.palette_utils import analyze_room_colors
+
+
+def synthetic_photo(width: int, height: int) -> bytes:
+    """Noisy gradient saved as a high-quality JPEG, close to a camera photo in size."""
+    noise = Image.effect_noise((width, height), 64).filter(ImageFilter.GaussianBlur(1))
+    gradient = Image.linear_gradient("L").resize((width, height))
+    image = Image.merge("RGB", (noise, gradient, Image.blend(noise, gradient, 0.5)))
+    output = BytesIO()
+    image.save(output, format="JPEG", quality=95)
+    return output.getvalue()
+
+
+def vision_tokens(width: int, height: int) -> int:
+    """High-detail image token estimate: fit in 2048x2048, short side to 768, 170 per 512px tile + 85."""
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def run(label: str, data: bytes, uplink_mbps: float) -> None:
+    with Image.open(BytesIO(data)) as image:
+        width, height = image.size
+
+    start = time.perf_counter()
+    prepared = prepare_image(data)
+    prep_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    prepare_image(data)
+    cached_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    colors = analyze_room_colors(data)
+    color_seconds = time.perf_counter() - start
+
+    bytes_per_second = uplink_mbps * 1_000_000 / 8
+    payload_before = math.ceil(len(data) / 3) * 4
+    payload_after = math.ceil(len(prepared.data) / 3) * 4
+    upload_saved = (payload_before - payload_after) / bytes_per_second
+
+    print(f"\n{label}: {width}x{height} -> {prepared.width}x{prepared.height} ({prepared.mime_type})")
+    print(f"  bytes          {len(data):>10,} -> {len(prepared.data):>10,} ({len(prepared.data) / len(data):.1%})")
+    print(f"  base64 payload {payload_before:>10,} -> {payload_after:>10,}")
+    print(f"  vision tokens  {vision_tokens(width, height):>10,} -> {vision_tokens(prepared.width, prepared.height):>10,}")
+    print(f"  preprocessing  {prep_seconds * 1000:>9.1f}ms (cached repeat: {cached_seconds * 1000:.2f}ms)")
+    print(f"  room colors    {color_seconds * 1000:>9.1f}ms ({', '.join(c['palette_match']['name'] for c in colors)})")
+    print(f"  upload @ {uplink_mbps:g} Mbps saves {upload_saved * 1000:.0f}ms; net latency saved {(upload_saved - prep_seconds) * 1000:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", help="Benchmark a real image file instead of synthetic photos")
+    parser.add_argument("--uplink-mbps", type=float, default=20.0)
+    args = parser.parse_args()
+
+    print(f"IMAGE_MAX_DIMENSION={IMAGE_MAX_DIMENSION}")
+    if args.image:
+        with open(args.image, "rb") as image_file:
+            run(args.image, image_file.read(), args.uplink_mbps)
+    else:
+        for width, height in [(1024, 768), (3024, 4032), (4000, 3000), (8064, 6048)]:
+            run(f"synthetic {width}x{height}", synthetic_photo(width, height), args.uplink_mbps)
+    print("\nreport:", image_preprocessing_report())
+
+
+if __name__ == "__main__":
+    main()
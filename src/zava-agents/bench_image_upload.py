@@ -0,0 +1,130 @@
+"""
+CPU time and peak memory of handling one generated image before upload.
+
+Compares the previous create_image path (base64 decode -> PIL.Image.open ->
+re-encode PNG into a new BytesIO) with the current one (base64 decode ->
+signature check -> BytesIO over the decoded bytes). Both hand the stream to a
+sink that reads it in 4 MB blocks, the way the blob SDK uploads it.
+
+Each variant runs in its own process so peak RSS is comparable (PIL's pixel
+buffers are not visible to tracemalloc).
+
+    python bench_image_upload.py --iterations 10
+"""
+import argparse
+import base64
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+from utils.image_utils import decode_b64_image
+
+UPLOAD_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def generated_image_b64(width: int = 1536, height: int = 1024) -> str:
+    """A 1536x1024 PNG like gpt-image-1 returns (photo-like content, so it compresses realistically)."""
+    from PIL import Image, ImageFilter
+
+    noise = Image.effect_noise((width, height), 48).filter(ImageFilter.GaussianBlur(2))
+    gradient = Image.linear_gradient("L").resize((width, height))
+    image = Image.merge("RGB", (noise, gradient, Image.blend(noise, gradient, 0.3)))
+    output = BytesIO()
+    image.save(output, format="PNG")
+    return base64.b64encode(output.getvalue()).decode("ascii")
+
+
+def upload_sink(stream) -> int:
+    sent = 0
+    while True:
+        block = stream.read(UPLOAD_BLOCK_SIZE)
+        if not block:
+            return sent
+        sent += len(block)
+
+
+def legacy_path(b64_data: str) -> int:
+    from PIL import Image
+
+    image = Image.open(BytesIO(base64.b64decode(b64_data)))
+    img_byte_arr = BytesIO()
+    image.save(img_byte_arr, format="PNG")
+    img_byte_arr.seek(0)
+    return upload_sink(img_byte_arr)
+
+
+def current_path(b64_data: str) -> int:
+    image_bytes, _ = decode_b64_image(b64_data)
+    return upload_sink(BytesIO(image_bytes))
+
+
+VARIANTS = {"before": legacy_path, "after": current_path}
+
+
+def run_variant(name: str, iterations: int, payload_path: str) -> None:
+    """Child process: measure one variant and print a JSON result."""
+    import PIL.PngImagePlugin  # noqa: F401  (import cost is not part of the measurement)
+
+    with open(payload_path, "r", encoding="ascii") as payload_file:
+        b64_data = payload_file.read()
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    func = VARIANTS[name]
+    start_cpu, start_wall = time.process_time(), time.perf_counter()
+    uploaded = 0
+    for _ in range(iterations):
+        uploaded = func(b64_data)
+    cpu = (time.process_time() - start_cpu) / iterations
+    wall = (time.perf_counter() - start_wall) / iterations
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "cpu_ms": cpu * 1000,
+        "wall_ms": wall * 1000,
+        "peak_extra_mb": (peak_rss - baseline_rss) / 1024,  # ru_maxrss is in KB on Linux
+        "payload_bytes": len(b64_data),
+        "uploaded_bytes": uploaded,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument("--payload", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.iterations, args.payload)
+        return
+
+    # Generate the payload here so its cost does not raise the children's peak RSS
+    results = {}
+    with tempfile.NamedTemporaryFile("w", suffix=".b64", encoding="ascii") as payload_file:
+        payload_file.write(generated_image_b64())
+        payload_file.flush()
+        for name in VARIANTS:
+            output = subprocess.run(
+                [
+                    sys.executable, __file__, "--variant", name,
+                    "--iterations", str(args.iterations), "--payload", payload_file.name,
+                ],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            results[name] = json.loads(output)
+
+    print(f"Generated image: 1536x1024 PNG, {results['after']['payload_bytes']:,} base64 chars")
+    print(f"{'':>8} {'CPU ms':>8} {'wall ms':>8} {'peak +MB':>9} {'uploaded':>10}")
+    for name, result in results.items():
+        print(
+            f"{name:>8} {result['cpu_ms']:>8.1f} {result['wall_ms']:>8.1f} "
+            f"{result['peak_extra_mb']:>9.1f} {result['uploaded_bytes']:>10,}"
+        )
+    before, after = results["before"], results["after"]
+    print(f"CPU per generation: {before['cpu_ms'] / max(after['cpu_ms'], 1e-6):.1f}x less")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Accuracy, coverage and latency of the local handoff intent classifier.
+
+Coverage is the share of messages answered locally (confidence at or above the
+threshold, the rest go to the LLM); accuracy is measured on those answers.
+Both use leave-one-out over data/handoff_service_evaluation_grounded.jsonl:
+each message is classified by a model trained on the other 29.
+
+Latency is per classify() call of a model trained on the full file, warm.
+
+    python bench_intent_classifier.py --iterations 2000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from services.intent_classifier import DEFAULT_TRAINING_PATH, LocalIntentClassifier, evaluate, load_labelled_messages
+
+THRESHOLDS = (0.8, 0.85, 0.9, 0.95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'threshold':>9} {'local':>6} {'coverage':>9} {'accuracy':>9}")
+    for threshold in THRESHOLDS:
+        report = evaluate(threshold=threshold)
+        print(
+            f"{threshold:>9.2f} {report['answered_locally']:>3}/{report['examples']:<2} "
+            f"{report['coverage']:>9.0%} {report['local_accuracy']:>9.0%}"
+        )
+
+    classifier = LocalIntentClassifier.from_jsonl()
+    examples = load_labelled_messages(DEFAULT_TRAINING_PATH)
+    for current_domain, message, _ in examples:
+        classifier.classify(message, current_domain)  # warm the token cache
+    latencies = []
+    for i in range(args.iterations):
+        current_domain, message, _ = examples[i % len(examples)]
+        start = time.perf_counter()
+        classifier.classify(message, current_domain)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"classify() latency: p50 {p50:.0f} us, p95 {p95:.0f} us, p99 {p99:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark agent response parsing across reply sizes.
+
+Compares the previous regex + json.loads implementation of parse_agent_response
+with the current bracket-matching + orjson one (utils/response_utils.py).
+
+    python bench_parsing.py
+"""
+import json
+import re
+import timeit
+
+from utils.response_utils import parse_agent_response
+
+
+def legacy_parse_agent_response(response: str) -> dict:
+    """Previous implementation: greedy regexes, then json.loads."""
+    codeblock_match = re.search(r'```(?:json)?\s*([\[{].*[\]}])\s*```', response, re.DOTALL)
+    if codeblock_match:
+        response = codeblock_match.group(1).strip()
+    else:
+        json_match = re.search(r'([\[{].*[\]}])', response, re.DOTALL)
+        if json_match:
+            response = json_match.group(1).strip()
+    try:
+        parsed_response = json.loads(response)
+        if isinstance(parsed_response, list) and len(parsed_response) > 0:
+            first_item = parsed_response[0]
+            products = first_item.get("products", "")
+            if products and not isinstance(products, str):
+                products = json.dumps(products)
+            return {"answer": first_item.get("answer", ""), "products": products}
+        return {"answer": str(parsed_response)}
+    except (json.JSONDecodeError, TypeError):
+        return {"answer": str(response)}
+
+
+def build_reply(product_count: int, fenced: bool) -> str:
+    products = [
+        {
+            "id": f"PROD{i:04d}",
+            "name": f"Shade {i} [matte]",
+            "type": "Paint Shades",
+            "description": "A crisp, subtle colour perfect for creating peaceful retreats. " * 3,
+            "imageURL": f"https://example.blob.core.windows.net/images/{i}.png",
+            "punchLine": "Chill out in classic blue",
+            "price": "$48.99",
+        }
+        for i in range(product_count)
+    ]
+    body = json.dumps(
+        [{"answer": "Here are some options for your project.", "image_output": "", "products": products, "cart": []}],
+        indent=2,
+    )
+    if fenced:
+        return f"Sure! Here is what I found:\n```json\n{body}\n```\nLet me know if you need more."
+    return body
+
+
+def main():
+    print(f"{'products':>8} {'fenced':>6} {'bytes':>9} {'legacy ms':>10} {'current ms':>11} {'speedup':>8}")
+    for product_count in (1, 10, 100, 1000):
+        for fenced in (False, True):
+            reply = build_reply(product_count, fenced)
+            assert json.loads(parse_agent_response(reply)["products"]) == json.loads(
+                legacy_parse_agent_response(reply)["products"]
+            )
+            number = max(1, 2000 // (product_count + 1))
+            legacy = min(timeit.repeat(lambda: legacy_parse_agent_response(reply), number=number, repeat=5)) / number
+            current = min(timeit.repeat(lambda: parse_agent_response(reply), number=number, repeat=5)) / number
+            print(
+                f"{product_count:>8} {str(fenced):>6} {len(reply):>9} "
+                f"{legacy * 1000:>10.3f} {current * 1000:>11.3f} {legacy / current:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
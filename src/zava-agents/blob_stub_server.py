@@ -0,0 +1,354 @@
+"""
+Azurite-style in-process stand-in for Azure Blob Storage.
+
+Implements the subset of the Blob REST API used by StorageManager so tests and
+benchmarks can exercise the real azure-storage-blob clients without an Azure
+account: container create, Put Blob, Put Block / Put Block List, ranged Get
+Blob, Get Blob Properties, conditional requests (If-None-Match /
+If-Modified-Since), paginated List Blobs and Delete Blob.
+
+Requests are accepted with any shared-key signature; the account name and key
+are Azurite's well-known development values. ``latency`` (seconds per request)
+and ``bandwidth`` (bytes per second per request) emulate a remote endpoint.
+
+    with BlobStubServer() as server:
+        manager = StorageManager(connection_string=server.connection_string)
+
+    python blob_stub_server.py --port 10000   # standalone, prints the connection string
+"""
+
+import argparse
+import base64
+import hashlib
+import threading
+import time
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+ACCOUNT_NAME = "devstoreaccount1"
+ACCOUNT_KEY = "Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UWJGUVGIHzMAE43OqbkRnKWKG8mR2WbPFqA=="
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class BlobStubServer:
+    """
+    Threaded HTTP server holding blobs in memory.
+
+    Attributes:
+        blobs: {(container, name): blob record} of committed blobs
+        requests: (method, path, query) of every request received
+        connections: Number of TCP connections accepted
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, bandwidth: float = 0.0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.containers = set()
+        self.blobs: Dict[Tuple[str, str], dict] = {}
+        self.blocks: Dict[Tuple[str, str], Dict[str, bytes]] = {}
+        self.requests: List[Tuple[str, str, str]] = []
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._httpd = _StubHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def account_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/{ACCOUNT_NAME}"
+
+    @property
+    def connection_string(self) -> str:
+        return (
+            f"DefaultEndpointsProtocol=http;AccountName={ACCOUNT_NAME};"
+            f"AccountKey={ACCOUNT_KEY};BlobEndpoint={self.account_url};"
+        )
+
+    def start(self) -> "BlobStubServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "BlobStubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def count(self, method: str, query_contains: str = "") -> int:
+        """Number of requests with the given method whose query contains a substring."""
+        return sum(1 for m, _, q in self.requests if m == method and query_contains in q)
+
+    def _throttle(self, size: int) -> None:
+        if self.bandwidth and size:
+            time.sleep(size / self.bandwidth)
+
+    def _store(self, container: str, name: str, data: bytes, content_type: str) -> dict:
+        record = {
+            "data": data,
+            "etag": f'"0x{uuid.uuid4().hex[:15].upper()}"',
+            "last_modified": time.time(),
+            "content_type": content_type or "application/octet-stream",
+            "content_md5": base64.b64encode(hashlib.md5(data).digest()).decode(),
+        }
+        self.blobs[(container, name)] = record
+        return record
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            # --- plumbing ---
+
+            def _route(self):
+                parsed = urlparse(self.path)
+                parts = [unquote(p) for p in parsed.path.lstrip("/").split("/", 2)]
+                query = {k: v[0] for k, v in parse_qs(parsed.query, keep_blank_values=True).items()}
+                container = parts[1] if len(parts) > 1 else ""
+                blob = parts[2] if len(parts) > 2 else ""
+                return container, blob, query, parsed.query
+
+            def _body(self) -> bytes:
+                if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                    chunks = []
+                    while True:
+                        size = int(self.rfile.readline().strip().split(b";")[0], 16)
+                        if size == 0:
+                            self.rfile.readline()
+                            return b"".join(chunks)
+                        chunks.append(self.rfile.read(size))
+                        self.rfile.readline()
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                stub._throttle(len(body))
+                return body
+
+            def _send(self, status: int, body: bytes = b"", headers: dict = None, send_body: bool = True):
+                self.send_response(status)
+                self.send_header("x-ms-request-id", str(uuid.uuid4()))
+                self.send_header("x-ms-version", "2025-01-05")
+                self.send_header("Date", formatdate(usegmt=True))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                if "Content-Length" not in (headers or {}):
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if send_body and body:
+                    stub._throttle(len(body))
+                    self.wfile.write(body)
+
+            def _error(self, status: int, code: str, send_body: bool = True):
+                body = (
+                    '<?xml version="1.0" encoding="utf-8"?>'
+                    f"<Error><Code>{code}</Code><Message>{code}</Message></Error>"
+                ).encode()
+                self._send(status, body, {"x-ms-error-code": code, "Content-Type": "application/xml"}, send_body)
+
+            def _blob_headers(self, record: dict) -> dict:
+                return {
+                    "ETag": record["etag"],
+                    "Last-Modified": formatdate(record["last_modified"], usegmt=True),
+                    "Content-Type": record["content_type"],
+                    "x-ms-blob-type": "BlockBlob",
+                    "x-ms-creation-time": formatdate(record["last_modified"], usegmt=True),
+                    "Accept-Ranges": "bytes",
+                }
+
+            def _not_modified(self, record: dict) -> bool:
+                if_none_match = self.headers.get("If-None-Match")
+                if if_none_match:
+                    # If-Modified-Since is ignored when If-None-Match is present (RFC 7232)
+                    return if_none_match in ("*", record["etag"])
+                if_modified_since = self.headers.get("If-Modified-Since")
+                if if_modified_since:
+                    since = parsedate_to_datetime(if_modified_since).timestamp()
+                    return int(record["last_modified"]) <= since
+                return False
+
+            def _dispatch(self, method: str):
+                container, blob, query, raw_query = self._route()
+                with stub._lock:
+                    stub.requests.append((method, self.path.split("?")[0], raw_query))
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    if stub.latency:
+                        time.sleep(stub.latency)
+                    handler = getattr(self, f"_{method.lower()}_{'blob' if blob else 'container'}")
+                    handler(container, blob, query)
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def do_PUT(self):
+                self._dispatch("PUT")
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_HEAD(self):
+                self._dispatch("HEAD")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+            # --- containers ---
+
+            def _put_container(self, container, _, query):
+                self._body()
+                if container in stub.containers:
+                    return self._error(409, "ContainerAlreadyExists")
+                stub.containers.add(container)
+                self._send(201, headers={"ETag": '"0x1"', "Last-Modified": formatdate(usegmt=True)})
+
+            def _head_container(self, container, _, query):
+                if container not in stub.containers:
+                    return self._error(404, "ContainerNotFound", send_body=False)
+                self._send(200, headers={"ETag": '"0x1"', "Last-Modified": formatdate(usegmt=True)})
+
+            def _get_container(self, container, _, query):
+                if query.get("comp") != "list":
+                    return self._head_container(container, _, query)
+                if container not in stub.containers:
+                    return self._error(404, "ContainerNotFound")
+                prefix = query.get("prefix", "")
+                marker = query.get("marker", "")
+                max_results = int(query.get("maxresults") or 5000)
+                names = sorted(
+                    name for c, name in stub.blobs if c == container and name.startswith(prefix) and name >= marker
+                )
+                page, rest = names[:max_results], names[max_results:]
+                items = []
+                for name in page:
+                    record = stub.blobs[(container, name)]
+                    items.append(
+                        f"<Blob><Name>{escape(name)}</Name><Properties>"
+                        f"<Last-Modified>{formatdate(record['last_modified'], usegmt=True)}</Last-Modified>"
+                        f"<Etag>{record['etag']}</Etag>"
+                        f"<Content-Length>{len(record['data'])}</Content-Length>"
+                        f"<Content-Type>{escape(record['content_type'])}</Content-Type>"
+                        f"<BlobType>BlockBlob</BlobType>"
+                        f"</Properties></Blob>"
+                    )
+                body = (
+                    '<?xml version="1.0" encoding="utf-8"?>'
+                    f'<EnumerationResults ServiceEndpoint="{stub.account_url}/" ContainerName="{escape(container)}">'
+                    f"<Prefix>{escape(prefix)}</Prefix><Marker>{escape(marker)}</Marker>"
+                    f"<MaxResults>{max_results}</MaxResults><Blobs>{''.join(items)}</Blobs>"
+                    f"<NextMarker>{escape(rest[0]) if rest else ''}</NextMarker></EnumerationResults>"
+                ).encode()
+                self._send(200, body, {"Content-Type": "application/xml"})
+
+            def _delete_container(self, container, _, query):
+                stub.containers.discard(container)
+                for key in [k for k in stub.blobs if k[0] == container]:
+                    del stub.blobs[key]
+                self._send(202)
+
+            # --- blobs ---
+
+            def _put_blob(self, container, blob, query):
+                data = self._body()
+                if container not in stub.containers:
+                    return self._error(404, "ContainerNotFound")
+                key = (container, blob)
+                comp = query.get("comp")
+                if comp == "block":
+                    stub.blocks.setdefault(key, {})[query["blockid"]] = data
+                    return self._send(201)
+                if comp == "blocklist":
+                    ids = [element.text for element in ElementTree.fromstring(data)]
+                    staged = stub.blocks.get(key, {})
+                    if any(block_id not in staged for block_id in ids):
+                        return self._error(400, "InvalidBlockList")
+                    data = b"".join(staged[block_id] for block_id in ids)
+                if self.headers.get("If-None-Match") == "*" and key in stub.blobs:
+                    return self._error(409, "BlobAlreadyExists")
+                stub.blocks.pop(key, None)
+                record = stub._store(container, blob, data, self.headers.get("x-ms-blob-content-type"))
+                self._send(201, headers={
+                    "ETag": record["etag"],
+                    "Last-Modified": formatdate(record["last_modified"], usegmt=True),
+                    "x-ms-request-server-encrypted": "false",
+                })
+
+            def _get_blob(self, container, blob, query, send_body: bool = True):
+                record = stub.blobs.get((container, blob))
+                if record is None:
+                    return self._error(404, "BlobNotFound", send_body)
+                if_match = self.headers.get("If-Match")
+                if if_match and if_match not in ("*", record["etag"]):
+                    return self._error(412, "ConditionNotMet", send_body)
+                headers = self._blob_headers(record)
+                if self._not_modified(record):
+                    headers.pop("Content-Type")
+                    return self._send(304, headers={**headers, "Content-Length": "0"})
+                data = record["data"]
+                if not send_body:
+                    return self._send(200, headers={**headers, "Content-Length": str(len(data))}, send_body=False)
+                byte_range = self.headers.get("x-ms-range") or self.headers.get("Range")
+                if byte_range:
+                    start, _, end = byte_range.split("=", 1)[1].partition("-")
+                    start = int(start)
+                    end = min(int(end) if end else len(data) - 1, len(data) - 1)
+                    if start >= len(data):
+                        return self._send(416, headers={"Content-Range": f"bytes */{len(data)}", "x-ms-error-code": "InvalidRange"})
+                    headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+                    return self._send(206, data[start:end + 1], headers)
+                headers["Content-MD5"] = record["content_md5"]
+                self._send(200, data, headers)
+
+            def _head_blob(self, container, blob, query):
+                self._get_blob(container, blob, query, send_body=False)
+
+            def _delete_blob(self, container, blob, query):
+                if stub.blobs.pop((container, blob), None) is None:
+                    return self._error(404, "BlobNotFound")
+                self._send(202)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=10000)
+    parser.add_argument("--container", action="append", default=[], help="Container to create (repeatable)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0, help="Per-request transfer cap in MB/s")
+    args = parser.parse_args()
+
+    server = BlobStubServer(args.host, args.port, args.latency, args.bandwidth_mbps * 1024 * 1024)
+    server.containers.update(args.container or ["zava"])
+    print(server.connection_string, flush=True)
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ import datetime
 import time
 import uuid
 from collections import deque
+from contextlib import asynccontextmanager
 from typing import Deque, Tuple, Optional, Dict
 from concurrent.futures import ThreadPoolExecutor
 import orjson  # Faster JSON library
@@ -12,14 +13,13 @@ from dotenv import load_dotenv
 from opentelemetry import trace
 import logging
 
-from opentelemetry.instrumentation.openai_v2 import OpenAIInstrumentor
-
 # Azure & OpenAI Imports
 from azure.ai.projects import AIProjectClient
+from azure.ai.projects.aio import AIProjectClient as AsyncAIProjectClient
 from azure.identity import DefaultAzureCredential
+from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
 from openai import AzureOpenAI
 
-from azure.monitor.opentelemetry import configure_azure_monitor
 from azure.ai.agents.telemetry import trace_function
 
 # FastAPI Imports
@@ -32,13 +32,19 @@ from utils.history_utils import (
     redact_bad_prompts_in_history,
     clean_conversation_history,
     parse_conversation_history,
+    build_agent_context as build_session_agent_context,
 )
 from utils.response_utils import (
     extract_bot_reply,
     parse_agent_response,
     extract_product_names_from_response,
 )
-from utils.log_utils import log_timing, log_cache_status
+from utils.stream_utils import AgentResponseStreamParser
+from utils.log_utils import log_timing
+from utils.image_cache import image_description_cache
+from utils.image_utils import image_preprocessing_report, validate_image_source
+from utils.generation_cache import generation_cache
+from utils.disk_cache import disk_cache
 from utils.env_utils import load_env_vars, validate_env_vars
 from utils.message_utils import (
     IMAGE_UPLOAD_MESSAGES,
@@ -56,8 +62,29 @@ from services.agent_service import get_or_create_agent_processor
 
 from app.tools.aiSearchTools import product_recommendations
 from app.tools.imageCreationTool import create_image
+from utils.palette_utils import (
+    analyze_room_colors,
+    describe_room_colors,
+    validate_paint_request,
+)
 from app.servers.mcp_inventory_server import mcp as inventory_mcp
 from services.handoff_service import HandoffService
+from services.intent_classifier import LocalIntentClassifier
+from services.routing_cache import RoutingCache
+from services.speculative_execution import SpeculativeExecutor
+from services.conversation_registry import ConversationNotFoundError, ConversationRegistry
+from services.session_store import (
+    create_session_store,
+    InMemorySessionStore,
+    RAW_IO_HISTORY_MAXLEN,
+)
+from services.image_job_service import (
+    COMPLETED,
+    FAILED,
+    ImageJobRejected,
+    ImageJobService,
+)
+from utils.telemetry_utils import configure_telemetry
 
 
 load_dotenv()
@@ -70,37 +97,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Global thread pool executor for CPU-bound operations
+# Global thread pool executor for CPU-bound operations (one per worker process)
 thread_pool = ThreadPoolExecutor(max_workers=4)
 
-application_insights_connection_string = os.environ[
-    "APPLICATIONINSIGHTS_CONNECTION_STRING"
-]
-configure_azure_monitor(connection_string=application_insights_connection_string)
-OpenAIInstrumentor().instrument()
+# "vision" (default): describe uploaded images with the vision model, plus local color analysis.
+# "local": skip the vision call and use only the local color analysis.
+image_analysis_mode = os.environ.get("IMAGE_ANALYSIS_MODE", "vision")
+
+# Number of uvicorn worker processes. Same variable uvicorn's CLI reads for --workers.
+web_concurrency = int(os.environ.get("WEB_CONCURRENCY", "1"))
 
 scenario = os.path.basename(__file__)
 tracer = trace.get_tracer(__name__)
 
 
-async def get_cached_image_description(image_url: str, image_cache: dict) -> str:
-    """Get image description with caching. If not in cache, fetch and store it."""
-    if image_url in image_cache:
-        logger.info(
-            "Using cached image description",
-            extra={"url": image_url[:50], "cache_size": len(image_cache)},
-        )
-        return image_cache[image_url]
-
-    logger.info("Fetching new image description", extra={"url": image_url[:50]})
+async def get_cached_image_description(image_url: str) -> str:
+    """Get image description from the process-wide cache. If not in cache, fetch and store it."""
     try:
-        # Use thread pool executor for CPU-bound operations
-        loop = asyncio.get_event_loop()
-        description = await loop.run_in_executor(
-            thread_pool, get_image_description, image_url
+        # Use thread pool executor for the download and the vision call
+        description = await image_description_cache.get_description(
+            image_url, get_image_description, executor=thread_pool
         )
-        image_cache[image_url] = description
-        logger.info("Cached image description", extra={"url": image_url[:50]})
+        image_description_cache.log_stats()
         return description
     except Exception as e:
         logger.error(
@@ -110,25 +128,21 @@ async def get_cached_image_description(image_url: str, image_cache: dict) -> str
         return ""
 
 
-async def pre_fetch_image_description(image_url: str, image_cache: dict):
+async def pre_fetch_image_description(image_url: str):
     """Pre-fetch image description asynchronously without blocking."""
-    if image_url and image_url not in image_cache:
+    if image_url and not image_description_cache.is_cached(image_url):
         logger.info("Pre-fetching image description", extra={"url": image_url[:50]})
-        try:
-            loop = asyncio.get_event_loop()
-            description = await loop.run_in_executor(
-                thread_pool, get_image_description, image_url
-            )
-            image_cache[image_url] = description
-            logger.info(
-                "Pre-fetched and cached image description",
-                extra={"url": image_url[:50]},
-            )
-        except Exception as e:
-            logger.error(
-                "Failed to pre-fetch image description",
-                extra={"url": image_url[:50], "error": str(e)},
-            )
+        await get_cached_image_description(image_url)
+
+
+async def get_room_colors(image_url: str) -> list:
+    """Dominant room colors mapped to Zava paints (local NumPy analysis, no model call)."""
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(thread_pool, analyze_room_colors, image_url)
+    except Exception as e:
+        logger.warning(f"Room color analysis failed: {e}")
+        return []
 
 
 # Safe operation wrapper for better error handling
@@ -144,30 +158,118 @@ async def safe_operation(operation, fallback_value=None, operation_name="Unknown
         return fallback_value
 
 
-app = FastAPI()
+# Per-worker clients, created by init_worker() when the worker starts.
+# With WEB_CONCURRENCY > 1 the uvicorn parent process only supervises workers,
+# so nothing here is created (or shared) before the worker processes fork.
+project_client = None
+async_project_client = None
+llm_client = None
+handoff_service = None
+session_store = None
+image_job_service = None
+speculative_executor = None
+conversation_registry = None
+
+# Agents whose prompt is enriched with product recommendations
+PRODUCT_RECOMMENDATION_AGENTS = ("interior_designer", "interior_designer_create_image", "cora")
+
+
+def init_worker():
+    """Configure telemetry and create the clients for this worker process. Safe to call again."""
+    global project_client, async_project_client, llm_client, handoff_service, session_store, image_job_service
+    global speculative_executor, conversation_registry
+    if project_client is not None:
+        return
+
+    configure_telemetry()
+
+    project_endpoint = os.environ.get("FOUNDRY_ENDPOINT")
+    if not project_endpoint:
+        raise ValueError("FOUNDRY_ENDPOINT environment variable is required")
+    project_client = AIProjectClient(
+        endpoint=project_endpoint,
+        credential=DefaultAzureCredential(),
+    )
+
+    # LLM client for the handoff service.
+    # Retrieves an AzureOpenAI client from the project client.
+    # Handoff service determines which agent to route to based on intent classification.
+    # The default for this is Cora, the general shopping assistant.
+    llm_client = project_client.get_openai_client()
+
+    # Async counterpart used by the websocket handler, so waiting on the
+    # classification LLM does not block the event loop for other sessions
+    async_project_client = AsyncAIProjectClient(
+        endpoint=project_endpoint,
+        credential=AsyncDefaultAzureCredential(),
+    )
+
+    handoff_service = HandoffService(
+        azure_openai_client=llm_client,
+        deployment_name=validated_env_vars["gpt_deployment"],
+        default_domain="cora",
+        lazy_classification=True,
+        # Local rules + nearest-centroid stage; only uncertain messages reach the LLM
+        local_classifier=(
+            LocalIntentClassifier.from_jsonl()
+            if os.getenv("HANDOFF_LOCAL_CLASSIFIER", "true").lower() == "true"
+            else None
+        ),
+        async_client=async_project_client.get_openai_client(),
+        # Confident LLM decisions reused for repeats and paraphrases from the same domain
+        routing_cache=(
+            RoutingCache()
+            if os.getenv("HANDOFF_ROUTING_CACHE", "true").lower() == "true"
+            else None
+        ),
+    )
+
+    # Session state store (in-memory by default, Redis when SESSION_STORE_URL is set).
+    # Keeps cart, discount, image URL, routing domain and raw I/O history outside the
+    # websocket handler so reconnects and other workers can pick the session up.
+    session_store = create_session_store()
+    if web_concurrency > 1 and isinstance(session_store, InMemorySessionStore):
+        # A websocket stays on the worker that accepted it, but a reconnect can land
+        # on another worker (or replica) that does not know the session.
+        logger.warning(
+            f"Running {web_concurrency} workers with the in-memory session store: "
+            "set SESSION_STORE_URL so sessions survive reconnects, or use sticky "
+            "sessions and accept that reconnects may start a new session"
+        )
+    # Bounded worker pool for gpt-image-1 generations (see services/image_job_service.py)
+    image_job_service = ImageJobService(generate=create_image)
+    # Current-domain agent started alongside classification (HANDOFF_SPECULATIVE_DOMAINS, off by default)
+    speculative_executor = SpeculativeExecutor.from_env()
+    # One server-side conversation per (session, agent), see services/conversation_registry.py
+    conversation_registry = ConversationRegistry()
+    logger.info(f"Worker {os.getpid()} initialized")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_worker()
+    yield
+    image_job_service.shutdown()
+    await handoff_service.async_client.close()
+    await async_project_client.close()
+    logger.info("Shutting down thread pool executor")
+    thread_pool.shutdown(wait=False)
+
+
+app = FastAPI(lifespan=lifespan)
 # set up MCP inventory server as a mounted app
 inventory_mcp_app = inventory_mcp.sse_app()
 app.mount("/mcp-inventory/", inventory_mcp_app)
-project_endpoint = os.environ.get("FOUNDRY_ENDPOINT")
-if not project_endpoint:
-    raise ValueError("FOUNDRY_ENDPOINT environment variable is required")
-project_client = AIProjectClient(
-    endpoint=project_endpoint,
-    credential=DefaultAzureCredential(),
-)
 
-# LLM client for the handoff service.
-# Retrieves an AzureOpenAI client from the project client.
-# Handoff service determines which agent to route to based on intent classification.
-# The default for this is Cora, the general shopping assistant.
-llm_client = project_client.get_openai_client()
-
-handoff_service = HandoffService(
-    azure_openai_client=llm_client,
-    deployment_name=validated_env_vars["gpt_deployment"],
-    default_domain="cora",
-    lazy_classification=True,
-)
+
+def resolve_session_id(requested_session_id: Optional[str]) -> str:
+    """Reuse a client-provided session ID if it is a valid UUID, otherwise start a new session."""
+    if requested_session_id:
+        try:
+            return str(uuid.UUID(requested_session_id))
+        except ValueError:
+            logger.warning("Ignoring invalid session_id from client")
+    return str(uuid.uuid4())
 
 
 @app.get("/")
@@ -185,6 +287,7 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.datetime.now().isoformat(),
+        "worker_pid": os.getpid(),
         "environment_vars_configured": {
             "phi_4_endpoint": bool(validated_env_vars.get("phi_4_endpoint")),
             "phi_4_api_key": bool(validated_env_vars.get("phi_4_api_key")),
@@ -192,37 +295,97 @@ async def health_check():
             "foundry_key": bool(validated_env_vars.get("FOUNDRY_KEY")),
             "gpt_endpoint": bool(os.environ.get("gpt_endpoint")),
         },
+        "image_description_cache": image_description_cache.stats(),
+        "image_preprocessing": image_preprocessing_report(),
+        "image_jobs": image_job_service.stats() if image_job_service else None,
+        "image_generation_cache": generation_cache.stats(),
+        "disk_cache": disk_cache.stats(),
+        "handoff": handoff_service.stats() if handoff_service else None,
+        "speculation": speculative_executor.stats() if speculative_executor else None,
+        "agent_conversations": conversation_registry.stats() if conversation_registry else None,
     }
 
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     session_start_time = time.time()
-    session_id = str(uuid.uuid4())
+    session_id = resolve_session_id(websocket.query_params.get("session_id"))
     logger.info("WebSocket Session Started")
 
     await websocket.accept()
+    # Tell the client which session it is on so it can resume it after a reconnect
+    await websocket.send_text(
+        fast_json_dumps({"type": "session", "session_id": session_id})
+    )
 
     chat_history: Deque[Tuple[str, str]] = deque(maxlen=5)
 
+    # Restore session-level state from the session store (fresh state for new sessions)
+    stored_state = await asyncio.to_thread(session_store.load, session_id)
+    if stored_state.domain:
+        handoff_service.set_domain(session_id, stored_state.domain)
+
     # Session-level state variables
     customer_loyalty_executed = (
-        False  # Flag to track if customer loyalty task has been executed
-    )
+        stored_state.customer_loyalty_executed
+    )  # Flag to track if customer loyalty task has been executed
     session_discount_percentage = (
-        ""  # Session-level variable to track discount_percentage
-    )
-    session_loyalty_response = None  # Store the full loyalty response for later
+        stored_state.discount_percentage
+    )  # Session-level variable to track discount_percentage
+    session_loyalty_response = (
+        stored_state.loyalty_response
+    )  # Store the full loyalty response for later
     loyalty_response_sent = (
-        False  # Flag to track if loyalty response has been sent to user
-    )
-    persistent_image_url = ""  # Session-level variable to track persistent image URL
-    persistent_cart = []  # Session-level variable to track persistent cart state
-    image_cache = {}  # Dictionary to cache image URLs and their descriptions
+        stored_state.loyalty_response_sent
+    )  # Flag to track if loyalty response has been sent to user
+    persistent_image_url = (
+        stored_state.image_url
+    )  # Session-level variable to track persistent image URL
+    persistent_cart = stored_state.cart  # Session-level variable to track persistent cart state
     bad_prompts = set()  # Set to track bad prompts for redaction
     raw_io_history = deque(
-        maxlen=100
+        stored_state.raw_io_history, maxlen=RAW_IO_HISTORY_MAXLEN
     )  # Use deque with maxlen for raw_io_history to prevent unbounded growth
+    pending_io_history = []  # raw_io_history entries not yet written to the store
+    connection_image_jobs = set()  # Image jobs started on this connection (cancelled on disconnect)
+
+    def record_io(entry: dict):
+        # Per-session sequence number, stored with the entry: agent conversations
+        # anchor on it (see io_entries_since), so reloads from the store keep it
+        seq = raw_io_history[-1].get("seq", 0) + 1 if raw_io_history else 1
+        entry = {"seq": seq, **entry}
+        raw_io_history.append(entry)
+        pending_io_history.append(entry)
+
+    async def persist_session_state():
+        """
+        Write this connection's changes to the session store (optimistic, retried on conflict).
+
+        I/O entries stay pending until a write succeeds, so a failed write is
+        retried by the next one.
+        """
+        new_entries = list(pending_io_history)
+
+        def apply(state):
+            state.domain = handoff_service.get_current_domain(session_id)
+            state.cart = persistent_cart
+            state.discount_percentage = session_discount_percentage
+            state.loyalty_response = session_loyalty_response
+            state.loyalty_response_sent = loyalty_response_sent
+            state.customer_loyalty_executed = customer_loyalty_executed
+            state.image_url = persistent_image_url
+            # Merge rather than overwrite, other connections may have appended too
+            state.raw_io_history = (state.raw_io_history + new_entries)[
+                -RAW_IO_HISTORY_MAXLEN:
+            ]
+
+        try:
+            await asyncio.to_thread(session_store.update, session_id, apply)
+        except Exception:
+            logger.error("Failed to persist session state", exc_info=True)
+            return
+        # Entries recorded while the write was in flight stay pending
+        del pending_io_history[: len(new_entries)]
 
     async def run_customer_loyalty_task(customer_id):
         start_time = time.time()
@@ -241,7 +404,6 @@ async def websocket_endpoint(websocket: WebSocket):
             processor = get_or_create_agent_processor(
                 agent_id=customer_loyalty_id,
                 agent_type="customer_loyalty",
-                thread_id=None,
                 project_client=project_client,
             )
             bot_reply = ""
@@ -265,6 +427,106 @@ async def websocket_endpoint(websocket: WebSocket):
                 f"Discount: {session_discount_percentage}",
             )
 
+    def build_agent_context(
+        agent_name: str, enriched_message: str, formatted_history: str, conversation=None
+    ) -> str:
+        """Context for the agent from this session's history (see history_utils.build_agent_context)."""
+        return build_session_agent_context(
+            agent_name,
+            enriched_message,
+            formatted_history,
+            raw_io_history,
+            2 * chat_history.maxlen,
+            conversation,
+        )
+
+    def make_answer_forwarder(agent_name: str):
+        """
+        Forward the partial "answer" text to the user as tokens arrive,
+        so time-to-first-token becomes the user-visible latency.
+        Products and cart are handed over as soon as their values close.
+        """
+        stream_parser = AgentResponseStreamParser()
+
+        async def forward_answer_delta(delta: str):
+            for event in stream_parser.feed(delta):
+                if event.kind == "answer_delta":
+                    await websocket.send_text(
+                        fast_json_dumps(
+                            {
+                                "type": "answer_delta",
+                                "delta": event.value,
+                                "agent": agent_name,
+                            }
+                        )
+                    )
+                elif event.kind == "field" and event.name in (
+                    "products",
+                    "cart",
+                ):
+                    await websocket.send_text(
+                        fast_json_dumps(
+                            {
+                                "type": "answer_field",
+                                "field": event.name,
+                                "value": event.value,
+                                "agent": agent_name,
+                            }
+                        )
+                    )
+
+        return forward_answer_delta
+
+    async def run_agent(
+        agent_name: str, agent_selected: str, agent_context: str, on_delta, conversation=None
+    ) -> str:
+        """
+        Run the agent through its AgentProcessor, streaming deltas to ``on_delta``; returns the full reply.
+        With a ``conversation`` the turn continues the session's conversation with this agent.
+        """
+        # Get or create an AgentProcessor instance for the selected agent.
+        # The processor manages the agent's execution lifecycle and streams
+        # responses back token-by-token for a better user experience.
+        processor = get_or_create_agent_processor(
+            agent_id=agent_selected,  # Agent ID from environment variables
+            agent_type=agent_name,  # Agent type (cora, cart_manager, etc.)
+            project_client=project_client,  # Foundry client for agent execution
+        )
+        bot_reply = ""
+        # Stream response from agent (deltas go to on_delta, the full reply is yielded last)
+        async for msg in processor.run_conversation_with_text_stream(
+            input_message=agent_context, on_delta=on_delta, conversation=conversation
+        ):
+            bot_reply = extract_bot_reply(msg)  # Extract text from streaming message
+        return bot_reply
+
+    def start_speculation(formatted_history: str):
+        """Start the current domain's agent before classification (text-only turns of enabled domains)."""
+        domain = handoff_service.get_current_domain(session_id)
+        agent_selected = validated_env_vars.get(domain) if domain else None
+        if image_url or not agent_selected or not speculative_executor.should_speculate(domain):
+            return None
+        message = user_message
+
+        async def prepare() -> str:
+            # Same enrichment as the regular path for a message without an image
+            enriched_message = message
+            if domain in PRODUCT_RECOMMENDATION_AGENTS:
+                products = await asyncio.to_thread(product_recommendations, message)
+                if products:
+                    enriched_message = f"{message}\n\nAvailable products: {fast_json_dumps(products)}"
+            return build_agent_context(domain, enriched_message, formatted_history)
+
+        async def execute(agent_context: str, on_delta) -> str:
+            # A fresh conversation: a cancelled run must not leave the user
+            # message in the session's persistent one
+            return await run_agent(domain, agent_selected, agent_context, on_delta)
+
+        return speculative_executor.start(domain, prepare, execute)
+
+    # Paired with disconnect_session in the finally below, so the routing
+    # table only holds sessions with an open websocket
+    handoff_service.connect_session(session_id)
     try:
         while True:
             message_start_time = time.time()
@@ -276,6 +538,13 @@ async def websocket_endpoint(websocket: WebSocket):
                 image_url = parsed.get("image_url", "")
                 conversation_history = parsed.get("conversation_history", "")
                 cart = parsed.get("cart", [])
+                if image_url:
+                    # Client supplied: only http(s) URLs and data:image/ URIs are ever fetched
+                    try:
+                        validate_image_source(image_url)
+                    except ValueError as e:
+                        logger.warning(f"Ignoring image_url: {e}")
+                        image_url = ""
 
                 # # Update persistent image URL if a new one is provided
                 if image_url:
@@ -284,14 +553,12 @@ async def websocket_endpoint(websocket: WebSocket):
                         "Persistent image URL updated",
                         extra={"url": persistent_image_url},
                     )
-                    log_cache_status(image_cache, image_url)
                     # Pre-fetch the image description asynchronously
-                    asyncio.create_task(
-                        pre_fetch_image_description(image_url, image_cache)
-                    )
+                    if image_analysis_mode != "local":
+                        asyncio.create_task(pre_fetch_image_description(image_url))
 
                 # Append user message to raw_io_history
-                raw_io_history.append({"input": user_message, "cart": persistent_cart})
+                record_io({"input": user_message, "cart": persistent_cart})
                 log_timing(
                     "Message Parsing",
                     message_start_time,
@@ -346,6 +613,7 @@ async def websocket_endpoint(websocket: WebSocket):
                 asyncio.create_task(run_customer_loyalty_task(customer_id))
                 customer_loyalty_executed = True
             # Run handoff service
+            speculation = None
             try:
                 print("Entering handoff service.")
                 handoff_start_time = time.time()
@@ -355,9 +623,12 @@ async def websocket_endpoint(websocket: WebSocket):
                 logger.info(
                     "Handoff agent execution initiated - commencing agent selection protocol"
                 )
+                # Most turns stay in the current domain: its agent may already start
+                speculation = start_speculation(formatted_history)
                 with tracer.start_as_current_span("Handoff Intent Classification"):
                     # Intent classification using structured outputs for reliable routing
-                    intent_result = handoff_service.classify_intent(
+                    # Awaited: only this session waits; on timeout the current domain is kept
+                    intent_result = await handoff_service.classify_intent_async(
                         user_message=user_message,
                         session_id=session_id,
                         chat_history=formatted_history,
@@ -387,6 +658,8 @@ async def websocket_endpoint(websocket: WebSocket):
 
                 # Check if agent selection failed
                 if not agent_selected or not agent_name:
+                    if speculation is not None:
+                        await speculative_executor.cancel(speculation)
                     await websocket.send_text(
                         fast_json_dumps(
                             {
@@ -399,6 +672,8 @@ async def websocket_endpoint(websocket: WebSocket):
                     continue
             except Exception as e:
                 logger.error("Error during handoff classification", exc_info=True)
+                if speculation is not None:
+                    await speculative_executor.cancel(speculation)
                 await websocket.send_text(
                     fast_json_dumps(
                         {
@@ -423,9 +698,20 @@ async def websocket_endpoint(websocket: WebSocket):
                 agent_execution_start_time = time.time()
                 logger.info(f"{agent_name} agent execution initiated")
 
+                # Reply of the speculative run if classification confirmed its domain
+                speculative_reply = None
+                if speculation is not None:
+                    speculative_reply = await speculative_executor.resolve(
+                        speculation,
+                        domain=intent_result["agent_id"],
+                        is_domain_change=intent_result["is_domain_change"],
+                        forward=make_answer_forwarder(agent_name),
+                    )
+
                 # Initialize context enrichment variables
                 enriched_message = user_message  # Base message
                 image_data = None  # Image description from vision analysis
+                room_colors = []  # Dominant colors matched to the paint palette
                 products = None  # Product recommendations from AI Search
 
                 # =============================================================================
@@ -437,14 +723,19 @@ async def websocket_endpoint(websocket: WebSocket):
 
                 # Process multimodal inputs if present
                 if image_url:
+                    # COLOR ANALYSIS: dominant colors mapped to Zava paints in a few ms,
+                    # runs alongside the vision call (or replaces it in "local" mode)
+                    room_colors_task = asyncio.create_task(get_room_colors(image_url))
+
                     # IMAGE ANALYSIS: Extract visual information from uploaded images
                     # Uses phi-4 vision model with caching to avoid re-analyzing same image
-                    # Results are cached for the session and shared across agents
+                    # Results are cached per worker by image content and shared across sessions
                     image_start_time = time.time()
-                    log_cache_status(image_cache, image_url)
-                    image_data = await get_cached_image_description(
-                        image_url, image_cache
-                    )
+                    if image_analysis_mode != "local":
+                        image_data = await get_cached_image_description(image_url)
+                    room_colors = await room_colors_task
+                    if room_colors and not image_data:
+                        image_data = f"Room colors: {describe_room_colors(room_colors)}"
                     log_timing(
                         "Image Analysis", image_start_time, f"URL: {image_url[:50]}..."
                     )
@@ -471,17 +762,18 @@ async def websocket_endpoint(websocket: WebSocket):
                 # =============================================================================
 
                 # Get product recommendations for relevant agents
-                if agent_name in [
-                    "interior_designer",
-                    "interior_designer_create_image",
-                    "cora",
-                ]:
+                if agent_name in PRODUCT_RECOMMENDATION_AGENTS and speculative_reply is None:
                     product_start_time = time.time()
                     # Build search query from all available context
                     search_query = user_message
                     if image_data:
                         # Add visual context to search (e.g., "blue living room" → search for blue paint)
                         search_query += f" {image_data} paint accessories, paint sprayers, drop cloths, painters tape"
+                    if room_colors:
+                        # Exact palette matches for the room's dominant colors
+                        search_query += " " + " ".join(
+                            f"{color['palette_match']['name']} paint" for color in room_colors
+                        )
 
                     products = product_recommendations(search_query)
                     log_timing(
@@ -504,6 +796,10 @@ async def websocket_endpoint(websocket: WebSocket):
                     context_parts = []
                     if image_data:
                         context_parts.append(f"Image description: {image_data}")
+                    if room_colors and image_analysis_mode != "local":
+                        context_parts.append(
+                            f"Room colors: {describe_room_colors(room_colors)}"
+                        )
                     if products:
                         context_parts.append(
                             f"Available products: {fast_json_dumps(products)}"
@@ -526,6 +822,7 @@ async def websocket_endpoint(websocket: WebSocket):
 
                 # Execute agent based on type - unified agent processor pattern
                 bot_reply = ""
+                conversation = None
 
                 with tracer.start_as_current_span(f"{agent_name.title()} Agent Call"):
                     # =================================================================
@@ -534,6 +831,30 @@ async def websocket_endpoint(websocket: WebSocket):
                     # This is the only case that doesn't use the unified agent pattern
                     # because it generates images via gpt-image-1 API rather than conversing
                     if agent_name == "interior_designer_create_image":
+                        # Reject off-palette colors locally instead of after a paid edit call.
+                        # Only the user's own words are checked: the image description
+                        # describes the current room and may mention any color.
+                        palette_check = validate_paint_request(user_message)
+                        if not palette_check.is_valid:
+                            response_data = {
+                                "answer": palette_check.message,
+                                "products": "",
+                                "palette_suggestions": palette_check.suggestions,
+                                "agent": "interior_designer",
+                                "cart": persistent_cart,
+                            }
+                            response_json = fast_json_dumps(response_data)
+                            record_io({"output": response_json, "cart": persistent_cart})
+                            chat_history.append(("bot", palette_check.message))
+                            await websocket.send_text(response_json)
+                            await persist_session_state()
+                            log_timing(
+                                "Agent Execution",
+                                agent_execution_start_time,
+                                f"Agent: {agent_name} (off-palette request rejected locally)",
+                            )
+                            continue
+
                         # Acknowledge image creation request
                         thank_you_msg = get_rotating_message(IMAGE_CREATE_MESSAGES)
                         await websocket.send_text(
@@ -549,96 +870,103 @@ async def websocket_endpoint(websocket: WebSocket):
                         # Use persistent image URL for context (e.g., "make this room blue")
                         if persistent_image_url:
                             image_data = await get_cached_image_description(
-                                persistent_image_url, image_cache
+                                persistent_image_url
                             )
                             enriched_message = f"{user_message} {image_data}"
 
-                        # Create image using gpt-image-1
-                        image = create_image(
-                            text=enriched_message, image_url=persistent_image_url
-                        )
+                        # Create image using gpt-image-1 as a background job so the chat
+                        # stays responsive; progress and the result arrive as events
+                        async def on_image_job_event(job, event):
+                            await websocket.send_text(fast_json_dumps(event))
+                            if job.status not in (COMPLETED, FAILED):
+                                return
+                            connection_image_jobs.discard(job.job_id)
+
+                            # Build response with generated image URL
+                            response_data = {
+                                "answer": "Here is the requested image"
+                                if job.status == COMPLETED
+                                else "Sorry, I couldn't create the image. Please try again.",
+                                "products": "",
+                                "discount_percentage": session_discount_percentage or "",
+                                "image_url": job.result,
+                                "additional_data": "",
+                                "cart": persistent_cart,
+                                "agent": "interior_designer",
+                            }
 
-                        # Build response with generated image URL
-                        response_data = {
-                            "answer": "Here is the requested image",
-                            "products": "",
-                            "discount_percentage": session_discount_percentage or "",
-                            "image_url": image,
-                            "additional_data": "",
-                            "cart": persistent_cart,
-                        }
+                            # Send response
+                            response_json = fast_json_dumps(response_data)
+                            record_io({"output": response_json, "cart": persistent_cart})
+                            chat_history.append(("bot", response_data["answer"]))
 
-                        # Send response
-                        response_json = fast_json_dumps(response_data)
-                        raw_io_history.append(
-                            {"output": response_json, "cart": persistent_cart}
-                        )
+                            await websocket.send_text(response_json)
+                            await persist_session_state()
 
-                        bot_answer = response_data.get("answer", "")
-                        product_names = extract_product_names_from_response(
-                            response_data
-                        )
-                        chat_history.append(("bot", bot_answer + product_names))
+                        try:
+                            job = image_job_service.submit(
+                                owner=session_id,
+                                prompt=enriched_message,
+                                image_url=persistent_image_url,
+                                on_event=on_image_job_event,
+                            )
+                            connection_image_jobs.add(job.job_id)
+                        except ImageJobRejected as e:
+                            logger.info(f"Image job rejected: {e}")
+                            await websocket.send_text(
+                                fast_json_dumps(
+                                    {
+                                        "answer": "I'm still working on your previous image. "
+                                        "I'll share it as soon as it's ready.",
+                                        "agent": "interior_designer",
+                                        "cart": persistent_cart,
+                                    }
+                                )
+                            )
 
-                        await websocket.send_text(response_json)
                         log_timing(
                             "Agent Execution",
                             agent_execution_start_time,
-                            f"Agent: {agent_name}",
+                            f"Agent: {agent_name} (image job queued)",
                         )
                         continue  # Skip common response handling
 
                     # =================================================================
-                    # AGENT-SPECIFIC CONTEXT PREPARATION
+                    # AGENT-SPECIFIC CONTEXT PREPARATION + UNIFIED AGENT PROCESSOR EXECUTION
                     # =================================================================
-                    # Each agent type receives context tailored to its needs:
-                    # - cart_manager: Full raw I/O history for tracking cart state changes
-                    # - cora: Formatted conversation history for contextual responses
-                    # - Others: Enriched message with multimodal + product data
+                    # Each agent type receives context tailored to its needs (see
+                    # build_agent_context), then runs through its AgentProcessor with
+                    # answer deltas forwarded to the user (see run_agent).
+                    # A committed speculative run has already produced the reply.
                     # =================================================================
-
-                    # Prepare context based on agent type
-                    agent_context = enriched_message  # Default: enriched message
-
-                    # Cart manager needs full raw_io_history for state management
-                    if agent_name == "cart_manager":
-                        # Provide complete interaction history so cart_manager can track
-                        # all add/remove operations and maintain accurate cart state
-                        agent_context = f"{enriched_message}\n\nRAW_IO_HISTORY:\n{fast_json_dumps(list(raw_io_history), option=orjson.OPT_INDENT_2)}"
-
-                    # Cora needs conversation history for contextual dialogue
-                    elif agent_name == "cora":
-                        # Provide formatted chat history so cora can reference previous
-                        # conversation turns and maintain coherent multi-turn dialogue
-                        agent_context = (
-                            f"{formatted_history}\n\nUser: {enriched_message}"
+                    if speculative_reply is not None:
+                        bot_reply = speculative_reply
+                    else:
+                        # Continue this session's conversation with the agent, if any
+                        conversation = conversation_registry.get(session_id, agent_name)
+                        agent_context = build_agent_context(
+                            agent_name, enriched_message, formatted_history, conversation
                         )
-
-                    # =================================================================
-                    # UNIFIED AGENT PROCESSOR EXECUTION (All agents use this pattern!)
-                    # =================================================================
-                    # Get or create an AgentProcessor instance for the selected agent.
-                    # The processor manages the agent's execution lifecycle and streams
-                    # responses back token-by-token for a better user experience.
-                    #
-                    # This replaces the old if-else branching with a single unified flow.
-                    # =================================================================
-
-                    # All agents use unified agent processor pattern
-                    processor = get_or_create_agent_processor(
-                        agent_id=agent_selected,  # Agent ID from environment variables
-                        agent_type=agent_name,  # Agent type (cora, cart_manager, etc.)
-                        thread_id=None,  # Conversation thread for stateful agents
-                        project_client=project_client,  # Foundry client for agent execution
-                    )
-
-                    # Stream response from agent (yields chunks as they're generated)
-                    async for msg in processor.run_conversation_with_text_stream(
-                        input_message=agent_context
-                    ):
-                        bot_reply = extract_bot_reply(
-                            msg
-                        )  # Extract text from streaming message
+                        try:
+                            bot_reply = await run_agent(
+                                agent_name,
+                                agent_selected,
+                                agent_context,
+                                make_answer_forwarder(agent_name),
+                                conversation,
+                            )
+                        except ConversationNotFoundError:
+                            # Gone on the server (conversation reset): start over with the full context
+                            agent_context = build_agent_context(
+                                agent_name, enriched_message, formatted_history, conversation
+                            )
+                            bot_reply = await run_agent(
+                                agent_name,
+                                agent_selected,
+                                agent_context,
+                                make_answer_forwarder(agent_name),
+                                conversation,
+                            )
 
                 logger.info(f"{agent_name} agent execution completed")
 
@@ -722,9 +1050,11 @@ async def websocket_endpoint(websocket: WebSocket):
                 response_json = fast_json_dumps(
                     {**parsed_response, "cart": persistent_cart}
                 )
-                raw_io_history.append(
-                    {"output": response_json, "cart": persistent_cart}
-                )
+                record_io({"output": response_json, "cart": persistent_cart})
+                if conversation is not None:
+                    # The agent has seen everything up to its own reply
+                    conversation.io_anchor = raw_io_history[-1]["seq"]
+                    conversation_registry.save(session_id, conversation)
                 await websocket.send_text(response_json)
 
                 # =============================================================================
@@ -750,6 +1080,8 @@ async def websocket_endpoint(websocket: WebSocket):
                     )
                     loyalty_response_sent = True
 
+                await persist_session_state()
+
             # =============================================================================
             # ERROR HANDLING: Failure during agent execution
             # =============================================================================
@@ -801,21 +1133,17 @@ async def websocket_endpoint(websocket: WebSocket):
     # log the total session duration for monitoring and performance analysis.
     # =============================================================================
     finally:
+        for job_id in list(connection_image_jobs):
+            image_job_service.cancel(job_id)
+        await persist_session_state()
+        # After persisting: the domain is read from the handoff service above
+        handoff_service.disconnect_session(session_id)
         session_duration = time.time() - session_start_time
         logger.info(f"WebSocket Session Ended - Duration: {session_duration:.3f}s")
 
 
 if __name__ == "__main__":
     import datetime
-    import atexit
-
-    # Register cleanup function
-    def cleanup():
-        """Cleanup function to close thread pool on shutdown."""
-        logger.info("Shutting down thread pool executor")
-        thread_pool.shutdown(wait=True)
-
-    atexit.register(cleanup)
 
     now = datetime.datetime.now()
     # Format date as '19th June 4.51PM'
@@ -829,4 +1157,8 @@ if __name__ == "__main__":
         import uvicorn
 
         port = int(os.environ.get("PORT", 8000))
-        uvicorn.run("chat_app:app", host="0.0.0.0", port=port)
+        # Each worker is a separate process with its own event loop, thread pool
+        # and clients (see init_worker). A websocket stays on the worker that accepted it.
+        uvicorn.run(
+            "chat_app:app", host="0.0.0.0", port=port, workers=web_concurrency
+        )
@@ -193,7 +193,6 @@ async def websocket_endpoint(websocket: WebSocket):
             processor = get_or_create_agent_processor(
                 agent_id=customer_loyalty_id,
                 agent_type="customer_loyalty",
-                thread_id=None,
                 project_client=project_client
             )
             bot_reply = ""
@@ -487,7 +486,6 @@ async def websocket_endpoint(websocket: WebSocket):
             #         processor = get_or_create_agent_processor(
             #             agent_id=agent_selected,     # Agent ID from environment variables
             #             agent_type=agent_name,       # Agent type (cora, cart_manager, etc.)
-            #             thread_id=None,              # Conversation thread for stateful agents
             #             project_client=project_client  # Foundry client for agent execution
             #         )
                     
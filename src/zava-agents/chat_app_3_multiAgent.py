@@ -12,14 +12,13 @@ from dotenv import load_dotenv
 from opentelemetry import trace
 import logging
 
-from opentelemetry.instrumentation.openai_v2 import OpenAIInstrumentor
 
 # Azure & OpenAI Imports
 from azure.ai.projects import AIProjectClient
 from azure.identity import DefaultAzureCredential
 from openai import AzureOpenAI
 
-from azure.monitor.opentelemetry import configure_azure_monitor
+from utils.telemetry_utils import configure_telemetry
 from azure.ai.agents.telemetry import trace_function
 
 # FastAPI Imports
@@ -73,11 +72,8 @@ logger = logging.getLogger(__name__)
 # Global thread pool executor for CPU-bound operations
 thread_pool = ThreadPoolExecutor(max_workers=4)
 
-application_insights_connection_string = os.environ[
-    "APPLICATIONINSIGHTS_CONNECTION_STRING"
-]
-configure_azure_monitor(connection_string=application_insights_connection_string)
-OpenAIInstrumentor().instrument()
+# Once per process; AgentProcessor calls it too and the second call is a no-op
+configure_telemetry()
 
 scenario = os.path.basename(__file__)
 tracer = trace.get_tracer(__name__)
@@ -252,7 +248,6 @@ async def websocket_endpoint(websocket: WebSocket):
             processor = get_or_create_agent_processor(
                 agent_id=customer_loyalty_id,
                 agent_type="customer_loyalty",
-                thread_id=None,
                 project_client=project_client,
             )
             bot_reply = ""
@@ -638,7 +633,6 @@ async def websocket_endpoint(websocket: WebSocket):
                     processor = get_or_create_agent_processor(
                         agent_id=agent_selected,  # Agent ID from environment variables
                         agent_type=agent_name,  # Agent type (cora, cart_manager, etc.)
-                        thread_id=None,  # Conversation thread for stateful agents
                         project_client=project_client,  # Foundry client for agent execution
                     )
 
@@ -0,0 +1,90 @@
+"""Shared test doubles for the test_*.py modules."""
+import threading
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+from blob_stub_server import BlobStubServer
+
+
+@pytest.fixture
+def blob_server():
+    # Local stand-in for Azurite / Azure Blob Storage
+    with BlobStubServer() as server:
+        server.containers.update({"zava", "other"})
+        yield server
+
+
+class FakeStream:
+    """Response stream of ``text`` in output_text deltas; records how far it was read."""
+
+    def __init__(self, text, chunk_size=8):
+        self.chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        self.consumed = 0
+        self.closed = False
+
+    def __iter__(self):
+        yield SimpleNamespace(type="response.created")
+        for chunk in self.chunks:
+            self.consumed += 1
+            yield SimpleNamespace(type="response.output_text.delta", delta=chunk)
+        yield SimpleNamespace(type="response.completed")
+
+    def close(self):
+        self.closed = True
+
+
+class FakeOpenAIClient:
+    """
+    Stand-in for the OpenAI client answering every response with one classification.
+
+    ``domain`` and ``confidence`` may be changed between calls. ``calls`` records
+    (name, kwargs) of every call made.
+    """
+
+    def __init__(
+        self,
+        domain="cart_manager",
+        confidence=0.92,
+        reasoning="The user asked to check out, which is a cart operation handled by the cart manager.",
+    ):
+        self.domain = domain
+        self.confidence = confidence
+        self.reasoning = reasoning
+        self.calls = []
+        self.deleted = threading.Event()
+        self.stream = FakeStream(self.classification())
+        self.conversations = SimpleNamespace(create=self._create_conversation, delete=self._delete_conversation)
+        self.responses = SimpleNamespace(create=self._create_response)
+
+    def classification(self) -> str:
+        return orjson.dumps({
+            "domain": self.domain,
+            "is_domain_change": True,
+            "confidence": self.confidence,
+            "reasoning": self.reasoning,
+        }).decode()
+
+    def call_names(self):
+        return [name for name, _ in self.calls]
+
+    def _create_conversation(self, **kwargs):
+        self.calls.append(("conversations.create", kwargs))
+        return SimpleNamespace(id="conv_1")
+
+    def _delete_conversation(self, conversation_id):
+        self.calls.append(("conversations.delete", conversation_id))
+        self.deleted.set()
+
+    def _create_response(self, **kwargs):
+        self.calls.append(("responses.create", kwargs))
+        if kwargs.get("stream"):
+            return self.stream
+        return SimpleNamespace(output_text=self.classification())
+
+
+@pytest.fixture
+def openai_client():
+    """Factory of FakeOpenAIClient: ``openai_client(domain=..., confidence=...)``."""
+    return FakeOpenAIClient
@@ -0,0 +1,351 @@
+"""
+Offline evaluation of handoff routing.
+
+Replays data/handoff_service_evaluation_grounded.jsonl through
+HandoffService.classify_intent_async with bounded concurrency and reports
+accuracy per expected domain, a confusion matrix, latency percentiles, token
+usage and how each message was answered (local, cache, llm, fallback).
+Every example runs in its own session starting in its "Current domain"
+(the default domain when the query has none). Results are written as
+indented, key-sorted JSON so runs can be diffed over time.
+
+Against the deployed handoff-service agent (FOUNDRY_ENDPOINT, as chat_app):
+
+    python evaluate_handoff.py --backend foundry --concurrency 4 --output results/handoff-foundry.json
+
+Against a local stub backend (no Azure calls): the stub answers with the
+local intent classifier trained on the seed phrases only, with simulated
+latency and token counts, to exercise routing changes end to end:
+
+    python evaluate_handoff.py --backend stub --local-classifier --output results/handoff-stub.json
+
+Compare with an earlier run:
+
+    python evaluate_handoff.py --backend stub --baseline results/handoff-stub.json
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import numpy as np
+import orjson
+
+from services.handoff_service import AGENT_DOMAINS, CLASSIFICATION_MODES, HandoffService
+from services.intent_classifier import (
+    DEFAULT_TRAINING_PATH,
+    LocalIntentClassifier,
+    load_evaluation_records,
+    parse_evaluation_query,
+)
+from services.routing_cache import RoutingCache
+
+CHARS_PER_TOKEN = 4
+
+
+def load_examples(path: str = DEFAULT_TRAINING_PATH) -> List[Dict[str, Any]]:
+    """Read the evaluation JSONL as dicts with id, current_domain, message and expected."""
+    return load_evaluation_records(path)
+
+
+class StubAgentClient:
+    """
+    Local stand-in for the async OpenAI client of the handoff-service agent.
+
+    Classifies with a LocalIntentClassifier trained on the seed phrases only
+    (not on the evaluation file), and charges a round trip, a
+    time-to-first-token and a per-token generation time per response.
+    """
+
+    def __init__(self, rtt: float = 0.06, ttft: float = 0.35, per_token: float = 0.012, jitter: float = 0.2):
+        self.rtt, self.ttft, self.per_token, self.jitter = rtt, ttft, per_token, jitter
+        self.classifier = LocalIntentClassifier()
+        self.responses = SimpleNamespace(create=self._create_response)
+        self.conversations = SimpleNamespace(create=self._create_conversation, delete=self._delete_conversation)
+        self._conversations: Dict[str, str] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _create_conversation(self, items, **kwargs):
+        await self._sleep(self.rtt)
+        conversation_id = f"conv_{len(self._conversations) + 1}"
+        self._conversations[conversation_id] = items[0]["content"]
+        return SimpleNamespace(id=conversation_id)
+
+    async def _delete_conversation(self, conversation_id):
+        self._conversations.pop(conversation_id, None)
+
+    async def _create_response(self, input, stream=False, conversation=None, **kwargs):
+        prompt = self._conversations[conversation] if conversation else input[0]["content"]
+        output = self._classify(prompt)
+        output_tokens = [output[i:i + CHARS_PER_TOKEN] for i in range(0, len(output), CHARS_PER_TOKEN)]
+        usage = SimpleNamespace(input_tokens=len(prompt) // CHARS_PER_TOKEN, output_tokens=len(output_tokens))
+        if stream:
+            return _StubStream(self, output_tokens)
+        self._enter()
+        try:
+            await self._sleep(self.rtt + self.ttft + self.per_token * len(output_tokens))
+        finally:
+            self.in_flight -= 1
+        return SimpleNamespace(output_text=output, usage=usage)
+
+    def _classify(self, prompt: str) -> str:
+        lines = [line.strip() for line in prompt.strip().splitlines()]
+        current_domain, message = parse_evaluation_query("\n".join(lines))
+        intent = self.classifier.classify(message, current_domain)
+        return orjson.dumps({
+            "domain": intent.domain,
+            "is_domain_change": intent.domain != current_domain,
+            "confidence": round(intent.confidence, 3),
+            "reasoning": f"Stub backend: {intent.reasoning}",
+        }).decode()
+
+    def _enter(self) -> None:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    async def _sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            await asyncio.sleep(seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+
+class _StubStream:
+    def __init__(self, client: StubAgentClient, tokens: List[str]):
+        self.client, self.tokens = client, tokens
+
+    async def __aiter__(self):
+        self.client._enter()
+        try:
+            await self.client._sleep(self.client.rtt + self.client.ttft)
+            for token in self.tokens:
+                await self.client._sleep(self.client.per_token)
+                yield SimpleNamespace(type="response.output_text.delta", delta=token)
+        finally:
+            self.client.in_flight -= 1
+
+    async def close(self):
+        pass
+
+
+async def replay(
+    service: HandoffService,
+    examples: List[Dict[str, Any]],
+    concurrency: int = 8,
+    repeat: int = 1,
+) -> List[Dict[str, Any]]:
+    """
+    Classify every example (``repeat`` times), at most ``concurrency`` at once.
+
+    Returns:
+        One record per classification with the prediction and latency
+    """
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run(round_index: int, example: Dict[str, Any]) -> Dict[str, Any]:
+        session_id = f"eval-{round_index}-{example['id']}"
+        service.set_domain(session_id, example["current_domain"] or service.default_domain)
+        async with slots:
+            start = time.perf_counter()
+            result = await service.classify_intent_async(example["message"], session_id)
+            latency_ms = (time.perf_counter() - start) * 1000
+        service.reset_session(session_id)
+        return {
+            **example,
+            "round": round_index,
+            "predicted": result["domain"],
+            "correct": result["domain"] == example["expected"],
+            "confidence": result["confidence"],
+            "reasoning": result["reasoning"],
+            "latency_ms": round(latency_ms, 3),
+        }
+
+    return list(await asyncio.gather(
+        *(run(round_index, example) for round_index in range(repeat) for example in examples)
+    ))
+
+
+def summarize(records: List[Dict[str, Any]], service_stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Accuracy per expected domain, confusion matrix, latency percentiles, token usage and answer paths."""
+    labels = sorted(set(AGENT_DOMAINS) | {record["predicted"] for record in records})
+    confusion = {expected: {predicted: 0 for predicted in labels} for expected in sorted(AGENT_DOMAINS)}
+    for record in records:
+        confusion.setdefault(record["expected"], {predicted: 0 for predicted in labels})
+        confusion[record["expected"]][record["predicted"]] += 1
+
+    per_domain = {}
+    for domain, row in confusion.items():
+        total = sum(row.values())
+        per_domain[domain] = {
+            "examples": total,
+            "correct": row.get(domain, 0),
+            "accuracy": round(row.get(domain, 0) / total, 4) if total else None,
+        }
+
+    latencies = [record["latency_ms"] for record in records]
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (0.0, 0.0, 0.0)
+    llm_calls = service_stats["llm"] + service_stats["fallback"]
+    input_tokens, output_tokens = service_stats["input_tokens"], service_stats["output_tokens"]
+    return {
+        "examples": len(records),
+        "accuracy": round(sum(record["correct"] for record in records) / len(records), 4) if records else None,
+        "per_domain": per_domain,
+        "confusion": confusion,
+        "latency_ms": {
+            "p50": round(float(p50), 3),
+            "p95": round(float(p95), 3),
+            "p99": round(float(p99), 3),
+            "mean": round(float(np.mean(latencies)), 3) if latencies else 0.0,
+        },
+        "tokens": {
+            "input": input_tokens,
+            "output": output_tokens,
+            "total": input_tokens + output_tokens,
+            "per_llm_call": round((input_tokens + output_tokens) / llm_calls, 1) if llm_calls else 0.0,
+        },
+        "answered_by": {path: service_stats[path] for path in ("local", "cache", "llm", "fallback", "timeout")},
+    }
+
+
+def compare(summary: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Human-readable differences between two run summaries."""
+
+    def delta(current, previous, scale=1.0, unit=""):
+        if current is None or previous is None:
+            return f"{current} (was {previous})"
+        return f"{current * scale:.1f}{unit} ({(current - previous) * scale:+.1f}{unit})"
+
+    lines = [f"accuracy {delta(summary['accuracy'], baseline['accuracy'], 100, '%')}"]
+    for domain, stats in summary["per_domain"].items():
+        previous = baseline["per_domain"].get(domain, {}).get("accuracy")
+        lines.append(f"  {domain:<18} {delta(stats['accuracy'], previous, 100, '%')}")
+    for percentile in ("p50", "p95", "p99"):
+        lines.append(
+            f"latency {percentile} {delta(summary['latency_ms'][percentile], baseline['latency_ms'][percentile], 1, ' ms')}"
+        )
+    tokens, previous_tokens = summary["tokens"]["total"], baseline["tokens"]["total"]
+    lines.append(f"tokens {tokens} ({tokens - previous_tokens:+d})")
+    changed = Counter()
+    for expected, row in summary["confusion"].items():
+        for predicted, count in row.items():
+            previous = baseline["confusion"].get(expected, {}).get(predicted, 0)
+            if count != previous:
+                changed[(expected, predicted)] = count - previous
+    for (expected, predicted), difference in sorted(changed.items()):
+        lines.append(f"  confusion {expected} -> {predicted}: {difference:+d}")
+    return lines
+
+
+def build_service(args) -> HandoffService:
+    if args.backend == "stub":
+        async_client = StubAgentClient(args.rtt_ms / 1000, args.ttft_ms / 1000, args.token_ms / 1000)
+        client = None
+    else:
+        from azure.ai.projects import AIProjectClient
+        from azure.ai.projects.aio import AIProjectClient as AsyncAIProjectClient
+        from azure.identity import DefaultAzureCredential
+        from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        endpoint = os.environ.get("FOUNDRY_ENDPOINT")
+        if not endpoint:
+            raise ValueError("FOUNDRY_ENDPOINT environment variable is required for --backend foundry")
+        client = AIProjectClient(endpoint=endpoint, credential=DefaultAzureCredential()).get_openai_client()
+        async_client = AsyncAIProjectClient(
+            endpoint=endpoint, credential=AsyncDefaultAzureCredential()
+        ).get_openai_client()
+
+    return HandoffService(
+        azure_openai_client=client,
+        deployment_name=os.getenv("gpt_deployment", "gpt"),
+        local_classifier=LocalIntentClassifier() if args.local_classifier else None,
+        classification_mode=args.mode,
+        async_client=async_client,
+        timeout=args.timeout,
+        max_concurrent=args.concurrency,
+        routing_cache=RoutingCache() if args.routing_cache else None,
+    )
+
+
+def print_report(summary: Dict[str, Any]) -> None:
+    print(f"{summary['examples']} classifications, accuracy {summary['accuracy'] * 100:.1f}%")
+    print(f"{'expected domain':<18} {'examples':>8} {'accuracy':>9}")
+    for domain, stats in summary["per_domain"].items():
+        accuracy = f"{stats['accuracy'] * 100:.1f}%" if stats["accuracy"] is not None else "-"
+        print(f"{domain:<18} {stats['examples']:>8} {accuracy:>9}")
+
+    labels = list(next(iter(summary["confusion"].values())))
+    print("\nconfusion (rows expected, columns predicted)")
+    print(" " * 18 + "".join(f"{label[:10]:>11}" for label in labels))
+    for expected, row in summary["confusion"].items():
+        print(f"{expected:<18}" + "".join(f"{row[label]:>11}" for label in labels))
+
+    latency, tokens = summary["latency_ms"], summary["tokens"]
+    print(f"\nlatency ms: p50 {latency['p50']:.1f}, p95 {latency['p95']:.1f}, p99 {latency['p99']:.1f}")
+    print(f"tokens: {tokens['input']} in, {tokens['output']} out, {tokens['per_llm_call']:g} per LLM call")
+    print("answered by: " + ", ".join(f"{path} {count}" for path, count in summary["answered_by"].items()))
+
+
+async def evaluate(args) -> Dict[str, Any]:
+    examples = load_examples(args.dataset)
+    service = build_service(args)
+    try:
+        records = await replay(service, examples, args.concurrency, args.repeat)
+    finally:
+        if args.backend == "foundry":
+            await service.async_client.close()
+    return {
+        "run": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "dataset": os.path.relpath(args.dataset),
+            "backend": args.backend,
+            "mode": args.mode,
+            "concurrency": args.concurrency,
+            "repeat": args.repeat,
+            "local_classifier": args.local_classifier,
+            "routing_cache": args.routing_cache,
+        },
+        "summary": summarize(records, service.stats()),
+        "examples": sorted(records, key=lambda record: (record["round"], int(record["id"]))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=DEFAULT_TRAINING_PATH)
+    parser.add_argument("--backend", choices=("stub", "foundry"), default="stub")
+    parser.add_argument("--mode", choices=CLASSIFICATION_MODES, default="inline")
+    parser.add_argument("--concurrency", type=int, default=8, help="Classifications in flight at once")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the dataset this many times")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Deadline per classification in seconds")
+    parser.add_argument("--local-classifier", action="store_true", help="Put the local classifier in front of the LLM")
+    parser.add_argument("--routing-cache", action="store_true", help="Enable the routing cache (useful with --repeat)")
+    parser.add_argument("--rtt-ms", type=float, default=60, help="Stub backend round trip")
+    parser.add_argument("--ttft-ms", type=float, default=350, help="Stub backend time to first token")
+    parser.add_argument("--token-ms", type=float, default=12, help="Stub backend time per output token")
+    parser.add_argument("--output", help="Write the results JSON here")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare with")
+    args = parser.parse_args()
+
+    results = asyncio.run(evaluate(args))
+    print_report(results["summary"])
+    if args.baseline:
+        with open(args.baseline, "rb") as baseline_file:
+            baseline = orjson.loads(baseline_file.read())
+        print(f"\nvs {args.baseline} ({baseline['run']['timestamp']}):")
+        for line in compare(results["summary"], baseline["summary"]):
+            print(line)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "wb") as output_file:
+            output_file.write(orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Websocket load test for the chat app.
+
+Against a running server:
+
+    python load_test_chat_app.py --url ws://localhost:8000/ws --connections 50 --messages 5
+
+Throughput scaling with worker processes, without Azure dependencies: spawns
+`uvicorn load_test_chat_app:bench_app --workers N` for each N and drives it.
+bench_app runs the per-turn CPU work of chat_app (message decoding, history
+parsing and formatting, streamed and final agent-response parsing, response
+serialization) with a canned agent reply instead of LLM calls.
+
+    python load_test_chat_app.py --spawn-workers 1,2,4 --connections 64 --messages 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import deque
+
+import orjson
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+
+from utils.history_utils import format_chat_history, parse_conversation_history
+from utils.message_utils import fast_json_dumps
+from utils.response_utils import parse_agent_response
+from utils.stream_utils import AgentResponseStreamParser
+
+# ---------------------------------------------------------------------------
+# Benchmark app (CPU work of one chat turn, no external calls)
+# ---------------------------------------------------------------------------
+_CANNED_REPLY = json.dumps(
+    [
+        {
+            "answer": "Here are some paint options that would suit your living room. " * 4,
+            "image_output": "",
+            "products": [
+                {
+                    "id": f"PROD{i:04d}",
+                    "name": f"Shade {i}",
+                    "type": "Paint Shades",
+                    "description": "A crisp, subtle colour perfect for creating peaceful retreats. " * 2,
+                    "imageURL": f"https://example.blob.core.windows.net/images/{i}.png",
+                    "price": "$48.99",
+                }
+                for i in range(30)
+            ],
+            "cart": [],
+        }
+    ]
+)
+_REPLY_CHUNKS = [_CANNED_REPLY[i:i + 16] for i in range(0, len(_CANNED_REPLY), 16)]
+
+bench_app = FastAPI()
+
+
+@bench_app.get("/health")
+async def bench_health():
+    return {"status": "healthy", "worker_pid": os.getpid()}
+
+
+@bench_app.websocket("/ws")
+async def bench_websocket(websocket: WebSocket):
+    await websocket.accept()
+    chat_history = deque(maxlen=5)
+    try:
+        while True:
+            parsed = orjson.loads(await websocket.receive_text())
+            chat_history = parse_conversation_history(
+                parsed.get("conversation_history", ""), chat_history, parsed.get("message", "")
+            )
+            format_chat_history(chat_history)
+            stream_parser = AgentResponseStreamParser()
+            for chunk in _REPLY_CHUNKS:
+                stream_parser.feed(chunk)
+            response = parse_agent_response(_CANNED_REPLY)
+            await websocket.send_text(fast_json_dumps({**response, "agent": "cora", "cart": []}))
+    except WebSocketDisconnect:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Load generator
+# ---------------------------------------------------------------------------
+def _build_payload(turn: int) -> str:
+    history = "\n".join(
+        f"user: message {i}\nbot: {json.dumps([{'answer': f'reply {i}'}])}" for i in range(turn)
+    )
+    return json.dumps(
+        {"message": f"Show me blue paints ({turn})", "conversation_history": history, "has_image": False}
+    )
+
+
+async def _run_client(url: str, messages: int, latencies: list) -> int:
+    import websockets
+
+    completed = 0
+    async with websockets.connect(url, max_size=None) as ws:
+        for turn in range(messages):
+            start = time.perf_counter()
+            await ws.send(_build_payload(turn))
+            # Skip streaming/session events; a turn ends with the final structured message
+            while True:
+                data = json.loads(await ws.recv())
+                if "type" not in data and "answer" in data:
+                    break
+            latencies.append(time.perf_counter() - start)
+            completed += 1
+    return completed
+
+
+async def run_load(url: str, connections: int, messages: int) -> dict:
+    latencies: list = []
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(_run_client(url, messages, latencies) for _ in range(connections)),
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - start
+    completed = sum(r for r in results if isinstance(r, int))
+    errors = [r for r in results if isinstance(r, Exception)]
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+    return {
+        "messages": completed,
+        "errors": len(errors),
+        "seconds": elapsed,
+        "throughput": completed / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(0.50) * 1000,
+        "p95_ms": percentile(0.95) * 1000,
+        "mean_ms": (statistics.mean(latencies) * 1000) if latencies else 0.0,
+    }
+
+
+def _wait_for_health(port: int, timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not become healthy")
+
+
+def run_worker_scaling(worker_counts, connections: int, messages: int, port: int) -> None:
+    print(f"CPU cores: {os.cpu_count()}")
+    print(f"{'workers':>7} {'msgs':>6} {'errors':>6} {'msg/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    baseline = None
+    for workers in worker_counts:
+        server = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "load_test_chat_app:bench_app",
+                "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(workers), "--log-level", "warning",
+            ],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        try:
+            _wait_for_health(port)
+            result = asyncio.run(run_load(f"ws://127.0.0.1:{port}/ws", connections, messages))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        baseline = baseline or result["throughput"]
+        print(
+            f"{workers:>7} {result['messages']:>6} {result['errors']:>6} "
+            f"{result['throughput']:>9.1f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f}"
+            f"   ({result['throughput'] / baseline:.2f}x)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Websocket URL of a running chat app, e.g. ws://localhost:8000/ws")
+    parser.add_argument("--spawn-workers", help="Comma-separated worker counts to benchmark with bench_app, e.g. 1,2,4")
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--messages", type=int, default=10, help="Messages per connection")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.spawn_workers:
+        counts = [int(n) for n in args.spawn_workers.split(",")]
+        run_worker_scaling(counts, args.connections, args.messages, args.port)
+    elif args.url:
+        print(json.dumps(asyncio.run(run_load(args.url, args.connections, args.messages)), indent=2))
+    else:
+        parser.error("pass --url or --spawn-workers")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,29 @@
-from app.agents.agent_processor import AgentProcessor
+import threading
 from typing import Dict
 
+from app.agents.agent_processor import AgentProcessor
+
 _agent_processor_cache: Dict[str, AgentProcessor] = {}
+_agent_processor_lock = threading.Lock()
+
+def get_or_create_agent_processor(agent_id: str, agent_type: str, project_client) -> AgentProcessor:
+    """
+    Get cached AgentProcessor or create new one to avoid repeated initialization.
 
-def get_or_create_agent_processor(agent_id: str, agent_type: str, thread_id: str, project_client) -> AgentProcessor:
-    """Get cached AgentProcessor or create new one to avoid repeated initialization."""
+    The processor is shared by every session using the agent and is immutable;
+    pass the session's conversation to its run methods instead of storing it.
+    """
     cache_key = f"{agent_type}_{agent_id}"
-    if cache_key in _agent_processor_cache:
-        processor = _agent_processor_cache[cache_key]
-        processor.thread_id = thread_id
+    processor = _agent_processor_cache.get(cache_key)
+    if processor is not None:
         return processor
-    processor = AgentProcessor(
-        project_client=project_client,
-        assistant_id=agent_id,
-        agent_type=agent_type,
-        thread_id=thread_id
-    )
-    _agent_processor_cache[cache_key] = processor
-    return processor 
\ No newline at end of file
+    with _agent_processor_lock:
+        processor = _agent_processor_cache.get(cache_key)
+        if processor is None:
+            processor = AgentProcessor(
+                project_client=project_client,
+                assistant_id=agent_id,
+                agent_type=agent_type,
+            )
+            _agent_processor_cache[cache_key] = processor
+    return processor
@@ -0,0 +1,117 @@
+"""
+Server-side agent conversations per chat session.
+
+Every agent turn used to create a new conversation and resend the formatted
+chat history (and for cart_manager the whole RAW_IO_HISTORY JSON) inside the
+user message, so prompts grew with the session. ConversationRegistry keeps
+one conversation per (session, agent type): the first turn creates it with
+the full context, later turns append only the new message plus the session
+I/O the agent has not seen yet (turns handled by other agents since its last
+reply).
+
+The registry is per worker and bounded: sessions idle for
+AGENT_CONVERSATION_TTL_SECONDS are dropped, and beyond
+AGENT_CONVERSATION_MAX_SESSIONS the least recently active are evicted. An
+evicted session simply starts new conversations with the full context, and
+so does one whose conversation is no longer found on the server
+(ConversationNotFoundError).
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from utils.cache_utils import LRUCache
+
+AGENT_CONVERSATION_TTL_SECONDS = float(os.getenv("AGENT_CONVERSATION_TTL_SECONDS", "3600"))
+AGENT_CONVERSATION_MAX_SESSIONS = int(os.getenv("AGENT_CONVERSATION_MAX_SESSIONS", "5000"))
+
+
+class ConversationNotFoundError(Exception):
+    """Raised when a session's conversation no longer exists on the server; it has been reset."""
+
+
+@dataclass
+class AgentConversation:
+    """
+    One agent's conversation in a session.
+
+    ``conversation_id`` is None until the first turn created it on the server.
+    ``io_anchor`` is the ``seq`` of the last session I/O entry when the agent
+    last replied, so the next turn sends only what came after it.
+    """
+
+    agent_type: str
+    conversation_id: Optional[str] = None
+    io_anchor: Optional[int] = None
+    turns: int = 0
+
+    @property
+    def persistent(self) -> bool:
+        return self.conversation_id is not None
+
+    def reset(self) -> None:
+        """Start over: the next turn creates a new conversation with the full context."""
+        self.conversation_id = None
+        self.io_anchor = None
+
+
+class ConversationRegistry:
+    """
+    Bounded, expiring map of session -> agent type -> AgentConversation.
+
+    Args:
+        max_sessions: Sessions tracked; least recently active are evicted (None for unbounded)
+        ttl_seconds: Idle time after which a session's conversations are forgotten (None for no expiry)
+    """
+
+    def __init__(
+        self,
+        max_sessions: Optional[int] = AGENT_CONVERSATION_MAX_SESSIONS,
+        ttl_seconds: Optional[float] = AGENT_CONVERSATION_TTL_SECONDS,
+    ):
+        self._sessions = LRUCache(max_entries=max_sessions, ttl_seconds=ttl_seconds)
+        self.created = 0
+        self.continued = 0
+
+    def get(self, session_id: str, agent_type: str) -> AgentConversation:
+        """Conversation of ``agent_type`` in the session (a new, not yet created one if there is none)."""
+        conversations = self._sessions.get(session_id)
+        if conversations is None:
+            return AgentConversation(agent_type)
+        self._sessions.touch(session_id)
+        return conversations.get(agent_type) or AgentConversation(agent_type)
+
+    def save(self, session_id: str, conversation: AgentConversation) -> None:
+        """Record a conversation after a turn (ignored if the turn did not create one)."""
+        if not conversation.persistent:
+            return
+        conversation.turns += 1
+        if conversation.turns == 1:
+            self.created += 1
+        else:
+            self.continued += 1
+        conversations = self._sessions.get(session_id)
+        if conversations is None:
+            conversations = {}
+            self._sessions.set(session_id, conversations)
+        conversations[conversation.agent_type] = conversation
+
+    def drop(self, session_id: str, agent_type: Optional[str] = None) -> None:
+        """Forget one agent's conversation, or all of the session's with no agent type."""
+        if agent_type is None:
+            self._sessions.pop(session_id)
+            return
+        conversations = self._sessions.peek(session_id)
+        if conversations is not None:
+            conversations.pop(agent_type, None)
+
+    def stats(self) -> Dict[str, Any]:
+        cache = self._sessions.stats()
+        return {
+            "sessions": cache["entries"],
+            "conversations_created": self.created,
+            "turns_continued": self.continued,
+            "evicted": cache["evictions"],
+            "expired": cache["expirations"],
+        }
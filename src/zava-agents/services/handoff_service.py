@@ -7,19 +7,68 @@ from handoff_agent.py, providing:
 - Lazy classification for efficiency
 - Domain-based agent routing
 - Context transfer on handoff
+- Optional local first-stage classifier: confident local answers skip the LLM
+- Single-call classification: the prompt is sent inline in one
+  responses.create call instead of creating a conversation first
+- classify_intent_async: non-blocking classification with a deadline and a
+  concurrency limit for the websocket handler
+- Optional routing cache: repeated and paraphrased messages reuse a
+  confident earlier LLM decision for the same current domain
+- Bounded session table: idle sessions expire, the least recently used are
+  evicted beyond a maximum, and disconnect_session drops a session when its
+  last websocket closes
 """
 
+import asyncio
 import logging
 import os
 import random
+import re
 import json
+import threading
 from typing import Any, Dict, Optional, Tuple
 
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI, AzureOpenAI
 from pydantic import BaseModel, Field
 
+from utils.cache_utils import LRUCache
+
 logger = logging.getLogger(__name__)
 
+# Local classifier answers at or above this confidence are used without the LLM
+HANDOFF_LOCAL_CONFIDENCE = float(os.getenv("HANDOFF_LOCAL_CONFIDENCE", "0.9"))
+
+# How the handoff-service agent is called:
+# - "inline": one responses.create call with the prompt as input
+# - "stream": same call streamed; routing is decided as soon as domain,
+#   is_domain_change and confidence are in, without waiting for the reasoning
+# - "conversation": legacy conversations.create + responses.create (the
+#   conversation is deleted afterwards in the background)
+HANDOFF_CLASSIFICATION_MODE = os.getenv("HANDOFF_CLASSIFICATION_MODE", "inline")
+CLASSIFICATION_MODES = ("inline", "stream", "conversation")
+
+# Deadline and concurrency of classify_intent_async (per worker)
+HANDOFF_TIMEOUT_SECONDS = float(os.getenv("HANDOFF_TIMEOUT_SECONDS", "8"))
+HANDOFF_MAX_CONCURRENT = int(os.getenv("HANDOFF_MAX_CONCURRENT", "16"))
+
+# Session domain table: idle lifetime and bound on tracked sessions (per worker).
+# The domain is also kept in the session store and restored on reconnect.
+HANDOFF_SESSION_TTL_SECONDS = float(os.getenv("HANDOFF_SESSION_TTL_SECONDS", "86400"))
+HANDOFF_MAX_SESSIONS = int(os.getenv("HANDOFF_MAX_SESSIONS", "10000"))
+# Approximate memory per tracked session (LRU entry + 36-character session ID), measured with tracemalloc
+SESSION_ENTRY_BYTES = 240
+# Expired sessions are swept every this many classifications
+SESSION_PURGE_INTERVAL = 1000
+
+HANDOFF_AGENT_REFERENCE = {"agent": {"name": "handoff-service", "type": "agent_reference"}}
+
+# Fields of a partially streamed IntentClassification; a number only counts once it is terminated
+_STREAMED_FIELDS = {
+    "domain": (re.compile(r'"domain"\s*:\s*"([^"]+)"'), str),
+    "is_domain_change": (re.compile(r'"is_domain_change"\s*:\s*(true|false)'), lambda value: value == "true"),
+    "confidence": (re.compile(r'"confidence"\s*:\s*([0-9.]+)\s*[,}]'), float),
+}
+
 
 class IntentClassification(BaseModel):
     """Structured output for intent classification."""
@@ -65,6 +114,19 @@ AGENT_DOMAINS = {
 }
 
 
+def _parse_streamed_fields(text: str) -> Optional[Dict[str, Any]]:
+    """Routing fields of a partially streamed IntentClassification, or None while incomplete."""
+    fields = {}
+    for name, (pattern, convert) in _STREAMED_FIELDS.items():
+        match = pattern.search(text)
+        if match is None:
+            return None
+        fields[name] = convert(match.group(1))
+    reasoning = re.search(r'"reasoning"\s*:\s*"((?:[^"\\]|\\.)*)', text)
+    fields["reasoning"] = reasoning.group(1) if reasoning else "Streamed classification"
+    return fields
+
+
 class HandoffService:
     """
     Handoff service using intent classification for domain routing.
@@ -78,7 +140,16 @@ class HandoffService:
         azure_openai_client: AzureOpenAI,
         deployment_name: str,
         default_domain: str = "cora",
-        lazy_classification: bool = True
+        lazy_classification: bool = True,
+        local_classifier=None,
+        local_confidence_threshold: float = HANDOFF_LOCAL_CONFIDENCE,
+        classification_mode: str = HANDOFF_CLASSIFICATION_MODE,
+        async_client: Optional[AsyncAzureOpenAI] = None,
+        timeout: float = HANDOFF_TIMEOUT_SECONDS,
+        max_concurrent: int = HANDOFF_MAX_CONCURRENT,
+        routing_cache=None,
+        session_ttl_seconds: Optional[float] = HANDOFF_SESSION_TTL_SECONDS,
+        max_sessions: Optional[int] = HANDOFF_MAX_SESSIONS
     ):
         """
         Initialize handoff service.
@@ -88,14 +159,49 @@ class HandoffService:
             deployment_name: Model deployment name for classification
             default_domain: Default domain when no current domain exists
             lazy_classification: Enable lazy classification (check response for handoff markers)
+            local_classifier: Optional LocalIntentClassifier tried before the LLM
+            local_confidence_threshold: Minimum local confidence to skip the LLM
+            classification_mode: "inline", "stream" or "conversation" (see HANDOFF_CLASSIFICATION_MODE)
+            async_client: Async OpenAI client used by classify_intent_async
+            timeout: Default deadline in seconds of classify_intent_async
+            max_concurrent: Maximum concurrent LLM classifications in classify_intent_async
+            routing_cache: Optional RoutingCache of LLM decisions, tried after the local classifier
+            session_ttl_seconds: Idle time after which a session's domain is forgotten (None for no expiry)
+            max_sessions: Maximum tracked sessions; least recently active are evicted (None for unbounded)
         """
+        if classification_mode not in CLASSIFICATION_MODES:
+            raise ValueError(f"Unknown classification mode {classification_mode!r}, expected one of {CLASSIFICATION_MODES}")
         self.client = azure_openai_client
         self.deployment = deployment_name
         self.default_domain = default_domain
         self.lazy_classification = lazy_classification
+        self.local_classifier = local_classifier
+        self.local_confidence_threshold = local_confidence_threshold
+        self.classification_mode = classification_mode
+        self.async_client = async_client
+        self.timeout = timeout
+        self.max_concurrent = max_concurrent
+        self.routing_cache = routing_cache
+        self._llm_slots: Optional[asyncio.Semaphore] = None
+        self._background_tasks = set()
         
-        # Session state: domain per session
-        self._session_domains: Dict[str, str] = {}
+        # Token usage of the LLM classifications (streams closed early report none)
+        self._usage = {"input_tokens": 0, "output_tokens": 0}
+        
+        # Session state: domain per session, bounded and expiring
+        self._session_domains = LRUCache(
+            max_entries=max_sessions,
+            ttl_seconds=session_ttl_seconds,
+            sizeof=lambda domain: SESSION_ENTRY_BYTES,
+        )
+        # Open websocket connections per session (see connect_session)
+        self._connections: Dict[str, int] = {}
+        self._connections_lock = threading.Lock()
+        self._disconnected = 0
+        self._classifications = 0
+        
+        # How each classification was answered
+        self._counts = {"first_message": 0, "local": 0, "cache": 0, "llm": 0, "fallback": 0, "timeout": 0}
         
         logger.info(
             f"[HANDOFF_SERVICE] Initialized with default_domain={default_domain}, "
@@ -120,91 +226,380 @@ class HandoffService:
             Dictionary with keys: domain, is_domain_change, confidence, reasoning, agent_id, agent_name
         """
         print("Beginning intent classification...")
+        current_domain, result, prompt, audited = self._prepare_classification(user_message, session_id)
+        if result is not None:
+            return result
+        
+        try:
+            print(f"Sending classification request to LLM ({self.classification_mode})...")
+            intent = self._request_classification(prompt)
+            print("Received classification response.")
+            return self._apply_intent(session_id, current_domain, intent, user_message, audited)
+            
+        except Exception as exc:
+            logger.error(f"[HANDOFF_SERVICE] Intent classification failed: {exc}", exc_info=True)
+            return self._fallback_result(current_domain, "Classification error")
+    
+    async def classify_intent_async(
+        self,
+        user_message: str,
+        session_id: str,
+        chat_history: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Non-blocking classify_intent for the event loop.
+        
+        Uses the async client when one was given (otherwise the sync client
+        in a worker thread), so waiting on the LLM only holds up the calling
+        session. At most max_concurrent classifications run at once; the
+        deadline covers waiting for a slot too, and on timeout the same
+        fallback as for errors is returned. Cancelling the caller cancels the
+        request.
+        
+        Args:
+            user_message: User's message to classify
+            session_id: Session identifier for tracking current domain
+            chat_history: Optional chat history for context
+            timeout: Deadline in seconds (defaults to the service's timeout)
+            
+        Returns:
+            Dictionary with keys: domain, is_domain_change, confidence, reasoning, agent_id, agent_name
+        """
+        current_domain, result, prompt, audited = self._prepare_classification(user_message, session_id)
+        if result is not None:
+            return result
+        
+        if self._llm_slots is None:
+            self._llm_slots = asyncio.Semaphore(self.max_concurrent)
+        
+        async def limited_request() -> Dict[str, Any]:
+            async with self._llm_slots:
+                return await self._request_classification_async(prompt)
+        
+        try:
+            intent = await asyncio.wait_for(limited_request(), timeout or self.timeout)
+            return self._apply_intent(session_id, current_domain, intent, user_message, audited)
+        except asyncio.TimeoutError:
+            logger.warning(f"[HANDOFF_SERVICE] Intent classification timed out for session {session_id}")
+            self._counts["timeout"] += 1
+            return self._fallback_result(current_domain, "Classification timed out")
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.error(f"[HANDOFF_SERVICE] Intent classification failed: {exc}", exc_info=True)
+            return self._fallback_result(current_domain, "Classification error")
+    
+    def _prepare_classification(self, user_message: str, session_id: str):
+        """
+        Steps that need no LLM call.
+        
+        Returns:
+            (current_domain, result, prompt, audited): result is set when the
+            message was routed without the LLM, otherwise prompt is the LLM
+            prompt; audited is the cached decision the LLM answer is checked
+            against, if this is an audited cache hit
+        """
+        self._classifications += 1
+        if self._classifications % SESSION_PURGE_INTERVAL == 0:
+            self._session_domains.purge_expired()
+        
         current_domain = self._session_domains.get(session_id, None)
+        if current_domain:
+            # Active sessions do not expire
+            self._session_domains.touch(session_id)
         
         # If no current domain, route to default
         if not current_domain:
             logger.info(f"[HANDOFF_SERVICE] First message for session {session_id}, routing to {self.default_domain}")
-            self._session_domains[session_id] = self.default_domain
+            self._session_domains.set(session_id, self.default_domain)
+            self._counts["first_message"] += 1
             
-            return {
+            return current_domain, {
                 "domain": self.default_domain,
                 "is_domain_change": True,
                 "confidence": 1.0,
                 "reasoning": f"First message, routing to {self.default_domain}",
                 "agent_id": self.default_domain,
                 "agent_name": AGENT_DOMAINS[self.default_domain]["name"]
-            }
+            }, None, None
+        
+        # Clear-cut messages ("checkout", "add2cart") are answered locally
+        if self.local_classifier is not None:
+            local = self.local_classifier.classify(user_message, current_domain)
+            if local.confidence >= self.local_confidence_threshold:
+                self._counts["local"] += 1
+                return current_domain, self._local_result(session_id, current_domain, local), None, None
+            logger.debug(
+                f"[HANDOFF_SERVICE] Local classification below threshold "
+                f"({local.domain}, {local.confidence:.2f}), escalating to LLM"
+            )
+        
+        # Repeats and paraphrases of a confident earlier LLM decision
+        audited = None
+        if self.routing_cache is not None:
+            # Paraphrase hits only where the local rules or centroids point the same way
+            confirm = (
+                (lambda domain: self.local_classifier.supports(user_message, domain))
+                if self.local_classifier is not None
+                else None
+            )
+            cached = self.routing_cache.lookup(current_domain, user_message, confirm)
+            if cached is not None:
+                if not self.routing_cache.should_audit():
+                    self._counts["cache"] += 1
+                    return current_domain, self._cached_result(session_id, current_domain, cached), None, None
+                logger.debug("[HANDOFF_SERVICE] Auditing cached routing decision against the LLM")
+                audited = cached
         
         # Build classification prompt
         prompt = f"""
             Current domain: {current_domain}
             User message: {user_message}
         """
+        return current_domain, None, prompt, audited
+    
+    def _apply_intent(
+        self,
+        session_id: str,
+        current_domain: str,
+        intent: Dict[str, Any],
+        user_message: Optional[str] = None,
+        audited: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Build the result of an LLM classification, apply the domain change and feed the routing cache."""
+        result = {
+            "domain": intent["domain"],
+            "is_domain_change": intent["is_domain_change"],
+            "confidence": intent["confidence"],
+            "reasoning": intent["reasoning"],
+            "agent_id": intent["domain"],
+            "agent_name": AGENT_DOMAINS.get(intent["domain"], {}).get("name", "Unknown Agent")
+        }
+        self._counts["llm"] += 1
+        if self.routing_cache is not None and user_message is not None:
+            if audited is not None:
+                self.routing_cache.record_audit(audited, intent)
+            if intent["domain"] in AGENT_DOMAINS:
+                self.routing_cache.store(current_domain, user_message, intent)
+        print("Updating session domain if changed...")
+        
+        # Update session domain if changed
+        if intent["is_domain_change"]:
+            self._session_domains.set(session_id, intent["domain"])
+            logger.info(f"[HANDOFF_SERVICE] Domain change for session {session_id}: {current_domain} -> {intent['domain']}")
+        
+        logger.info(f"[HANDOFF_SERVICE] Intent classification: {result}")
+        return result
+    
+    def _fallback_result(self, current_domain: Optional[str], reason: str) -> Dict[str, Any]:
+        """Stay with the current domain when the LLM classification is unavailable."""
+        fallback_domain = current_domain or self.default_domain
+        self._counts["fallback"] += 1
+        
+        logger.warning(f"[HANDOFF_SERVICE] Falling back to domain: {fallback_domain}")
+        
+        return {
+            "domain": fallback_domain,
+            "is_domain_change": False,
+            "confidence": 0.3,
+            "reasoning": f"{reason}, using {fallback_domain}",
+            "agent_id": fallback_domain,
+            "agent_name": AGENT_DOMAINS.get(fallback_domain, {}).get("name", "Unknown Agent")
+        }
+    
+    def _request_classification(self, prompt: str) -> Dict[str, Any]:
+        """Ask the handoff-service agent for an IntentClassification."""
+        if self.classification_mode == "conversation":
+            return self._classify_with_conversation(prompt)
+        
+        # The prompt goes inline: one round trip, no server-side conversation
+        request = {
+            "input": [{"type": "message", "role": "user", "content": prompt}],
+            "extra_body": HANDOFF_AGENT_REFERENCE,
+        }
+        if self.classification_mode == "stream":
+            return self._classify_streaming(request)
+        response = self.client.responses.create(**request)
+        return self._parse_response(response)
+    
+    def _classify_streaming(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Stream the structured output and stop once the routing fields are known.
+        
+        The reasoning field is the longest part of the output and is not
+        needed to route, so the stream is closed as soon as domain,
+        is_domain_change and confidence have been generated.
+        """
+        text = ""
+        stream = self.client.responses.create(stream=True, **request)
+        try:
+            for event in stream:
+                if event.type != "response.output_text.delta":
+                    continue
+                text += event.delta
+                fields = _parse_streamed_fields(text)
+                if fields is not None:
+                    return fields
+        finally:
+            stream.close()
+        return json.loads(text)
+    
+    def _classify_with_conversation(self, prompt: str) -> Dict[str, Any]:
+        """Legacy two-call path: create a conversation, then respond in it."""
+        conversation = self.client.conversations.create(
+            items = [
+                {
+                    "type": "message",
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        )
+        
+        print(f"Created conversation for classification: {conversation.id}")
         
         try:
-            print("Sending classification request to LLM...")
-            conversation = self.client.conversations.create(
-                items = [
-                    {
-                        "type": "message",
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            )
-
-            print(f"Created conversation for classification: {conversation.id}")
-
             response = self.client.responses.create(
                 conversation=conversation.id,
-                extra_body={"agent": {"name": "handoff-service", "type": "agent_reference"}},
+                extra_body=HANDOFF_AGENT_REFERENCE,
                 input=""
             )
-
-            print("Received classification response.")
-            
-            # Extract structured result
-            intent = json.loads(response.output_text)
-            
-            result = {
-                "domain": intent["domain"],
-                "is_domain_change": intent["is_domain_change"],
-                "confidence": intent["confidence"],
-                "reasoning": intent["reasoning"],
-                "agent_id": intent["domain"],
-                "agent_name": AGENT_DOMAINS.get(intent["domain"], {}).get("name", "Unknown Agent")
-            }
-            print("Updating session domain if changed...")
-            
-            # Update session domain if changed
-            if intent["is_domain_change"]:
-                self._session_domains[session_id] = intent["domain"]
-                logger.info(f"[HANDOFF_SERVICE] Domain change for session {session_id}: {current_domain} -> {intent['domain']}")
-            
-            logger.info(f"[HANDOFF_SERVICE] Intent classification: {result}")
-            return result
-            
+        finally:
+            # The conversation is never reused; delete it off the request path
+            threading.Thread(target=self._delete_conversation, args=(conversation.id,), daemon=True).start()
+        return self._parse_response(response)
+    
+    async def _request_classification_async(self, prompt: str) -> Dict[str, Any]:
+        """Async counterpart of _request_classification."""
+        if self.async_client is None:
+            return await asyncio.to_thread(self._request_classification, prompt)
+        
+        if self.classification_mode == "conversation":
+            conversation = await self.async_client.conversations.create(
+                items=[{"type": "message", "role": "user", "content": prompt}]
+            )
+            try:
+                response = await self.async_client.responses.create(
+                    conversation=conversation.id,
+                    extra_body=HANDOFF_AGENT_REFERENCE,
+                    input=""
+                )
+            finally:
+                task = asyncio.create_task(self._delete_conversation_async(conversation.id))
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_tasks.discard)
+            return self._parse_response(response)
+        
+        request = {
+            "input": [{"type": "message", "role": "user", "content": prompt}],
+            "extra_body": HANDOFF_AGENT_REFERENCE,
+        }
+        if self.classification_mode == "inline":
+            response = await self.async_client.responses.create(**request)
+            return self._parse_response(response)
+        
+        text = ""
+        stream = await self.async_client.responses.create(stream=True, **request)
+        try:
+            async for event in stream:
+                if event.type != "response.output_text.delta":
+                    continue
+                text += event.delta
+                fields = _parse_streamed_fields(text)
+                if fields is not None:
+                    return fields
+        finally:
+            await stream.close()
+        return json.loads(text)
+    
+    def _parse_response(self, response) -> Dict[str, Any]:
+        """Decode the IntentClassification of a response and add up its token usage."""
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self._usage["input_tokens"] += usage.input_tokens or 0
+            self._usage["output_tokens"] += usage.output_tokens or 0
+        return json.loads(response.output_text)
+    
+    async def _delete_conversation_async(self, conversation_id: str) -> None:
+        try:
+            await self.async_client.conversations.delete(conversation_id)
         except Exception as exc:
-            logger.error(f"[HANDOFF_SERVICE] Intent classification failed: {exc}", exc_info=True)
-            
-            # Fallback: stay with current domain or use random
-            fallback_domain = current_domain or self.default_domain
-            
-            logger.warning(f"[HANDOFF_SERVICE] Falling back to domain: {fallback_domain}")
-            
-            return {
-                "domain": fallback_domain,
-                "is_domain_change": False,
-                "confidence": 0.3,
-                "reasoning": f"Classification error, using {fallback_domain}",
-                "agent_id": fallback_domain,
-                "agent_name": AGENT_DOMAINS.get(fallback_domain, {}).get("name", "Unknown Agent")
-            }
+            logger.warning(f"[HANDOFF_SERVICE] Could not delete conversation {conversation_id}: {exc}")
+    
+    def _delete_conversation(self, conversation_id: str) -> None:
+        try:
+            self.client.conversations.delete(conversation_id)
+        except Exception as exc:
+            logger.warning(f"[HANDOFF_SERVICE] Could not delete conversation {conversation_id}: {exc}")
+    
+    def _local_result(self, session_id: str, current_domain: str, local) -> Dict[str, Any]:
+        """Build the classification result for a confident local answer and apply the domain change."""
+        is_domain_change = local.domain != current_domain
+        if is_domain_change:
+            self._session_domains.set(session_id, local.domain)
+            logger.info(f"[HANDOFF_SERVICE] Domain change for session {session_id}: {current_domain} -> {local.domain}")
+        
+        result = {
+            "domain": local.domain,
+            "is_domain_change": is_domain_change,
+            "confidence": local.confidence,
+            "reasoning": f"Local {local.source} classification: {local.reasoning}",
+            "agent_id": local.domain,
+            "agent_name": AGENT_DOMAINS[local.domain]["name"]
+        }
+        logger.info(f"[HANDOFF_SERVICE] Local intent classification: {result}")
+        return result
+    
+    def _cached_result(self, session_id: str, current_domain: str, cached: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the classification result for a routing cache hit and apply the domain change."""
+        if cached["is_domain_change"]:
+            self._session_domains.set(session_id, cached["domain"])
+            logger.info(f"[HANDOFF_SERVICE] Domain change for session {session_id}: {current_domain} -> {cached['domain']}")
+        
+        result = {
+            "domain": cached["domain"],
+            "is_domain_change": cached["is_domain_change"],
+            "confidence": cached["confidence"],
+            "reasoning": f"Cached classification: {cached['reasoning']}",
+            "agent_id": cached["domain"],
+            "agent_name": AGENT_DOMAINS[cached["domain"]]["name"]
+        }
+        logger.info(f"[HANDOFF_SERVICE] Cached intent classification: {result}")
+        return result
+    
+    def stats(self) -> Dict[str, Any]:
+        """Classification counts by path, the share answered without the LLM and routing cache stats."""
+        classified = sum(self._counts[path] for path in ("local", "cache", "llm", "fallback"))
+        stats = {
+            **self._counts,
+            **self._usage,
+            "local_share": round(self._counts["local"] / classified, 3) if classified else 0.0,
+            "cache_share": round(self._counts["cache"] / classified, 3) if classified else 0.0,
+            **self.session_stats(),
+        }
+        if self.routing_cache is not None:
+            stats["routing_cache"] = self.routing_cache.stats()
+        return stats
+    
+    def session_stats(self) -> Dict[str, Any]:
+        """Size and approximate memory of the session table, and why sessions left it."""
+        table = self._session_domains.stats()
+        with self._connections_lock:
+            open_sessions = len(self._connections)
+        return {
+            "sessions": table["entries"],
+            "max_sessions": self._session_domains.max_entries,
+            "session_table_bytes": table["size"],
+            "open_sessions": open_sessions,
+            "sessions_disconnected": self._disconnected,
+            "sessions_expired": table["expirations"],
+            "sessions_evicted": table["evictions"],
+        }
     
     def get_current_domain(self, session_id: str) -> Optional[str]:
         """Get current domain for a session."""
-        return self._session_domains.get(session_id)
+        return self._session_domains.peek(session_id)
     
     def set_domain(self, session_id: str, domain: str) -> None:
         """Manually set domain for a session."""
@@ -212,11 +607,31 @@ class HandoffService:
             logger.warning(f"[HANDOFF_SERVICE] Unknown domain: {domain}, using default: {self.default_domain}")
             domain = self.default_domain
         
-        self._session_domains[session_id] = domain
+        self._session_domains.set(session_id, domain)
         logger.info(f"[HANDOFF_SERVICE] Set domain for session {session_id}: {domain}")
     
     def reset_session(self, session_id: str) -> None:
         """Reset session domain."""
-        if session_id in self._session_domains:
-            del self._session_domains[session_id]
+        if self._session_domains.pop(session_id) is not None:
             logger.info(f"[HANDOFF_SERVICE] Reset session {session_id}")
+    
+    def connect_session(self, session_id: str) -> None:
+        """Register an open websocket for a session (paired with disconnect_session)."""
+        with self._connections_lock:
+            self._connections[session_id] = self._connections.get(session_id, 0) + 1
+    
+    def disconnect_session(self, session_id: str) -> None:
+        """
+        Disconnect hook: forget the session once its last websocket has closed.
+        
+        The domain survives in the session store and is restored with
+        set_domain when the client reconnects.
+        """
+        with self._connections_lock:
+            remaining = self._connections.get(session_id, 1) - 1
+            if remaining > 0:
+                self._connections[session_id] = remaining
+                return
+            self._connections.pop(session_id, None)
+        if self._session_domains.pop(session_id) is not None:
+            self._disconnected += 1
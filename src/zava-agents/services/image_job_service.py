@@ -0,0 +1,237 @@
+"""
+Background image-generation jobs.
+
+Image generation (source download, a multi-second gpt-image-1 edit, blob
+upload) used to run inline in the websocket turn, blocking the session until
+the image was ready. ImageJobService runs it as a job instead:
+
+- submit() returns a job ID immediately; the chat keeps serving other turns
+- a bounded worker pool runs the jobs, further jobs wait in a bounded queue
+- progress and completion are pushed through an async event callback
+- each owner (chat session) may only have a limited number of active jobs
+- jobs can be cancelled, e.g. when the user disconnects
+
+A running generation cannot be interrupted mid-request; cancellation is
+checked between stages, so a cancelled job skips the remaining edit call or
+the upload and its result is dropped.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+IMAGE_JOB_WORKERS = int(os.getenv("IMAGE_JOB_WORKERS", "2"))
+IMAGE_JOB_MAX_PENDING = int(os.getenv("IMAGE_JOB_MAX_PENDING", "20"))
+IMAGE_JOB_MAX_PER_USER = int(os.getenv("IMAGE_JOB_MAX_PER_USER", "1"))
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+EventCallback = Callable[["ImageJob", Dict[str, Any]], Awaitable[None]]
+
+
+class ImageJobRejected(Exception):
+    """Raised when a job cannot be queued (per-user cap or full queue)."""
+
+
+@dataclass
+class ImageJob:
+    """State of one image-generation job."""
+
+    job_id: str
+    owner: str
+    prompt: str
+    image_url: str
+    status: str = QUEUED
+    stage: str = ""
+    result: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    @property
+    def active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    def to_event(self) -> Dict[str, Any]:
+        """Websocket payload describing the job's current state."""
+        event = {"type": "image_job", "job_id": self.job_id, "status": self.status}
+        if self.stage:
+            event["stage"] = self.stage
+        if self.result:
+            event["image_url"] = self.result
+        if self.error:
+            event["error"] = self.error
+        return event
+
+
+class ImageJobService:
+    """
+    Bounded pool of image-generation workers with per-owner caps.
+
+    Args:
+        generate: Blocking function ``generate(prompt, image_url, on_progress, cancel_event)``
+            returning the generated image URL (or None on failure)
+        max_workers: Jobs generating concurrently
+        max_pending: Maximum active (queued + running) jobs across all owners
+        max_per_owner: Maximum active jobs per owner
+    """
+
+    def __init__(
+        self,
+        generate: Callable[..., Optional[str]],
+        max_workers: int = IMAGE_JOB_WORKERS,
+        max_pending: int = IMAGE_JOB_MAX_PENDING,
+        max_per_owner: int = IMAGE_JOB_MAX_PER_USER,
+    ):
+        self._generate = generate
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_per_owner = max_per_owner
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="image-job"
+        )
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._jobs: Dict[str, ImageJob] = {}
+        self._counts = {COMPLETED: 0, FAILED: 0, CANCELLED: 0}
+
+    def submit(
+        self,
+        owner: str,
+        prompt: str,
+        image_url: str,
+        on_event: Optional[EventCallback] = None,
+    ) -> ImageJob:
+        """
+        Queue an image-generation job and return it immediately.
+
+        Must be called from the event loop. ``on_event(job, event)`` is awaited
+        for every status or stage change, including the final one.
+
+        Raises:
+            ImageJobRejected: if the owner or the service is at capacity
+        """
+        active = [job for job in self._jobs.values() if job.active]
+        if sum(1 for job in active if job.owner == owner) >= self.max_per_owner:
+            raise ImageJobRejected(
+                f"Owner already has {self.max_per_owner} image job(s) in progress"
+            )
+        if len(active) >= self.max_pending:
+            raise ImageJobRejected("Image generation queue is full")
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        job = ImageJob(job_id=uuid.uuid4().hex, owner=owner, prompt=prompt, image_url=image_url)
+        self._jobs[job.job_id] = job
+        job.task = asyncio.create_task(self._run(job, on_event))
+        logger.info(f"[IMAGE_JOBS] Queued job {job.job_id} for {owner}")
+        return job
+
+    def get(self, job_id: str) -> Optional[ImageJob]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Returns False if it already finished."""
+        job = self._jobs.get(job_id)
+        if job is None or not job.active:
+            return False
+        job.cancel_event.set()
+        if job.task is not None:
+            job.task.cancel()
+        return True
+
+    def cancel_owner(self, owner: str) -> int:
+        """Cancel all active jobs of an owner; returns how many were cancelled."""
+        return sum(
+            self.cancel(job.job_id)
+            for job in list(self._jobs.values())
+            if job.owner == owner and job.active
+        )
+
+    def stats(self) -> Dict[str, int]:
+        statuses = [job.status for job in self._jobs.values()]
+        return {
+            "queued": statuses.count(QUEUED),
+            "running": statuses.count(RUNNING),
+            "completed": self._counts[COMPLETED],
+            "failed": self._counts[FAILED],
+            "cancelled": self._counts[CANCELLED],
+        }
+
+    def shutdown(self) -> None:
+        for job in list(self._jobs.values()):
+            self.cancel(job.job_id)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _emit(self, job: ImageJob, on_event: Optional[EventCallback]) -> None:
+        if on_event is None:
+            return
+        try:
+            await on_event(job, job.to_event())
+        except Exception as e:
+            # The websocket may be gone; the job itself is unaffected
+            logger.warning(f"[IMAGE_JOBS] Could not deliver event for job {job.job_id}: {e}")
+
+    async def _run(self, job: ImageJob, on_event: Optional[EventCallback]) -> None:
+        loop = asyncio.get_running_loop()
+
+        def on_progress(stage: str) -> None:
+            # Called from the worker thread
+            def update():
+                if job.status == RUNNING:
+                    job.stage = stage
+                    loop.create_task(self._emit(job, on_event))
+
+            loop.call_soon_threadsafe(update)
+
+        try:
+            await self._emit(job, on_event)
+            async with self._slots:
+                job.status = RUNNING
+                job.started_at = time.time()
+                await self._emit(job, on_event)
+                result = await loop.run_in_executor(
+                    self._executor,
+                    self._generate,
+                    job.prompt,
+                    job.image_url,
+                    on_progress,
+                    job.cancel_event,
+                )
+            if job.cancel_event.is_set():
+                raise asyncio.CancelledError()
+            if result:
+                job.status, job.result = COMPLETED, result
+            else:
+                job.status, job.error = FAILED, "Image generation returned no image"
+        except asyncio.CancelledError:
+            job.status = CANCELLED
+        except Exception as e:
+            logger.error(f"[IMAGE_JOBS] Job {job.job_id} failed: {e}", exc_info=True)
+            job.status, job.error = FAILED, str(e)
+        finally:
+            job.finished_at = time.time()
+            job.stage = ""
+            self._counts[job.status] = self._counts.get(job.status, 0) + 1
+            del self._jobs[job.job_id]
+            logger.info(
+                f"[IMAGE_JOBS] Job {job.job_id} {job.status} in {job.finished_at - job.created_at:.2f}s"
+            )
+
+        if job.status != CANCELLED:
+            await self._emit(job, on_event)
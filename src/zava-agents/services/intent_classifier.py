@@ -0,0 +1,329 @@
+"""
+Local first-stage intent classifier for the handoff service.
+
+Every message after the first used to cost an LLM round trip to the
+handoff-service agent, even "add2cart" or "checkout". LocalIntentClassifier
+answers clear-cut messages in-process in tens of microseconds, and the
+handoff service escalates to the LLM only when its confidence is below the
+threshold.
+
+Two signals are combined:
+- keyword/regex rules per domain (high precision, typo-tolerant for the
+  common cart verbs); a message that triggers rules of more than one domain is
+  a mixed intent and always escalates
+- nearest-centroid similarity over hashed word and character-trigram
+  vectors, trained from labelled messages (the seed phrases below plus
+  data/handoff_service_evaluation_grounded.jsonl)
+
+The vectors are a local stand-in for a sentence embedding: an embedding API
+call would cost the network round trip this stage exists to avoid.
+"""
+
+import os
+import re
+import time
+from functools import lru_cache
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import orjson
+
+from services.handoff_service import AGENT_DOMAINS
+
+DEFAULT_TRAINING_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "handoff_service_evaluation_grounded.jsonl"
+)
+
+FEATURE_DIMENSION = 4096
+CHAR_NGRAM_WEIGHT = 0.5
+# Softmax temperature over cosine similarities to the domain centroids
+CENTROID_TEMPERATURE = 0.05
+
+# Messages of at most this many words that trigger one domain's rules are
+# unambiguous ("checkout", "price?", "PLEASE ADD TO CART!!!")
+SHORT_MESSAGE_WORDS = 6
+SHORT_RULE_CONFIDENCE = 0.97
+LONG_RULE_CONFIDENCE = 0.85
+MIXED_INTENT_CONFIDENCE = 0.4
+# A single rule match the centroid does not clearly confirm ("check out the new
+# arrivals" matches cart keywords): below the handoff threshold, so the LLM decides
+DISAGREEING_RULE_CONFIDENCE = 0.6
+RULE_CONFIRMATION_SCORE = 0.8
+
+_CART_NOUN = r"(?:cart|basket|bag|trolley)"
+
+DOMAIN_RULES: Dict[str, Sequence[str]] = {
+    "cart_manager": (
+        rf"\badd\s*(?:2|to|in(?:to)?)\s*(?:my\s+|the\s+)?{_CART_NOUN}\b",
+        r"\badd2cart\b",
+        r"\bche(?:c)?k\s*-?\s*out\b",
+        rf"\b(?:view|show|see|empty|clear)\s+(?:my\s+|the\s+)?{_CART_NOUN}\b",
+        rf"\bremove\b[^.?!]{{0,60}}\b{_CART_NOUN}\b",
+        rf"\b(?:in|into|out of|from)\s+(?:my|the)\s+{_CART_NOUN}\b",
+    ),
+    "inventory_agent": (
+        r"\bin[\s-]?stoc?k\b",
+        r"\bstoc?k\b",
+        r"\bavailab(?:le|ility)\b",
+        r"\bhow many (?:are |do you have )?left\b",
+        r"\bsku\b",
+        r"\bprecio\b",
+        r"\bprice\b",
+    ),
+    "customer_loyalty": (
+        r"\bdiscounts?\b",
+        r"\bpromo(?:tion)?s?\b",
+        r"\bloyalty\b",
+        r"\bcoupons?\b",
+        r"\brewards?\b",
+    ),
+    "interior_designer": (
+        r"\b(?:re)?design\b",
+        r"\bredo(?:ing)?\b",
+        r"\bdecor(?:ate|ating)?\b",
+        r"\bpalette\b",
+        r"\bcolou?rs?\b",
+        r"\bshades?\b",
+        r"\bmood\s*board\b",
+        r"\blayout\b",
+        r"\bmock-?up\b",
+        r"\bcushions?\b",
+        r"\brugs?\b",
+        r"\bwalls?\b",
+        r"\bvibe\b",
+        r"\b(?:living|bath|bed|dining|kids'?)\s*room\b",
+    ),
+    "cora": (
+        r"^\W*help\W*$",
+        r"\btalk to (?:someone|somebody|a (?:person|human))\b",
+        r"\bsomeone else\b",
+    ),
+}
+
+# Seed phrases so every domain has a centroid before any labelled data is added
+SEED_EXAMPLES: Dict[str, Sequence[str]] = {
+    "cora": (
+        "hi, what do you sell?",
+        "can you help me find something",
+        "what's your return policy",
+        "tell me about zava",
+        "I have a general question",
+    ),
+    "interior_designer": (
+        "what colors go well with a grey sofa",
+        "help me design my living room",
+        "suggest a color scheme for the bedroom",
+        "create an image of my room painted blue",
+        "which paint shade suits a small kitchen",
+    ),
+    "inventory_agent": (
+        "is this in stock",
+        "do you have it available at my store",
+        "how many are left",
+        "check availability of the paint sprayer",
+        "what's the price of this item",
+    ),
+    "customer_loyalty": (
+        "do I have any discounts",
+        "how many loyalty points do I have",
+        "are there any promotions right now",
+        "can I use a coupon",
+        "what rewards do I get as a member",
+    ),
+    "cart_manager": (
+        "add this to my cart",
+        "remove the brush from my cart",
+        "show me my cart",
+        "I want to checkout",
+        "put two of those in my basket",
+    ),
+}
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+_QUERY_PATTERN = re.compile(r"^(?:Current domain:\s*(?P<domain>\w+)\s*\n)?(?:User message:\s*)?(?P<message>.*)$", re.S)
+
+
+@dataclass(frozen=True)
+class LocalIntent:
+    """Result of the local classifier; ``source`` is "rules", "centroid" or "mixed"."""
+
+    domain: str
+    confidence: float
+    source: str
+    reasoning: str
+
+
+def parse_evaluation_query(query: str) -> Tuple[Optional[str], str]:
+    """Split an evaluation query ("Current domain: X\\nUser message: Y") into (current_domain, message)."""
+    match = _QUERY_PATTERN.match(query.strip())
+    return match.group("domain"), match.group("message").strip()
+
+
+def load_evaluation_records(path: str) -> List[Dict[str, Any]]:
+    """Read the handoff evaluation JSONL as dicts with id, current_domain, message and expected."""
+    records = []
+    with open(path, "rb") as evaluation_file:
+        for line in evaluation_file:
+            if not line.strip():
+                continue
+            record = orjson.loads(line)
+            current_domain, message = parse_evaluation_query(record["query"])
+            records.append({
+                "id": record.get("id"),
+                "current_domain": current_domain,
+                "message": message,
+                "expected": record["expected_domain"].split(":", 1)[-1].strip(),
+            })
+    return records
+
+
+def load_labelled_messages(path: str) -> List[Tuple[Optional[str], str, str]]:
+    """Read (current_domain, message, expected_domain) triples from the handoff evaluation JSONL."""
+    return [
+        (record["current_domain"], record["message"], record["expected"])
+        for record in load_evaluation_records(path)
+    ]
+
+
+@lru_cache(maxsize=50000)
+def _token_features(token: str) -> Tuple[Tuple[int, float], ...]:
+    """
+    Hashed (index, weight) pairs of a word and its character trigrams.
+
+    Uses the built-in string hash, which is salted per process: the centroids
+    are built in the process that uses them, so indices always agree.
+    """
+    padded = f" {token} "
+    trigrams = ((hash(padded[start:start + 3]) % FEATURE_DIMENSION, CHAR_NGRAM_WEIGHT) for start in range(len(padded) - 2))
+    return ((hash(token) % FEATURE_DIMENSION, 1.0), *trigrams)
+
+
+def message_features(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Sparse L2-normalized hashed word + character-trigram vector as (indices, weights)."""
+    counts: Dict[int, float] = {}
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        for index, weight in _token_features(token):
+            counts[index] = counts.get(index, 0.0) + weight
+    if not counts:
+        return np.zeros(0, dtype=np.intp), np.zeros(0)
+    indices = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+    weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+    return indices, weights / np.linalg.norm(weights)
+
+
+class LocalIntentClassifier:
+    """
+    Rules plus nearest-centroid intent classifier.
+
+    Args:
+        examples: Extra labelled (message, domain) pairs added to the seed phrases
+    """
+
+    def __init__(self, examples: Iterable[Tuple[str, str]] = ()):
+        self.domains = list(AGENT_DOMAINS)
+        # One alternation per domain: a single scan of the message per domain
+        self._rules = {
+            domain: re.compile("|".join(f"(?:{pattern})" for pattern in patterns), re.I)
+            for domain, patterns in DOMAIN_RULES.items()
+        }
+        sums = np.zeros((len(self.domains), FEATURE_DIMENSION))
+        labelled = [(text, domain) for domain, texts in SEED_EXAMPLES.items() for text in texts]
+        labelled.extend(examples)
+        for text, domain in labelled:
+            indices, weights = message_features(text)
+            np.add.at(sums[self.domains.index(domain)], indices, weights)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        self._centroids = sums / np.where(norms == 0, 1.0, norms)
+
+    @classmethod
+    def from_jsonl(cls, path: str = DEFAULT_TRAINING_PATH) -> "LocalIntentClassifier":
+        """Train on the seed phrases and a handoff evaluation file."""
+        return cls((message, expected) for _, message, expected in load_labelled_messages(path))
+
+    def rule_domains(self, message: str) -> List[str]:
+        return [domain for domain, rule in self._rules.items() if rule.search(message)]
+
+    def supports(self, message: str, domain: str) -> bool:
+        """
+        Whether the local stage points at ``domain`` for this message.
+
+        The rules decide when they match (mixed matches support no domain),
+        otherwise the closest centroid.
+        """
+        matched = self.rule_domains(message)
+        if matched:
+            return matched == [domain]
+        return self.domains[int(self.centroid_scores(message).argmax())] == domain
+
+    def centroid_scores(self, message: str) -> np.ndarray:
+        """Softmax over the cosine similarity to each domain centroid."""
+        indices, weights = message_features(message)
+        similarities = self._centroids[:, indices] @ weights
+        scaled = np.exp((similarities - similarities.max()) / CENTROID_TEMPERATURE)
+        return scaled / scaled.sum()
+
+    def classify(self, message: str, current_domain: Optional[str] = None) -> LocalIntent:
+        """
+        Classify a message locally.
+
+        Args:
+            message: User message
+            current_domain: Domain the session is in (kept on ties between domains)
+
+        Returns:
+            LocalIntent with the predicted domain and a confidence in [0, 1]
+        """
+        matched = self.rule_domains(message)
+        if len(matched) > 1:
+            domain = current_domain if current_domain in matched else matched[0]
+            return LocalIntent(domain, MIXED_INTENT_CONFIDENCE, "mixed", f"Mixed intent: {', '.join(matched)}")
+
+        scores = self.centroid_scores(message)
+        centroid_domain = self.domains[int(scores.argmax())]
+        if matched:
+            domain = matched[0]
+            short = len(_TOKEN_PATTERN.findall(message.lower())) <= SHORT_MESSAGE_WORDS
+            confidence = SHORT_RULE_CONFIDENCE if short else LONG_RULE_CONFIDENCE
+            if centroid_domain == domain and scores.max() >= RULE_CONFIRMATION_SCORE:
+                confidence = max(confidence, float(scores.max()))
+            else:
+                confidence = DISAGREEING_RULE_CONFIDENCE
+            return LocalIntent(domain, confidence, "rules", f"Matched {domain} keywords")
+        return LocalIntent(centroid_domain, float(scores.max()), "centroid", f"Closest to {centroid_domain} examples")
+
+
+def evaluate(path: str = DEFAULT_TRAINING_PATH, threshold: float = 0.9) -> Dict[str, float]:
+    """
+    Leave-one-out accuracy and latency of the local stage on an evaluation file.
+
+    Each message is classified by a model trained on all the other messages,
+    so the accuracy is not inflated by having seen the message itself.
+
+    Returns:
+        Coverage (share answered locally), accuracy of those answers, and
+        per-message latency percentiles in microseconds
+    """
+    examples = load_labelled_messages(path)
+    answered = correct = 0
+    latencies = []
+    for held_out, (current_domain, message, expected) in enumerate(examples):
+        classifier = LocalIntentClassifier(
+            (text, domain) for i, (_, text, domain) in enumerate(examples) if i != held_out
+        )
+        start = time.perf_counter()
+        intent = classifier.classify(message, current_domain)
+        latencies.append((time.perf_counter() - start) * 1e6)
+        if intent.confidence >= threshold:
+            answered += 1
+            correct += intent.domain == expected
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "examples": len(examples),
+        "answered_locally": answered,
+        "coverage": answered / len(examples),
+        "local_accuracy": correct / answered if answered else 0.0,
+        "p50_us": float(p50),
+        "p95_us": float(p95),
+        "p99_us": float(p99),
+    }
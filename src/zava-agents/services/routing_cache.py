@@ -0,0 +1,219 @@
+"""
+Cache of LLM routing decisions for the handoff service.
+
+Routing messages repeat a lot ("add to cart", "checkout", "what's in stock"),
+and the decision only depends on the message and the domain the session is in.
+RoutingCache keeps confident LLM classifications keyed by
+(current_domain, normalized message):
+
+- exact tier: bounded LRU with TTL over the normalized text
+- similarity tier: paraphrases ("add it to my cart" after "add this to my
+  cart") are matched by cosine similarity of the hashed message vectors used
+  by the local intent classifier, within the same current domain. Hashed
+  word overlap misses a small change of intent ("show me paint in stock for
+  my bedroom walls" is close to "show me paint for my bedroom walls"), so a
+  paraphrase hit is only served when the caller confirms the cached domain
+  (the handoff service asks the local classifier)
+
+Only classifications at or above a confidence threshold are cached. A small
+share of cache hits is audited: the LLM is asked anyway, and agreement
+between the cached and the fresh decision is tracked, so drift (cached
+routes the model would no longer choose) shows up in the stats. A
+disagreement replaces the cached decision.
+"""
+
+import os
+import random
+import re
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.intent_classifier import FEATURE_DIMENSION, message_features
+from utils.cache_utils import LRUCache
+
+HANDOFF_ROUTING_CACHE_MAX_ENTRIES = int(os.getenv("HANDOFF_ROUTING_CACHE_MAX_ENTRIES", "5000"))
+HANDOFF_ROUTING_CACHE_TTL_SECONDS = float(os.getenv("HANDOFF_ROUTING_CACHE_TTL_SECONDS", "3600"))
+HANDOFF_ROUTING_CACHE_MIN_CONFIDENCE = float(os.getenv("HANDOFF_ROUTING_CACHE_MIN_CONFIDENCE", "0.8"))
+HANDOFF_ROUTING_CACHE_SIMILARITY = float(os.getenv("HANDOFF_ROUTING_CACHE_SIMILARITY", "0.85"))
+HANDOFF_ROUTING_CACHE_SIMILARITY_ENTRIES = int(os.getenv("HANDOFF_ROUTING_CACHE_SIMILARITY_ENTRIES", "1000"))
+HANDOFF_ROUTING_CACHE_AUDIT_RATE = float(os.getenv("HANDOFF_ROUTING_CACHE_AUDIT_RATE", "0.02"))
+
+# Audit outcomes kept for the recent agreement rate
+AUDIT_WINDOW = 200
+
+_PUNCTUATION = re.compile(r"[^\w\s']+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    """Case-fold, drop punctuation and collapse whitespace ("PLEASE ADD TO CART!!!" -> "please add to cart")."""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", message.casefold())).strip()
+
+
+class RoutingCache:
+    """
+    Exact + similarity cache of routing decisions.
+
+    Args:
+        max_entries: LRU bound of the exact tier
+        ttl_seconds: Lifetime of a cached decision (None for no expiry)
+        min_confidence: Only decisions at or above this confidence are cached
+        similarity_threshold: Minimum cosine similarity for a paraphrase hit (> 1 disables the tier)
+        similarity_entries: Messages indexed by the similarity tier (oldest replaced first)
+        audit_rate: Share of hits that are re-checked against the LLM
+    """
+
+    def __init__(
+        self,
+        max_entries: int = HANDOFF_ROUTING_CACHE_MAX_ENTRIES,
+        ttl_seconds: Optional[float] = HANDOFF_ROUTING_CACHE_TTL_SECONDS,
+        min_confidence: float = HANDOFF_ROUTING_CACHE_MIN_CONFIDENCE,
+        similarity_threshold: float = HANDOFF_ROUTING_CACHE_SIMILARITY,
+        similarity_entries: int = HANDOFF_ROUTING_CACHE_SIMILARITY_ENTRIES,
+        audit_rate: float = HANDOFF_ROUTING_CACHE_AUDIT_RATE,
+    ):
+        self.min_confidence = min_confidence
+        self.similarity_threshold = similarity_threshold
+        self.audit_rate = audit_rate
+        self._entries = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._lock = threading.Lock()
+        # Similarity tier: one row per indexed message, reused round-robin
+        self._vectors = np.zeros((similarity_entries, FEATURE_DIMENSION), dtype=np.float32)
+        self._vector_keys: List[Optional[Tuple[str, str]]] = [None] * similarity_entries
+        self._slots: Dict[Tuple[str, str], int] = {}
+        self._next_slot = 0
+        self._audits: Deque[bool] = deque(maxlen=AUDIT_WINDOW)
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.similar_unconfirmed = 0
+        self.misses = 0
+        self.stored = 0
+        self.skipped_low_confidence = 0
+        self.audits = 0
+        self.audit_disagreements = 0
+
+    def lookup(
+        self,
+        current_domain: str,
+        message: str,
+        confirm: Optional[Callable[[str], bool]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached classification for the message in this domain, or None.
+
+        Args:
+            current_domain: Domain the session is in
+            message: User message
+            confirm: Called with the domain of a paraphrase hit; the hit is only
+                returned if it accepts it (without ``confirm`` only exact hits are)
+
+        The returned dict has the IntentClassification fields plus
+        ``cache_key``, the entry it came from (for record_audit).
+        """
+        key = (current_domain, normalize_message(message))
+        intent = self._entries.get(key)
+        if intent is not None:
+            with self._lock:
+                self.exact_hits += 1
+            return intent
+
+        similar_key = self._most_similar(key) if confirm is not None else None
+        intent = self._entries.get(similar_key) if similar_key is not None else None
+        unconfirmed = intent is not None and not confirm(intent["domain"])
+        with self._lock:
+            if intent is None or unconfirmed:
+                self.misses += 1
+                self.similar_unconfirmed += unconfirmed
+                return None
+            self.similar_hits += 1
+        return intent
+
+    def should_audit(self) -> bool:
+        return self.audit_rate > 0 and random.random() < self.audit_rate
+
+    def store(self, current_domain: str, message: str, intent: Dict[str, Any]) -> bool:
+        """Cache a classification if it is confident enough; returns whether it was stored."""
+        if intent.get("confidence", 0.0) < self.min_confidence:
+            with self._lock:
+                self.skipped_low_confidence += 1
+            return False
+        key = (current_domain, normalize_message(message))
+        cached = {
+            "domain": intent["domain"],
+            "is_domain_change": intent["is_domain_change"],
+            "confidence": intent["confidence"],
+            "reasoning": intent["reasoning"],
+            "cache_key": key,
+        }
+        self._entries.set(key, cached)
+        with self._lock:
+            self.stored += 1
+            if key not in self._slots and self.similarity_threshold <= 1.0:
+                self._index(key)
+        return True
+
+    def record_audit(self, cached: Dict[str, Any], fresh: Dict[str, Any]) -> None:
+        """Compare an audited cache hit with the fresh LLM decision."""
+        agreed = cached["domain"] == fresh["domain"]
+        with self._lock:
+            self.audits += 1
+            self._audits.append(agreed)
+            if not agreed:
+                self.audit_disagreements += 1
+        if not agreed:
+            # Drop the stale decision; store() re-caches the fresh one if confident
+            self._entries.pop(cached["cache_key"])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.exact_hits + self.similar_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "similar_unconfirmed": self.similar_unconfirmed,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "stored": self.stored,
+                "skipped_low_confidence": self.skipped_low_confidence,
+                "audits": self.audits,
+                "audit_agreement": round(1 - self.audit_disagreements / self.audits, 3) if self.audits else None,
+                "recent_audit_agreement": (
+                    round(sum(self._audits) / len(self._audits), 3) if self._audits else None
+                ),
+            }
+
+    def _index(self, key: Tuple[str, str]) -> None:
+        # Caller holds the lock
+        slot = self._next_slot
+        self._next_slot = (slot + 1) % len(self._vector_keys)
+        previous = self._vector_keys[slot]
+        if previous is not None:
+            del self._slots[previous]
+        indices, weights = message_features(key[1])
+        row = self._vectors[slot]
+        row[:] = 0.0
+        row[indices] = weights
+        self._vector_keys[slot] = key
+        self._slots[key] = slot
+
+    def _most_similar(self, key: Tuple[str, str]) -> Optional[Tuple[str, str]]:
+        if self.similarity_threshold > 1.0:
+            return None
+        indices, weights = message_features(key[1])
+        if len(indices) == 0:
+            return None
+        with self._lock:
+            similarities = self._vectors[:, indices] @ weights.astype(np.float32)
+            # Only paraphrases seen from the same current domain count
+            for slot in np.argsort(similarities)[::-1]:
+                if similarities[slot] < self.similarity_threshold:
+                    return None
+                candidate = self._vector_keys[slot]
+                if candidate is not None and candidate[0] == key[0]:
+                    return candidate
+        return None
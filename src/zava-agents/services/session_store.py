@@ -0,0 +1,266 @@
+"""
+Session state store for the chat app.
+
+Per-session state (routing domain, cart, discount, image URL, raw I/O history)
+is kept outside the websocket handler so that a reconnecting client gets its
+session back and several workers or replicas can serve the same session.
+
+Two implementations share the SessionStore interface:
+- InMemorySessionStore: single process, used by default
+- RedisSessionStore: any Redis-protocol server (Redis, Azure Cache for Redis, or a local stand-in)
+
+Both serialize state compactly with orjson, expire sessions after a TTL and
+use optimistic concurrency: every saved state carries a version, and a save
+based on a stale version raises SessionConflictError. SessionStore.update
+wraps this in a read-modify-write retry loop.
+"""
+
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "86400"))
+RAW_IO_HISTORY_MAXLEN = 100
+
+
+class SessionConflictError(Exception):
+    """Raised when a session was modified by someone else since it was loaded."""
+
+
+@dataclass
+class SessionState:
+    """State of one chat session. ``version`` is managed by the store."""
+
+    domain: Optional[str] = None
+    cart: List[Any] = field(default_factory=list)
+    discount_percentage: str = ""
+    loyalty_response: Optional[Dict[str, Any]] = None
+    loyalty_response_sent: bool = False
+    customer_loyalty_executed: bool = False
+    image_url: str = ""
+    raw_io_history: List[Dict[str, Any]] = field(default_factory=list)
+    version: int = 0
+
+    # Short keys keep the serialized payload compact
+    _KEYS = (
+        ("domain", "d"),
+        ("cart", "c"),
+        ("discount_percentage", "p"),
+        ("loyalty_response", "l"),
+        ("loyalty_response_sent", "ls"),
+        ("customer_loyalty_executed", "le"),
+        ("image_url", "i"),
+        ("raw_io_history", "h"),
+    )
+
+    def to_bytes(self) -> bytes:
+        """Serialize the state (including its version) to compact JSON bytes."""
+        payload = {"v": self.version}
+        for name, key in self._KEYS:
+            value = getattr(self, name)
+            if value:
+                payload[key] = value
+        return orjson.dumps(payload)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SessionState":
+        """Deserialize a state produced by to_bytes."""
+        payload = orjson.loads(data)
+        state = cls(version=payload.get("v", 0))
+        for name, key in cls._KEYS:
+            if key in payload:
+                setattr(state, name, payload[key])
+        return state
+
+
+class SessionStore(ABC):
+    """Interface for session state storage with TTL and optimistic concurrency."""
+
+    def __init__(self, ttl_seconds: int = DEFAULT_SESSION_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+
+    @abstractmethod
+    def load(self, session_id: str) -> SessionState:
+        """Return the stored state, or a fresh state with version 0 if none exists."""
+
+    @abstractmethod
+    def save(self, session_id: str, state: SessionState) -> SessionState:
+        """
+        Save state if the stored version still equals ``state.version``.
+
+        Returns:
+            The state with its new version and a refreshed TTL
+
+        Raises:
+            SessionConflictError: if the session changed since ``state`` was loaded
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Delete a session."""
+
+    def update(
+        self,
+        session_id: str,
+        mutate: Callable[[SessionState], None],
+        max_retries: int = 5,
+    ) -> SessionState:
+        """
+        Apply ``mutate`` to the latest state and save it, retrying on conflicts.
+
+        ``mutate`` may be called several times and should only depend on its argument
+        and the caller's own changes.
+        """
+        for attempt in range(max_retries):
+            state = self.load(session_id)
+            mutate(state)
+            try:
+                return self.save(session_id, state)
+            except SessionConflictError:
+                logger.info(
+                    f"[SESSION_STORE] Conflict on session {session_id}, retry {attempt + 1}/{max_retries}"
+                )
+        raise SessionConflictError(
+            f"Session {session_id} is being modified concurrently, gave up after {max_retries} attempts"
+        )
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local session store. Sessions are lost on restart and not shared between workers."""
+
+    def __init__(self, ttl_seconds: int = DEFAULT_SESSION_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        self._entries: Dict[str, Tuple[float, int, bytes]] = {}
+        self._lock = threading.Lock()
+        self._operations = 0
+
+    def load(self, session_id: str) -> SessionState:
+        with self._lock:
+            entry = self._get_live_entry(session_id)
+        if entry is None:
+            return SessionState()
+        return SessionState.from_bytes(entry[2])
+
+    def save(self, session_id: str, state: SessionState) -> SessionState:
+        with self._lock:
+            entry = self._get_live_entry(session_id)
+            current_version = entry[1] if entry else 0
+            if current_version != state.version:
+                raise SessionConflictError(
+                    f"Session {session_id} is at version {current_version}, not {state.version}"
+                )
+            state.version = current_version + 1
+            self._entries[session_id] = (
+                time.monotonic() + self.ttl_seconds,
+                state.version,
+                state.to_bytes(),
+            )
+            self._operations += 1
+            if self._operations % 1000 == 0:
+                self._purge_expired()
+        return state
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._purge_expired()
+            return len(self._entries)
+
+    def _get_live_entry(self, session_id: str) -> Optional[Tuple[float, int, bytes]]:
+        entry = self._entries.get(session_id)
+        if entry is not None and entry[0] <= time.monotonic():
+            del self._entries[session_id]
+            return None
+        return entry
+
+    def _purge_expired(self) -> None:
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if entry[0] <= now]
+        for key in expired:
+            del self._entries[key]
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Session store backed by a Redis-protocol server.
+
+    Takes any redis-py compatible client (``redis.Redis``, or ``fakeredis.FakeRedis``
+    as a local stand-in). Saves use WATCH/MULTI/EXEC so concurrent writers from
+    other workers or replicas are detected.
+    """
+
+    def __init__(
+        self,
+        client,
+        ttl_seconds: int = DEFAULT_SESSION_TTL_SECONDS,
+        key_prefix: str = "zava:session:",
+    ):
+        super().__init__(ttl_seconds)
+        self.client = client
+        self.key_prefix = key_prefix
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.key_prefix}{session_id}"
+
+    def load(self, session_id: str) -> SessionState:
+        data = self.client.get(self._key(session_id))
+        if data is None:
+            return SessionState()
+        return SessionState.from_bytes(data)
+
+    def save(self, session_id: str, state: SessionState) -> SessionState:
+        from redis.exceptions import WatchError
+
+        key = self._key(session_id)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                data = pipe.get(key)
+                current_version = SessionState.from_bytes(data).version if data else 0
+                if current_version != state.version:
+                    raise SessionConflictError(
+                        f"Session {session_id} is at version {current_version}, not {state.version}"
+                    )
+                new_version = current_version + 1
+                pipe.multi()
+                pipe.set(
+                    key,
+                    replace(state, version=new_version).to_bytes(),
+                    ex=self.ttl_seconds,
+                )
+                pipe.execute()
+            except WatchError:
+                raise SessionConflictError(f"Session {session_id} changed during save")
+        state.version = new_version
+        return state
+
+    def delete(self, session_id: str) -> None:
+        self.client.delete(self._key(session_id))
+
+
+def create_session_store(url: Optional[str] = None) -> SessionStore:
+    """
+    Create the session store configured by ``SESSION_STORE_URL``.
+
+    ``redis://`` or ``rediss://`` URLs select RedisSessionStore; anything else
+    (including unset) selects InMemorySessionStore.
+    """
+    url = url if url is not None else os.getenv("SESSION_STORE_URL", "")
+    if url.startswith(("redis://", "rediss://")):
+        import redis
+
+        logger.info("[SESSION_STORE] Using Redis session store")
+        return RedisSessionStore(redis.Redis.from_url(url))
+    logger.info("[SESSION_STORE] Using in-memory session store")
+    return InMemorySessionStore()
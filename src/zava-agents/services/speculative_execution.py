@@ -0,0 +1,262 @@
+"""
+Speculative agent execution during handoff classification.
+
+Most turns stay in the session's current domain, yet the agent call used to
+start only after classify_intent returned. SpeculativeExecutor starts the
+current-domain agent alongside classification:
+
+- the speculative run's output deltas are buffered, nothing reaches the user
+- if the classifier confirms the current domain (no domain change), the
+  buffered deltas are flushed, live forwarding takes over, and the reply is
+  used: the classification time is saved
+- otherwise the run is cancelled (its agent stream is closed) and the turn
+  proceeds as before; the tokens it used are wasted
+
+Costs are capped: only domains listed in HANDOFF_SPECULATIVE_DOMAINS
+speculate, at most HANDOFF_SPECULATIVE_MAX_IN_FLIGHT runs are speculative at
+once, prompts above HANDOFF_SPECULATIVE_MAX_PROMPT_CHARS are not sent
+speculatively, and once HANDOFF_SPECULATIVE_WASTE_BUDGET_TOKENS tokens have
+been wasted in the current hour speculation pauses until the next one.
+Token counts are estimated from text length.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated domains whose agent may start before classification ("" disables)
+HANDOFF_SPECULATIVE_DOMAINS = os.getenv("HANDOFF_SPECULATIVE_DOMAINS", "")
+HANDOFF_SPECULATIVE_MAX_IN_FLIGHT = int(os.getenv("HANDOFF_SPECULATIVE_MAX_IN_FLIGHT", "8"))
+HANDOFF_SPECULATIVE_MAX_PROMPT_CHARS = int(os.getenv("HANDOFF_SPECULATIVE_MAX_PROMPT_CHARS", "16000"))
+HANDOFF_SPECULATIVE_WASTE_BUDGET_TOKENS = int(os.getenv("HANDOFF_SPECULATIVE_WASTE_BUDGET_TOKENS", "200000"))
+
+BUDGET_WINDOW_SECONDS = 3600
+CHARS_PER_TOKEN = 4
+
+# Speculation outcomes
+COMMITTED = "committed"
+CANCELLED = "cancelled"
+SKIPPED = "skipped"
+
+DeltaCallback = Callable[[str], Awaitable[None]]
+
+
+@dataclass
+class Speculation:
+    """One speculative agent run for a session turn."""
+
+    domain: str
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+    prompt_chars: int = 0
+    output_chars: int = 0
+    skipped_reason: Optional[str] = None
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+    _buffer: List[str] = field(default_factory=list, repr=False)
+    _forward: Optional[DeltaCallback] = field(default=None, repr=False)
+
+    @property
+    def tokens(self) -> int:
+        return (self.prompt_chars + self.output_chars) // CHARS_PER_TOKEN
+
+    async def on_delta(self, delta: str) -> None:
+        self.output_chars += len(delta)
+        if self._forward is None:
+            self._buffer.append(delta)
+        else:
+            await self._forward(delta)
+
+
+class SpeculativeExecutor:
+    """
+    Starts current-domain agent runs during classification and commits or cancels them.
+
+    Args:
+        domains: Domains allowed to speculate
+        max_in_flight: Speculative runs at once (per worker)
+        max_prompt_chars: Larger agent prompts are not sent speculatively
+        waste_budget_tokens: Wasted tokens per hour after which speculation pauses
+    """
+
+    def __init__(
+        self,
+        domains: Iterable[str] = (),
+        max_in_flight: int = HANDOFF_SPECULATIVE_MAX_IN_FLIGHT,
+        max_prompt_chars: int = HANDOFF_SPECULATIVE_MAX_PROMPT_CHARS,
+        waste_budget_tokens: int = HANDOFF_SPECULATIVE_WASTE_BUDGET_TOKENS,
+    ):
+        self.domains = {domain.strip() for domain in domains if domain.strip()}
+        self.max_in_flight = max_in_flight
+        self.max_prompt_chars = max_prompt_chars
+        self.waste_budget_tokens = waste_budget_tokens
+        self._in_flight = 0
+        self._window_start = time.monotonic()
+        self._window_waste = 0
+        self._counts = {"started": 0, COMMITTED: 0, CANCELLED: 0, SKIPPED: 0, "not_started": 0}
+        self._saved_ms = 0.0
+        self._wasted_tokens = 0
+        self._committed_tokens = 0
+        self._per_domain: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_env(cls) -> "SpeculativeExecutor":
+        return cls(domains=HANDOFF_SPECULATIVE_DOMAINS.split(","))
+
+    def should_speculate(self, domain: Optional[str]) -> bool:
+        """Whether a run for ``domain`` may start now (toggle, in-flight cap and waste budget)."""
+        if not domain or domain not in self.domains:
+            return False
+        if time.monotonic() - self._window_start >= BUDGET_WINDOW_SECONDS:
+            self._window_start = time.monotonic()
+            self._window_waste = 0
+        if self._in_flight >= self.max_in_flight or self._window_waste >= self.waste_budget_tokens:
+            self._counts["not_started"] += 1
+            return False
+        return True
+
+    def start(
+        self,
+        domain: str,
+        prepare: Callable[[], Awaitable[str]],
+        execute: Callable[[str, DeltaCallback], Awaitable[str]],
+    ) -> Speculation:
+        """
+        Start a speculative run (call should_speculate first).
+
+        Args:
+            domain: Domain whose agent runs
+            prepare: Builds the agent prompt
+            execute: Runs the agent on the prompt, passing output deltas to the
+                callback, and returns the full reply
+        """
+        speculation = Speculation(domain=domain)
+        self._in_flight += 1
+        self._counts["started"] += 1
+
+        async def run() -> Optional[str]:
+            try:
+                prompt = await prepare()
+                if len(prompt) > self.max_prompt_chars:
+                    speculation.skipped_reason = f"prompt of {len(prompt)} characters"
+                    return None
+                speculation.prompt_chars = len(prompt)
+                return await execute(prompt, speculation.on_delta)
+            finally:
+                speculation.finished_at = time.perf_counter()
+
+        def release(task: asyncio.Task) -> None:
+            # A done callback, so a run cancelled before it started is released too
+            self._in_flight -= 1
+
+        speculation.task = asyncio.create_task(run())
+        speculation.task.add_done_callback(release)
+        return speculation
+
+    async def resolve(
+        self,
+        speculation: Speculation,
+        domain: Optional[str],
+        is_domain_change: bool,
+        forward: DeltaCallback,
+    ) -> Optional[str]:
+        """
+        Commit the run if classification confirmed its domain, otherwise cancel it.
+
+        Args:
+            speculation: Run returned by start
+            domain: Classified domain (None if classification failed)
+            is_domain_change: Whether the classification changes domain
+            forward: Receives the buffered and then the live output deltas on commit
+
+        Returns:
+            The agent reply if committed; None if the turn must run the agent itself
+
+        Raises:
+            Exception: The committed run failed after some of its output was
+                forwarded (running the agent again would append a second reply)
+        """
+        resolved_at = time.perf_counter()
+        if domain != speculation.domain or is_domain_change:
+            await self.cancel(speculation)
+            return None
+
+        # Flush what was generated so far, then forward live; no await between
+        # the last empty check and the switch, so no delta is lost
+        try:
+            while speculation._buffer:
+                await forward(speculation._buffer.pop(0))
+        except BaseException:
+            # The receiver is gone (e.g. websocket closed): stop the run too
+            await self.cancel(speculation)
+            raise
+        speculation._forward = forward
+        try:
+            reply = await speculation.task
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._record(speculation, CANCELLED)
+            if speculation.output_chars:
+                # Part of the reply already reached the user; a second run would
+                # be appended to it, so the turn fails instead
+                logger.warning(f"[SPECULATION] Speculative {speculation.domain} run failed after output: {e}")
+                raise
+            logger.warning(f"[SPECULATION] Speculative {speculation.domain} run failed, running again: {e}")
+            return None
+        if reply is None:
+            logger.info(f"[SPECULATION] Skipped {speculation.domain}: {speculation.skipped_reason}")
+            self._record(speculation, SKIPPED)
+            return None
+
+        saved_ms = (min(resolved_at, speculation.finished_at) - speculation.started_at) * 1000
+        self._saved_ms += saved_ms
+        self._record(speculation, COMMITTED, saved_ms=saved_ms)
+        return reply
+
+    async def cancel(self, speculation: Speculation) -> None:
+        """Stop a run that will not be used and account its tokens as wasted."""
+        speculation.task.cancel()
+        try:
+            await speculation.task
+        except (asyncio.CancelledError, Exception):
+            pass
+        if speculation.skipped_reason is not None:
+            self._record(speculation, SKIPPED)
+            return
+        self._record(speculation, CANCELLED)
+
+    def stats(self) -> Dict[str, Any]:
+        """Saved latency vs wasted tokens, overall and per domain."""
+        resolved = self._counts[COMMITTED] + self._counts[CANCELLED]
+        return {
+            "domains": sorted(self.domains),
+            **self._counts,
+            "in_flight": self._in_flight,
+            "commit_rate": round(self._counts[COMMITTED] / resolved, 3) if resolved else 0.0,
+            "saved_ms": round(self._saved_ms, 1),
+            "saved_ms_per_commit": round(self._saved_ms / self._counts[COMMITTED], 1) if self._counts[COMMITTED] else 0.0,
+            "wasted_tokens": self._wasted_tokens,
+            "committed_tokens": self._committed_tokens,
+            "waste_budget_remaining": max(0, self.waste_budget_tokens - self._window_waste),
+            "per_domain": self._per_domain,
+        }
+
+    def _record(self, speculation: Speculation, outcome: str, saved_ms: float = 0.0) -> None:
+        self._counts[outcome] += 1
+        domain = self._per_domain.setdefault(
+            speculation.domain,
+            {COMMITTED: 0, CANCELLED: 0, SKIPPED: 0, "saved_ms": 0.0, "wasted_tokens": 0},
+        )
+        domain[outcome] += 1
+        if outcome == COMMITTED:
+            domain["saved_ms"] = round(domain["saved_ms"] + saved_ms, 1)
+            self._committed_tokens += speculation.tokens
+        elif outcome == CANCELLED:
+            domain["wasted_tokens"] += speculation.tokens
+            self._wasted_tokens += speculation.tokens
+            self._window_waste += speculation.tokens
@@ -0,0 +1,228 @@
+"""
+Concurrency stress test for the shared AgentProcessor.
+
+Hundreds of sessions run turns at the same time through the one cached
+processor of an agent, each with its own conversation, against an in-memory
+stand-in for the Foundry conversations/responses API that echoes the last
+user message of the conversation it is asked to respond in. A session that
+got another session's conversation would receive the wrong echo or leave its
+message in a foreign conversation.
+
+The processor's SDK, telemetry and MCP tool modules are replaced with stubs
+while it is imported (the real ones need Azure packages and configuration
+and connect at import), so the test runs anywhere the repo's own code does.
+"""
+import asyncio
+import importlib
+import itertools
+import random
+import sys
+import threading
+import time
+from types import ModuleType, SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from services.conversation_registry import AgentConversation, ConversationNotFoundError
+
+SESSIONS = 300
+TURNS = 3
+
+
+def _stub_modules():
+    """Stand-ins for the modules agent_processor imports beyond the repo's own code."""
+
+    class FunctionTool:
+        def __init__(self, **definition):
+            self.definition = definition
+
+    def unused(*args, **kwargs):
+        raise AssertionError("the agent requested no tool")
+
+    tools = dict.fromkeys(
+        ("product_recommendations", "inventory_check", "calculate_discount", "create_image"), unused
+    )
+    return {
+        "azure": {},
+        "azure.ai": {},
+        "azure.ai.projects": {},
+        "azure.ai.projects.models": {"FunctionTool": FunctionTool},
+        "azure.ai.agents": {},
+        "azure.ai.agents.telemetry": {"trace_function": lambda *args, **kwargs: (lambda function: function)},
+        "opentelemetry": {},
+        "opentelemetry.trace": {},
+        "app.tools": tools,
+        "app.servers.mcp_inventory_client": {"MCPShopperToolsClient": object, "get_mcp_client": unused},
+    }
+
+
+@pytest.fixture(scope="module")
+def agent_service():
+    """services.agent_service imported against the stubs; removed again afterwards."""
+    loaded = set(sys.modules)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        for name, attributes in _stub_modules().items():
+            module = ModuleType(name)
+            module.__path__ = []  # importable as a package
+            module.__dict__.update(attributes)
+            monkeypatch.setitem(sys.modules, name, module)
+            parent, _, child = name.rpartition(".")
+            if parent in sys.modules:
+                monkeypatch.setattr(sys.modules[parent], child, module, raising=False)
+        service = importlib.import_module("services.agent_service")
+        monkeypatch.setattr(sys.modules["app.agents.agent_processor"], "configure_telemetry", lambda: None)
+        yield service
+    for name in set(sys.modules) - loaded:
+        del sys.modules[name]
+
+
+SESSIONS = 300
+TURNS = 3
+
+
+class FakeStream:
+    """Response stream echoing ``text`` in small deltas, with thread switches in between."""
+
+    def __init__(self, response_id, text):
+        self.response_id = response_id
+        self.text = text
+
+    def __iter__(self):
+        for start in range(0, len(self.text), 4):
+            time.sleep(random.uniform(0, 0.002))
+            yield SimpleNamespace(type="response.output_text.delta", delta=self.text[start:start + 4])
+        yield SimpleNamespace(
+            type="response.completed",
+            response=SimpleNamespace(id=self.response_id, output_text=self.text, output=[]),
+        )
+
+    def close(self):
+        pass
+
+
+class FakeFoundry:
+    """Server-side conversations shared by all sessions, as in the Foundry project."""
+
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+        self.failing = None
+        self.conversations = SimpleNamespace(
+            create=self.create_conversation,
+            items=SimpleNamespace(create=self.add_items),
+        )
+        self.responses = SimpleNamespace(create=self.create_response)
+
+    def create_conversation(self, items):
+        time.sleep(random.uniform(0, 0.002))
+        with self.lock:
+            conversation_id = f"conv_{next(self.ids)}"
+            self.items[conversation_id] = [item["content"] for item in items]
+        return SimpleNamespace(id=conversation_id)
+
+    def add_items(self, conversation_id, items):
+        time.sleep(random.uniform(0, 0.002))
+        if self.failing is not None:
+            raise self.failing
+        with self.lock:
+            if conversation_id not in self.items:
+                response = httpx.Response(404, request=httpx.Request("POST", "https://foundry.invalid"))
+                raise openai.NotFoundError("Conversation not found", response=response, body=None)
+            self.items[conversation_id].extend(item["content"] for item in items)
+
+    def create_response(self, conversation, input, extra_body, stream):
+        with self.lock:
+            last_message = self.items[conversation][-1]
+        return FakeStream(f"resp_{conversation}", f"echo {last_message}")
+
+
+class FakeProjectClient:
+    def __init__(self, foundry):
+        self.foundry = foundry
+
+    def get_openai_client(self):
+        return self.foundry
+
+
+def test_concurrent_sessions_keep_their_own_conversations(agent_service):
+    foundry = FakeFoundry()
+    project_client = FakeProjectClient(foundry)
+    processors = set()
+
+    async def session(index):
+        conversation = AgentConversation("cora")
+        replies = []
+        for turn in range(TURNS):
+            processor = agent_service.get_or_create_agent_processor(
+                agent_id="cora-agent", agent_type="cora", project_client=project_client
+            )
+            processors.add(id(processor))
+            message = f"session {index} turn {turn}"
+            async for reply in processor.run_conversation_with_text_stream(
+                input_message=message, conversation=conversation
+            ):
+                replies.append(reply)
+        return conversation, replies
+
+    async def run_all():
+        return await asyncio.gather(*(session(index) for index in range(SESSIONS)))
+
+    results = asyncio.run(run_all())
+
+    assert len(processors) == 1
+    conversation_ids = [conversation.conversation_id for conversation, _ in results]
+    assert len(set(conversation_ids)) == SESSIONS
+    for index, (conversation, replies) in enumerate(results):
+        expected = [f"session {index} turn {turn}" for turn in range(TURNS)]
+        assert replies == [f"echo {message}" for message in expected]
+        assert foundry.items[conversation.conversation_id] == expected
+
+
+def test_shared_processor_rejects_per_request_state(agent_service):
+    processor = agent_service.get_or_create_agent_processor(
+        agent_id="cora-agent", agent_type="cora", project_client=FakeProjectClient(FakeFoundry())
+    )
+    with pytest.raises(AttributeError):
+        processor.thread_id = "conv_1"
+
+
+def run_turn(processor, message, conversation):
+    async def collect():
+        return [reply async for reply in processor.run_conversation_with_text_stream(
+            input_message=message, conversation=conversation
+        )]
+
+    return asyncio.run(collect())
+
+
+def test_conversation_gone_on_the_server_is_reset_and_reported(agent_service):
+    foundry = FakeFoundry()
+    processor = agent_service.get_or_create_agent_processor(
+        agent_id="expiry-agent", agent_type="cora", project_client=FakeProjectClient(foundry)
+    )
+    conversation = AgentConversation("cora", conversation_id="conv_expired", io_anchor=2)
+
+    with pytest.raises(ConversationNotFoundError):
+        run_turn(processor, "only the new turn", conversation)
+
+    assert not conversation.persistent and conversation.io_anchor is None
+    assert run_turn(processor, "full context", conversation) == ["echo full context"]
+    assert foundry.items[conversation.conversation_id] == ["full context"]
+
+
+def test_other_errors_keep_the_conversation(agent_service):
+    foundry = FakeFoundry()
+    processor = agent_service.get_or_create_agent_processor(
+        agent_id="flaky-agent", agent_type="cora", project_client=FakeProjectClient(foundry)
+    )
+    conversation = AgentConversation("cora")
+    run_turn(processor, "first", conversation)
+    foundry.failing = RuntimeError("connection reset")
+
+    replies = run_turn(processor, "second", conversation)
+
+    assert replies == ["Error processing message: connection reset"]
+    assert foundry.items[conversation.conversation_id] == ["first"]
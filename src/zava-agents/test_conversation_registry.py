@@ -0,0 +1,114 @@
+import time
+
+import orjson
+
+from services.conversation_registry import AgentConversation, ConversationRegistry
+from services.session_store import InMemorySessionStore
+from utils.history_utils import build_agent_context, format_io_history, io_entries_since
+
+
+def io_turn(message, answer, seq=1):
+    return [
+        {"seq": seq, "input": message, "cart": []},
+        {"seq": seq + 1, "output": orjson.dumps({"answer": answer}).decode(), "cart": []},
+    ]
+
+
+def test_conversation_is_saved_only_once_created():
+    registry = ConversationRegistry()
+    conversation = registry.get("s1", "cora")
+    assert not conversation.persistent
+    registry.save("s1", conversation)  # The turn failed before creating it
+    assert not registry.get("s1", "cora").persistent
+
+    conversation.conversation_id = "conv_1"
+    registry.save("s1", conversation)
+    again = registry.get("s1", "cora")
+    assert again.conversation_id == "conv_1"
+    registry.save("s1", again)
+    assert not registry.get("s1", "cart_manager").persistent
+    assert not registry.get("s2", "cora").persistent
+    stats = registry.stats()
+    assert (stats["sessions"], stats["conversations_created"], stats["turns_continued"]) == (1, 1, 1)
+
+
+def test_sessions_are_evicted_and_expire():
+    registry = ConversationRegistry(max_sessions=2, ttl_seconds=0.05)
+    for session_id in ("s1", "s2", "s3"):
+        registry.save(session_id, AgentConversation("cora", conversation_id=f"conv_{session_id}"))
+    assert not registry.get("s1", "cora").persistent
+    assert registry.get("s3", "cora").persistent
+    time.sleep(0.06)
+    assert not registry.get("s3", "cora").persistent
+    stats = registry.stats()
+    assert stats["evicted"] == 1 and stats["expired"] >= 1
+
+
+def test_drop_forgets_one_agent_or_the_session():
+    registry = ConversationRegistry()
+    registry.save("s1", AgentConversation("cora", conversation_id="c1"))
+    registry.save("s1", AgentConversation("cart_manager", conversation_id="c2"))
+    registry.drop("s1", "cora")
+    assert not registry.get("s1", "cora").persistent
+    assert registry.get("s1", "cart_manager").persistent
+    registry.drop("s1")
+    assert not registry.get("s1", "cart_manager").persistent
+
+
+def test_only_unseen_io_is_resent_so_prompts_stay_flat():
+    # cora and cart_manager alternate: each turn resends only the other agent's last turn
+    history = []
+    anchors = {}
+    sizes = []
+    for turn in range(40):
+        agent = ("cora", "cart_manager")[turn % 2]
+        question, answer = io_turn(f"question {turn:03d}", f"answer {turn:03d}", seq=2 * turn + 1)
+        history.append(question)
+        unseen = io_entries_since(history[:-1], anchors.get(agent), limit=100)
+        sizes.append(len(orjson.dumps(unseen)))
+        history.append(answer)
+        anchors[agent] = answer["seq"]
+    assert max(sizes[2:]) - min(sizes[2:]) <= 2  # only the digits of seq grow
+    assert sizes[-1] < len(orjson.dumps(history)) / 10
+
+
+def test_io_entries_since_falls_back_to_the_window():
+    history = io_turn("hi", "hello") + io_turn("add the lamp", "added", seq=3)
+    assert io_entries_since(history, 2, limit=10) == history[2:]
+    assert io_entries_since(history, None, limit=3) == history[-3:]
+    assert io_entries_since(history + io_turn("more", "sure", seq=5), 0, limit=2) == io_turn("more", "sure", seq=5)
+    assert io_entries_since(history, 4, limit=10) == []
+
+
+def test_anchor_survives_reloading_the_history_from_the_store():
+    # The reconnecting websocket rebuilds raw_io_history from deserialized copies
+    store = InMemorySessionStore()
+    history = io_turn("add the lamp", "added") + [{"seq": 3, "input": "and the rug", "cart": []}]
+    conversation = AgentConversation("cart_manager", conversation_id="conv_1", io_anchor=2)
+
+    def persist(state):
+        state.raw_io_history = history
+
+    store.update("s1", persist)
+    reloaded = store.load("s1").raw_io_history
+    assert reloaded == history and reloaded[0] is not history[0]
+
+    context = build_agent_context("cart_manager", "and the rug", "", reloaded, 10, conversation)
+    assert context == "and the rug"
+
+    reloaded.append({"seq": 4, "input": "remove the lamp", "cart": []})
+    context = build_agent_context("cart_manager", "remove the lamp", "", reloaded, 10, conversation)
+    assert "RAW_IO_HISTORY (since your last reply)" in context
+    assert "and the rug" in context and "add the lamp" not in context
+
+
+def test_reset_starts_a_new_conversation_with_the_full_context():
+    conversation = AgentConversation("cora", conversation_id="c1", io_anchor=2)
+    conversation.reset()
+    assert not conversation.persistent
+    assert conversation.io_anchor is None
+
+
+def test_format_io_history_keeps_answers_only():
+    entries = io_turn("show me blue paint", "Here are two blues")
+    assert format_io_history(entries) == "user: show me blue paint\nbot: Here are two blues"
@@ -0,0 +1,140 @@
+import os
+
+import pytest
+
+from utils import storage_utils
+from utils.disk_cache import DiskCache, Fetched
+from utils.storage_utils import StorageManager
+
+
+def put(server, name, data):
+    server._store("zava", name, data, "image/png")
+    return f"{server.account_url}/zava/{name}"
+
+
+def objects(cache):
+    return sorted(os.listdir(os.path.join(cache.directory, "objects")))
+
+
+def test_hot_url_is_served_from_disk(blob_server, tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1024 * 1024, fresh_seconds=60)
+    url = put(blob_server, "room.png", b"room-bytes")
+
+    assert cache.fetch_url(url) == b"room-bytes"
+    assert cache.fetch_url(url) == b"room-bytes"
+    assert cache.fetch_url(url) == b"room-bytes"
+
+    assert blob_server.count("GET") == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (2, 1, 0.667)
+    assert os.listdir(os.path.join(cache.directory, "tmp")) == []
+
+
+def test_stale_entries_are_revalidated(blob_server, tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1024 * 1024, fresh_seconds=0)
+    url = put(blob_server, "room.png", b"v1")
+
+    assert cache.fetch_url(url) == b"v1"
+    assert cache.fetch_url(url) == b"v1"
+    assert cache.stats()["revalidated"] == 1
+
+    put(blob_server, "room.png", b"v2")
+    assert cache.fetch_url(url) == b"v2"
+    assert cache.stats()["misses"] == 2
+
+    blob_server.stop()
+    assert cache.fetch_url(url) == b"v2"
+    assert cache.stats()["stale_served"] == 1
+
+
+def test_duplicate_urls_share_one_object(blob_server, tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1024 * 1024)
+    first = put(blob_server, "a.png", b"same-bytes")
+    second = put(blob_server, "b.png", b"same-bytes")
+
+    cache.fetch_url(first)
+    cache.fetch_url(second)
+
+    assert len(objects(cache)) == 1
+    assert cache.stats()["total_bytes"] == len(b"same-bytes")
+
+
+def test_fetch_url_enforces_max_bytes(blob_server, tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1024 * 1024)
+    url = put(blob_server, "huge.png", b"x" * 5000)
+
+    with pytest.raises(ValueError):
+        cache.fetch_url(url, max_bytes=4096)
+    assert objects(cache) == []
+    assert cache.fetch_url(url, max_bytes=8192) == b"x" * 5000
+    with pytest.raises(ValueError):
+        cache.fetch_url(url, max_bytes=4096)  # Cached copy too
+
+
+def test_size_bound_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=250, fresh_seconds=60)
+    calls = []
+
+    def origin(data):
+        def fetch(validators):
+            calls.append(data)
+            return Fetched(data=data)
+
+        return fetch
+
+    cache.get_or_fetch("a", origin(b"a" * 100))
+    cache.get_or_fetch("b", origin(b"b" * 100))
+    cache.get_or_fetch("a", origin(b"a" * 100))  # a becomes most recently used
+    cache.get_or_fetch("c", origin(b"c" * 100))  # evicts b
+
+    assert cache.stats()["evictions"] == 1
+    assert cache.get_or_fetch("a", origin(b"a" * 100)) == b"a" * 100
+    assert calls == [b"a" * 100, b"b" * 100, b"c" * 100]
+    cache.get_or_fetch("b", origin(b"b" * 100))
+    assert calls[-1] == b"b" * 100
+
+    # A new instance on the same directory picks up the cached content
+    reopened = DiskCache(str(tmp_path), max_bytes=250, fresh_seconds=60)
+    assert reopened.stats()["objects"] == 2
+    assert reopened.get_or_fetch("b", origin(b"never fetched")) == b"b" * 100
+
+
+def test_workers_sharing_the_directory_stay_under_one_bound(tmp_path):
+    # Two processes (workers) on the same directory, each with its own view
+    workers = [DiskCache(str(tmp_path), max_bytes=250, fresh_seconds=60) for _ in range(2)]
+
+    for index in range(10):
+        data = bytes([index]) * 100
+        workers[index % 2].get_or_fetch(f"url-{index}", lambda validators, data=data: Fetched(data=data))
+        on_disk = sum(os.path.getsize(os.path.join(tmp_path, "objects", name)) for name in objects(workers[0]))
+        assert on_disk <= 250
+
+    assert len(objects(workers[0])) == 2
+    for worker in workers:
+        assert worker.stats()["total_bytes"] <= 250
+
+
+def test_entries_of_evicted_objects_are_deleted(tmp_path):
+    # Every URL distinct (a new SAS query string each time): keys/ must stay bounded too
+    cache = DiskCache(str(tmp_path), max_bytes=250, fresh_seconds=60)
+    keys_dir = os.path.join(tmp_path, "keys")
+
+    for index in range(50):
+        data = bytes([index]) * 100
+        cache.get_or_fetch(f"https://x/room.png?sig={index}", lambda validators, data=data: Fetched(data=data))
+        assert len(os.listdir(keys_dir)) <= 3
+
+    assert len(os.listdir(keys_dir)) == len(objects(cache)) == 2
+    assert cache.stats()["entries_pruned"] == 48
+
+
+def test_storage_manager_reads_blobs_through_disk_cache(blob_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_utils, "disk_cache", DiskCache(str(tmp_path), max_bytes=1024 * 1024, fresh_seconds=0))
+    manager = StorageManager(connection_string=blob_server.connection_string, container_name="zava")
+    manager.upload_blob("image_1.png", b"generated")
+
+    assert manager.download_blob_cached("image_1.png") == b"generated"
+    assert manager.download_blob_cached("image_1.png") == b"generated"
+
+    stats = storage_utils.disk_cache.stats()
+    assert (stats["misses"], stats["revalidated"]) == (1, 1)
@@ -0,0 +1,57 @@
+import asyncio
+
+import orjson
+
+from evaluate_handoff import StubAgentClient, compare, load_examples, replay, summarize
+from services.handoff_service import HandoffService
+
+
+def run_stub(concurrency=4, repeat=1, mode="inline"):
+    client = StubAgentClient(rtt=0.01, ttft=0.0, per_token=0.0, jitter=0.0)
+    service = HandoffService(None, "gpt", classification_mode=mode, async_client=client, max_concurrent=concurrency)
+    examples = load_examples()
+    records = asyncio.run(replay(service, examples, concurrency=concurrency, repeat=repeat))
+    return client, service, records
+
+
+def test_load_examples():
+    examples = load_examples()
+    assert len(examples) == 30
+    assert examples[0] == {
+        "id": "1", "current_domain": "interior_designer", "message": "add2cart", "expected": "cart_manager",
+    }
+
+
+def test_replay_is_bounded_and_leaves_no_sessions():
+    client, service, records = run_stub(concurrency=3, repeat=2)
+
+    assert len(records) == 60
+    assert client.max_in_flight == 3
+    assert service.stats()["sessions"] == 0
+
+
+def test_summary_reports_accuracy_confusion_latency_and_tokens():
+    _, service, records = run_stub()
+    summary = summarize(records, service.stats())
+
+    assert summary["examples"] == 30
+    assert sum(sum(row.values()) for row in summary["confusion"].values()) == 30
+    correct = sum(stats["correct"] for stats in summary["per_domain"].values())
+    assert summary["accuracy"] == round(correct / 30, 4)
+    assert summary["per_domain"]["inventory_agent"]["examples"] == 5
+    assert 0 < summary["latency_ms"]["p50"] <= summary["latency_ms"]["p95"] <= summary["latency_ms"]["p99"]
+    assert summary["tokens"]["input"] > 0 and summary["tokens"]["output"] > 0
+    assert summary["answered_by"]["llm"] == 30
+
+    # Summaries survive a JSON round trip and compare cleanly with themselves
+    baseline = orjson.loads(orjson.dumps(summary))
+    assert any(line.startswith("accuracy") and "(+0.0%)" in line for line in compare(summary, baseline))
+
+
+def test_stub_supports_every_classification_mode():
+    for mode in ("stream", "conversation"):
+        _, service, records = run_stub(mode=mode)
+        assert service.stats()["fallback"] == 0
+        assert {record["predicted"] for record in records} <= {
+            "cora", "interior_designer", "inventory_agent", "customer_loyalty", "cart_manager",
+        }
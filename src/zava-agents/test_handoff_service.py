@@ -0,0 +1,220 @@
+import asyncio
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+from services.handoff_service import SESSION_ENTRY_BYTES, HandoffService
+
+CLASSIFICATION = orjson.dumps({
+    "domain": "cart_manager",
+    "is_domain_change": True,
+    "confidence": 0.92,
+    "reasoning": "The user asked to check out, which is a cart operation handled by the cart manager.",
+}).decode()
+
+
+def classify(client, mode):
+    service = HandoffService(client, "gpt", classification_mode=mode)
+    service.set_domain("s1", "interior_designer")
+    return client, service.classify_intent("checkout?", "s1")
+
+
+def test_inline_mode_is_a_single_call_without_conversation(openai_client):
+    client, result = classify(openai_client(), "inline")
+
+    assert [name for name, _ in client.calls] == ["responses.create"]
+    request = client.calls[0][1]
+    assert "conversation" not in request
+    assert "User message: checkout?" in request["input"][0]["content"]
+    assert request["extra_body"]["agent"]["name"] == "handoff-service"
+    assert result["domain"] == "cart_manager" and result["confidence"] == 0.92
+
+
+def test_stream_mode_stops_once_routing_fields_are_known(openai_client):
+    client, result = classify(openai_client(), "stream")
+
+    assert [name for name, _ in client.calls] == ["responses.create"]
+    assert client.calls[0][1]["stream"] is True
+    assert result["domain"] == "cart_manager"
+    assert result["is_domain_change"] is True
+    assert result["confidence"] == 0.92
+    assert client.stream.closed
+    assert client.stream.consumed < len(client.stream.chunks)
+
+
+def test_conversation_mode_deletes_the_conversation(openai_client):
+    client, result = classify(openai_client(), "conversation")
+
+    assert client.deleted.wait(2)
+    names = [name for name, _ in client.calls]
+    assert names[:2] == ["conversations.create", "responses.create"]
+    assert ("conversations.delete", "conv_1") in client.calls
+    assert result["domain"] == "cart_manager"
+
+
+def test_unknown_mode_is_rejected(openai_client):
+    with pytest.raises(ValueError):
+        HandoffService(openai_client(), "gpt", classification_mode="batch")
+
+
+class FakeAsyncClient:
+    """Async stand-in: each responses.create takes ``delay`` seconds."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.cancelled = 0
+        self.responses = SimpleNamespace(create=self._create_response)
+
+    async def _create_response(self, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        return SimpleNamespace(output_text=CLASSIFICATION)
+
+
+def async_service(sync_client, client, **kwargs):
+    service = HandoffService(sync_client, "gpt", async_client=client, **kwargs)
+    for i in range(10):
+        service.set_domain(f"s{i}", "interior_designer")
+    return service
+
+
+def test_async_classification_does_not_block_the_loop(openai_client):
+    service = async_service(openai_client(), FakeAsyncClient(delay=0.2))
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(1)
+            await asyncio.sleep(0.02)
+
+    async def run():
+        result, _ = await asyncio.gather(service.classify_intent_async("checkout?", "s0"), ticker())
+        return result
+
+    result = asyncio.run(run())
+    assert result["domain"] == "cart_manager"
+    assert len(ticks) == 5
+    assert service.get_current_domain("s0") == "cart_manager"
+
+
+def test_async_timeout_falls_back_to_current_domain(openai_client):
+    service = async_service(openai_client(), FakeAsyncClient(delay=1.0))
+
+    result = asyncio.run(service.classify_intent_async("checkout?", "s0", timeout=0.05))
+
+    assert result["domain"] == "interior_designer"
+    assert result["is_domain_change"] is False
+    assert service.stats()["timeout"] == 1
+
+
+def test_async_cancellation_reaches_the_request(openai_client):
+    client = FakeAsyncClient(delay=1.0)
+    service = async_service(openai_client(), client)
+
+    async def run():
+        task = asyncio.create_task(service.classify_intent_async("checkout?", "s0"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert client.cancelled == 1
+    assert service.get_current_domain("s0") == "interior_designer"
+
+
+def test_async_concurrency_is_limited(openai_client):
+    client = FakeAsyncClient(delay=0.05)
+    service = async_service(openai_client(), client, max_concurrent=2)
+
+    async def run():
+        return await asyncio.gather(*(service.classify_intent_async("checkout?", f"s{i}") for i in range(6)))
+
+    results = asyncio.run(run())
+    assert all(result["domain"] == "cart_manager" for result in results)
+    assert client.max_in_flight == 2
+
+
+def test_async_without_async_client_uses_a_thread(openai_client):
+    service = HandoffService(openai_client(), "gpt")
+    service.set_domain("s0", "interior_designer")
+
+    result = asyncio.run(service.classify_intent_async("checkout?", "s0"))
+
+    assert result["domain"] == "cart_manager"
+
+
+def test_idle_sessions_expire_and_active_sessions_are_renewed(openai_client, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("utils.cache_utils.time.monotonic", lambda: now[0])
+    service = HandoffService(openai_client(), "gpt", session_ttl_seconds=60)
+    service.set_domain("active", "interior_designer")
+    service.set_domain("idle", "interior_designer")
+
+    for _ in range(3):
+        now[0] += 40
+        service.classify_intent("what colors go with oak?", "active")
+
+    assert service.get_current_domain("active") == "cart_manager"
+    assert service.get_current_domain("idle") is None
+    # An expired session starts over at the default domain
+    assert service.classify_intent("hello again", "idle")["domain"] == "cora"
+
+
+def test_session_table_is_bounded(openai_client):
+    service = HandoffService(openai_client(), "gpt", max_sessions=3)
+    for i in range(5):
+        service.classify_intent("hello", f"s{i}")
+
+    stats = service.stats()
+    assert (stats["sessions"], stats["sessions_evicted"]) == (3, 2)
+    assert service.get_current_domain("s0") is None
+    assert service.get_current_domain("s4") == "cora"
+
+
+def test_disconnect_drops_session_after_last_connection(openai_client):
+    service = HandoffService(openai_client(), "gpt")
+    service.connect_session("s1")
+    service.connect_session("s1")  # same session reopened in a second tab
+    service.set_domain("s1", "inventory_agent")
+
+    service.disconnect_session("s1")
+    assert service.get_current_domain("s1") == "inventory_agent"
+
+    service.disconnect_session("s1")
+    assert service.get_current_domain("s1") is None
+    stats = service.stats()
+    assert (stats["open_sessions"], stats["sessions_disconnected"]) == (0, 1)
+
+
+def test_session_memory_stays_flat_over_days_of_traffic(openai_client, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("utils.cache_utils.time.monotonic", lambda: now[0])
+    service = HandoffService(openai_client(), "gpt", session_ttl_seconds=3600, max_sessions=500)
+
+    sizes = []
+    for hour in range(72):
+        for i in range(200):
+            session_id = f"{hour}-{i}"
+            service.classify_intent("hello", session_id)
+            # Every other socket closes cleanly; the rest are abandoned
+            if i % 2 == 0:
+                service.connect_session(session_id)
+                service.disconnect_session(session_id)
+            now[0] += 18
+        sizes.append(service.stats()["session_table_bytes"])
+
+    # Abandoned sessions expire instead of accumulating: the last day looks like the first
+    assert max(sizes) <= 500 * SESSION_ENTRY_BYTES
+    assert max(sizes[48:]) == max(sizes[:24])
+    assert service.stats()["sessions_expired"] > 0
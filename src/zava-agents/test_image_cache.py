@@ -0,0 +1,171 @@
+import asyncio
+import base64
+import threading
+from io import BytesIO
+
+import pytest
+
+from utils.cache_utils import LRUCache
+
+
+def test_lru_evicts_by_size():
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.set("a", "12345")
+    cache.set("b", "12345")
+    assert cache.get("a") == "12345"  # a becomes most recently used
+    cache.set("c", "123")
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+    assert cache.total_size == 8
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lru_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("utils.cache_utils.time.monotonic", lambda: now[0])
+    cache = LRUCache(ttl_seconds=5)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    now[0] += 6
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_lru_touch_renews_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("utils.cache_utils.time.monotonic", lambda: now[0])
+    cache = LRUCache(ttl_seconds=5)
+    cache.set("a", 1)
+    now[0] += 4
+    assert cache.touch("a")
+    now[0] += 4
+    assert cache.get("a") == 1
+    now[0] += 6
+    assert not cache.touch("a")
+
+
+def _png_bytes(size=(64, 48), color=(159, 187, 194)) -> bytes:
+    from PIL import Image
+
+    output = BytesIO()
+    Image.new("RGB", size, color).save(output, format="PNG")
+    return output.getvalue()
+
+
+def _data_uri(payload: bytes) -> str:
+    return "data:image/png;base64," + base64.b64encode(payload).decode()
+
+
+def test_description_cache_single_flight_and_content_key():
+    pytest.importorskip("PIL")
+    from utils.image_cache import ImageDescriptionCache
+
+    calls = []
+    release = threading.Event()
+
+    def describe(url):
+        calls.append(url)
+        release.wait(5)
+        return "a blue living room"
+
+    async def run():
+        cache = ImageDescriptionCache(max_bytes=1024, ttl_seconds=60)
+        url = _data_uri(_png_bytes())
+        tasks = [asyncio.create_task(cache.get_description(url, describe)) for _ in range(5)]
+        await asyncio.sleep(0.1)
+        release.set()
+        results = await asyncio.gather(*tasks)
+        assert results == ["a blue living room"] * 5
+
+        # Same bytes under another URL reuse the description
+        other_url = "data:image/png;charset=x;base64," + url.split(",", 1)[1]
+        assert await cache.get_description(other_url, describe) == "a blue living room"
+        assert cache.is_cached(url) and cache.is_cached(other_url)
+        return cache.stats()
+
+    stats = asyncio.run(run())
+    assert len(calls) == 1
+    assert stats["inflight_joins"] == 4
+    assert stats["content_hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_image_sources_are_restricted():
+    from utils.image_utils import load_image_bytes, url_cache_key, validate_image_source
+
+    for source in ("/etc/passwd", "/dev/zero", "file:///etc/passwd", "data:text/html;base64,PGI+", "ftp://x/y.png"):
+        with pytest.raises(ValueError):
+            load_image_bytes(source)
+    assert validate_image_source("https://example.com/room.png")
+    assert load_image_bytes(_data_uri(b"png-bytes")) == b"png-bytes"
+    with pytest.raises(ValueError):
+        load_image_bytes(_data_uri(b"x" * 1001), max_bytes=1000)
+
+    # Data URIs and long URLs are hashed before being used as cache keys
+    assert url_cache_key(_data_uri(b"x" * 100000)).startswith("sha256:")
+    assert len(url_cache_key("https://example.com/" + "a" * 5000)) == len("sha256:") + 64
+    assert url_cache_key("https://example.com/room.png") == "https://example.com/room.png"
+
+
+def test_prepare_image_downscales_and_caches():
+    pytest.importorskip("PIL")
+    from utils.image_utils import prepare_image
+
+    original = _png_bytes(size=(3000, 2000))
+    prepared = prepare_image(original, max_dimension=1536)
+    assert (prepared.width, prepared.height) == (1536, 1024)
+    assert prepared.mime_type == "image/jpeg"
+    assert prepared.data[:2] == b"\xff\xd8"
+    assert prepare_image(_data_uri(original), max_dimension=1536) is prepared
+
+    # Small images that would not shrink are passed through unchanged
+    small = _png_bytes(size=(8, 8))
+    assert prepare_image(small).data == small
+
+
+def test_prepare_image_reloads_urls_whose_content_changed(monkeypatch):
+    pytest.importorskip("PIL")
+    from utils import image_utils
+
+    served = {"https://example.com/room.png": _png_bytes(size=(8, 8))}
+    monkeypatch.setattr(image_utils, "load_image_bytes", lambda url: served[url])
+
+    first = image_utils.prepare_image("https://example.com/room.png")
+    served["https://example.com/room.png"] = _png_bytes(size=(16, 16))
+    second = image_utils.prepare_image("https://example.com/room.png")
+
+    assert (first.width, second.width) == (8, 16)
+
+
+def test_decode_b64_image_passes_png_through():
+    pytest.importorskip("PIL")
+    from utils.image_utils import decode_b64_image, sniff_image_type
+
+    png = _png_bytes()
+    image_bytes, content_type = decode_b64_image(base64.b64encode(png).decode())
+    assert image_bytes == png and content_type == "image/png"
+    assert sniff_image_type(memoryview(b"\xff\xd8\xff\xe0rest")) == "image/jpeg"
+    assert sniff_image_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+    assert sniff_image_type(b"not an image") is None
+
+
+def test_generation_cache_key_and_reuse_policy():
+    from utils.generation_cache import GenerationCache, generation_key
+
+    key = generation_key("Make this room  Sage Harmony.", "abc", size="1536x1024")
+    assert key == generation_key("make this room sage harmony", "abc", size="1536x1024")
+    assert key != generation_key("make this room sage harmony", "def", size="1536x1024")
+    assert key != generation_key("make this room sage harmony", "abc", size="1024x1024")
+
+    cache = GenerationCache(policy="always", max_reuses=2)
+    assert cache.lookup(key) is None
+    cache.store(key, "https://blob/image_1.png")
+    assert cache.lookup(key) == "https://blob/image_1.png"
+    assert cache.lookup(key) == "https://blob/image_1.png"
+    assert cache.lookup(key) is None  # reuse budget spent, generate a fresh variation
+
+    never = GenerationCache(policy="never")
+    never.store(key, "https://blob/image_1.png")
+    assert never.lookup(key) is None
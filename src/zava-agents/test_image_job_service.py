@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import pytest
+
+from services.image_job_service import (
+    CANCELLED,
+    COMPLETED,
+    FAILED,
+    ImageJobRejected,
+    ImageJobService,
+)
+
+
+def make_generator(release: threading.Event, started: list):
+    def generate(prompt, image_url, on_progress, cancel_event):
+        started.append(prompt)
+        on_progress("generating")
+        release.wait(5)
+        if cancel_event.is_set():
+            return None
+        on_progress("uploading")
+        if prompt == "fail":
+            return None
+        return f"https://blob/{prompt}.png"
+
+    return generate
+
+
+def test_job_runs_in_background_and_reports_progress():
+    release, started, events = threading.Event(), [], []
+
+    async def run():
+        service = ImageJobService(make_generator(release, started), max_workers=1)
+
+        async def on_event(job, event):
+            events.append(event)
+
+        job = service.submit("session-1", "blue room", "room.png", on_event)
+        await asyncio.sleep(0.05)
+        assert job.status == "running"  # submit returned before the image was ready
+        release.set()
+        await job.task
+        service.shutdown()
+        return job
+
+    job = asyncio.run(run())
+    assert job.status == COMPLETED
+    statuses = [(event["status"], event.get("stage")) for event in events]
+    assert statuses[0] == ("queued", None)
+    assert ("running", "generating") in statuses
+    assert events[-1] == {
+        "type": "image_job",
+        "job_id": job.job_id,
+        "status": COMPLETED,
+        "image_url": "https://blob/blue room.png",
+    }
+
+
+def test_per_owner_cap_and_bounded_pool():
+    release, started = threading.Event(), []
+
+    async def run():
+        service = ImageJobService(make_generator(release, started), max_workers=1, max_per_owner=1)
+        first = service.submit("a", "one", "x.png")
+        with pytest.raises(ImageJobRejected):
+            service.submit("a", "two", "x.png")
+        second = service.submit("b", "fail", "x.png")
+        await asyncio.sleep(0.05)
+        assert service.stats()["running"] == 1 and service.stats()["queued"] == 1
+        release.set()
+        await asyncio.gather(first.task, second.task)
+        service.shutdown()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.status == COMPLETED
+    assert second.status == FAILED
+
+
+def test_cancel_owner_drops_result():
+    release, started, events = threading.Event(), [], []
+
+    async def run():
+        service = ImageJobService(make_generator(release, started), max_workers=1)
+
+        async def on_event(job, event):
+            events.append(event["status"])
+
+        running = service.submit("a", "one", "x.png", on_event)
+        queued = service.submit("b", "two", "x.png", on_event)
+        await asyncio.sleep(0.05)
+        assert service.cancel_owner("b") == 1
+        assert service.cancel_owner("a") == 1
+        release.set()
+        await asyncio.gather(running.task, queued.task, return_exceptions=True)
+        stats = service.stats()
+        service.shutdown()
+        return running, queued, stats
+
+    running, queued, stats = asyncio.run(run())
+    assert running.status == CANCELLED and queued.status == CANCELLED
+    assert running.result is None
+    assert started == ["one"]  # the queued job never started
+    assert stats["cancelled"] == 2
+    assert COMPLETED not in events
@@ -0,0 +1,74 @@
+import pytest
+
+from services.handoff_service import HandoffService
+from services.intent_classifier import (
+    LocalIntentClassifier,
+    evaluate,
+    load_labelled_messages,
+    parse_evaluation_query,
+)
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return LocalIntentClassifier.from_jsonl()
+
+
+def test_parse_evaluation_query():
+    assert parse_evaluation_query("Current domain: cora\nUser message: points?") == ("cora", "points?")
+    assert parse_evaluation_query("What's the best paint?") == (None, "What's the best paint?")
+    examples = load_labelled_messages("data/handoff_service_evaluation_grounded.jsonl")
+    assert examples[0] == ("interior_designer", "add2cart", "cart_manager")
+
+
+@pytest.mark.parametrize("message", ["add2cart", "PLEASE ADD TO CART!!!", "chekout ahora", "view my cart"])
+def test_obvious_cart_messages_are_confident(classifier, message):
+    intent = classifier.classify(message, "interior_designer")
+    assert intent.domain == "cart_manager"
+    assert intent.confidence >= 0.9
+
+
+@pytest.mark.parametrize(
+    "message,current_domain",
+    [("check out the new arrivals", "cora"), ("can I check out later?", "interior_designer")],
+)
+def test_rule_match_the_centroid_disagrees_with_escalates(classifier, message, current_domain):
+    assert classifier.classify(message, current_domain).confidence < 0.9
+
+
+def test_mixed_intent_is_not_confident(classifier):
+    intent = classifier.classify("Do you have that grey sofa in stock? Also add 2 my basket", "cora")
+    assert intent.source == "mixed"
+    assert intent.confidence < 0.5
+
+
+def test_local_answer_skips_llm(classifier, openai_client):
+    client = openai_client()
+    service = HandoffService(client, "gpt", local_classifier=classifier, local_confidence_threshold=0.9)
+    service.classify_intent("hello", "s1")  # first message routes to the default domain
+
+    result = service.classify_intent("checkout", "s1")
+
+    assert result["domain"] == "cart_manager" and result["is_domain_change"]
+    assert service.get_current_domain("s1") == "cart_manager"
+    assert client.calls == []
+    assert service.stats()["local"] == 1
+
+
+def test_uncertain_message_escalates_to_llm(classifier, openai_client):
+    client = openai_client(domain="interior_designer")
+    service = HandoffService(client, "gpt", local_classifier=classifier, local_confidence_threshold=0.9)
+    service.set_domain("s1", "cora")
+
+    result = service.classify_intent("I like this sofa in the mockup, checkout?", "s1")
+
+    assert result["domain"] == "interior_designer"
+    assert "responses.create" in client.call_names()
+    assert service.stats()["llm"] == 1
+
+
+def test_leave_one_out_evaluation():
+    report = evaluate(threshold=0.9)
+    assert report["examples"] == 30
+    assert report["answered_locally"] > 0
+    assert report["local_accuracy"] >= 0.9
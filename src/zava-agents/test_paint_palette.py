@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from utils.palette_utils import (
+    PAINT_PALETTE,
+    format_palette_prompt,
+    load_paint_shade_products,
+    validate_paint_request,
+)
+from utils.color_utils import delta_e, hex_to_lab
+
+
+def test_ciede2000_reference_pairs():
+    # Sharma, Wu & Dalal (2005) test data
+    lab1 = np.array([[50.0, 2.6772, -79.7751], [50.0, 2.5, 0.0], [60.2574, -34.0099, 36.2677]])
+    lab2 = np.array([[50.0, 0.0, -82.7485], [73.0, 25.0, -18.0], [60.4626, -34.1751, 39.4387]])
+    assert delta_e(lab1, lab2) == pytest.approx([2.0425, 27.1492, 1.2644], abs=1e-4)
+
+
+def test_palette_matches_catalog_paint_shades():
+    products = load_paint_shade_products()
+    assert products["Sage Harmony"] == "PROD0010"
+    assert set(products) <= set(PAINT_PALETTE)
+    assert "Sage Harmony: #bec7be" in format_palette_prompt()
+
+
+@pytest.mark.parametrize(
+    "prompt",
+    [
+        "Make the walls Sage Harmony",
+        "make this room whispering blue",
+        "paint the walls #bec7bf",  # within rounding of Sage Harmony
+        "paint the walls light blue",
+        "add a black sofa by the window",  # colors outside a paint context are not checked
+        "paint walls Sage Harmony and keep the black sofa",  # black describes the sofa
+        "paint the walls blue next to the black sofa",
+        "paint the walls bright white",
+        "make it cozier",
+    ],
+)
+def test_in_palette_requests_pass(prompt):
+    assert validate_paint_request(prompt).is_valid
+
+
+def test_off_palette_request_gets_nearest_suggestions():
+    result = validate_paint_request("paint it neon orange")
+    assert not result.is_valid
+    assert result.rejected == ["neon orange"]
+    assert result.suggestions[0]["name"] == "Sunset Coral"
+    assert result.suggestions[0]["product_id"] == "PROD0006"
+    assert "Sunset Coral (#d25e2e)" in result.message
+
+    result = validate_paint_request("Sage Harmony walls with a navy ceiling and #ff00ff trim")
+    assert result.matched == ["Sage Harmony"]
+    assert result.rejected == ["#ff00ff", "navy"]
+
+    assert validate_paint_request("paint the walls neon green next to the sofa").rejected == ["neon green"]
+    assert result.suggestions[0]["delta_e"] <= result.suggestions[1]["delta_e"]
+
+
+def test_room_colors_map_to_palette():
+    pytest.importorskip("PIL")
+    from io import BytesIO
+
+    from PIL import Image, ImageDraw
+
+    from utils.palette_utils import analyze_room_colors
+
+    image = Image.new("RGB", (1200, 800), "#bec7be")  # Sage Harmony walls
+    ImageDraw.Draw(image).rectangle([0, 560, 1200, 800], fill="#6b6c6a")  # Charcoal Storm floor
+    output = BytesIO()
+    image.save(output, format="PNG")
+
+    colors = analyze_room_colors(output.getvalue(), color_count=3)
+    assert [c["palette_match"]["name"] for c in colors] == ["Sage Harmony", "Charcoal Storm"]
+    assert colors[0]["palette_match"]["product_id"] == "PROD0010"
+    assert colors[0]["share"] == pytest.approx(0.7, abs=0.05)
+    assert colors[0]["palette_match"]["delta_e"] < 1
+
+
+def test_kmeans_is_deterministic():
+    from utils.color_utils import kmeans_colors
+
+    rng = np.random.default_rng(1)
+    pixels = np.concatenate([rng.normal(20, 1, (300, 3)), rng.normal(70, 1, (100, 3))])
+    centers, weights = kmeans_colors(pixels, k=2)
+    assert weights.tolist() == [0.75, 0.25]
+    assert centers[0] == pytest.approx([20, 20, 20], abs=0.5)
+    again, _ = kmeans_colors(pixels, k=2)
+    assert np.array_equal(centers, again)
+
+
+def test_color_index_batch_matches_brute_force():
+    from utils.palette_utils import get_paint_color_index
+
+    index = get_paint_color_index()
+    queries = np.random.default_rng(0).uniform([20, -40, -40], [95, 40, 40], (50, 3))
+    results = index.nearest_lab(queries, k=3)
+    for query, matches in zip(queries, results):
+        brute = sorted(
+            (float(delta_e(query, lab)), entry["name"]) for entry, lab in zip(index.entries, index.lab)
+        )[:3]
+        assert [m["name"] for m in matches] == [name for _, name in brute]
+    assert index.nearest(["#bec7be"], k=5, max_delta_e=0.5) == [[{**index.entries[9], "delta_e": 0.0}]]
+
+
+def test_find_similar_paints_resolves_hex_names_and_words():
+    from utils.palette_utils import find_similar_paints
+
+    results = find_similar_paints(["#a0b0c0", "Sage Harmony", "light blue", "plaid"], count=2)
+    assert [m["name"] for m in results[0]["matches"]] == ["Coastal Whisper", "Whispering Blue"]
+    assert results[1]["matches"][0] == {
+        "name": "Sage Harmony",
+        "hex": "#bec7be",
+        "product_id": "PROD0010",
+        "delta_e": 0.0,
+    }
+    assert results[2]["matches"][0]["name"] == "Whispering Blue"
+    assert "error" in results[3]
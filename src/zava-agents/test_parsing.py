@@ -1,5 +1,5 @@
 import json
-from chat_app import parse_agent_response
+from utils.response_utils import parse_agent_response, find_json_span
 
 def test_parse_agent_response():
     # Test case 1: New list format with answer, products, and image_output
@@ -66,5 +66,41 @@ def test_parse_agent_response():
     print(f"Image URL: {result_4['image_url']}")
     print(f"Agent: {result_4['agent']}")
 
+    assert result_1["answer"].startswith("Here are some amazing blue paint options")
+    assert "Frosted Blue" in result_1["products"]
+    assert result_2["agent"] == "test_agent"
+    assert result_3["answer"] == test_response_3
+    assert result_4["answer"] == "['simple string in list']"
+
+
+def test_parse_agent_response_with_prose_and_code_fence():
+    response = 'Sure (see [1]):\n```json\n[{"answer": "Done {ok}", "cart": [{"id": "PROD0001"}], "discount_percentage": 15}]\n```\nAnything else?'
+
+    result = parse_agent_response(response)
+    assert result["answer"] == "Done {ok}"
+    assert result["cart"] == [{"id": "PROD0001"}]
+    assert result["discount_percentage"] == "15"
+
+
+def test_find_json_span_skips_brackets_in_strings():
+    text = 'prefix {"answer": "a } ] \\" quote"} suffix'
+    start, end = find_json_span(text)
+    assert text[start:end] == '{"answer": "a } ] \\" quote"}'
+    assert find_json_span("no json here [1]") is None
+
+
+def test_parse_agent_response_scalar_and_bracket_heavy_prose():
+    assert parse_agent_response('"hello"')["answer"] == "hello"
+    prose = "see [x " * 20000
+    assert parse_agent_response(prose)["answer"] == prose
+    assert find_json_span(prose + '{"answer": "ok"}') == (len(prose), len(prose) + 16)
+    # Balanced but invalid nested candidates
+    nested = "[" * 20000 + "x" + "]" * 20000
+    assert parse_agent_response(nested)["answer"] == nested
+    assert parse_agent_response(nested + ' {"answer": "ok"}')["answer"] == "ok"
+
 if __name__ == "__main__":
-    test_parse_agent_response() 
\ No newline at end of file
+    test_parse_agent_response()
+    test_parse_agent_response_with_prose_and_code_fence()
+    test_find_json_span_skips_brackets_in_strings()
+    test_parse_agent_response_scalar_and_bracket_heavy_prose()
\ No newline at end of file
@@ -0,0 +1,153 @@
+import asyncio
+import time
+
+from services.handoff_service import HandoffService
+from services.intent_classifier import LocalIntentClassifier
+from services.routing_cache import RoutingCache, normalize_message
+
+
+def service_in_domain(client, cache, domain="interior_designer"):
+    service = HandoffService(client, "gpt", routing_cache=cache)
+    service.set_domain("s1", domain)
+    return service
+
+
+def test_normalize_message():
+    assert normalize_message("  PLEASE add to   cart!!! ") == "please add to cart"
+    assert normalize_message("What's in stock?") == "what's in stock"
+
+
+def test_repeated_message_skips_llm(openai_client):
+    client = openai_client()
+    cache = RoutingCache(similarity_threshold=2.0, audit_rate=0.0)
+    service = service_in_domain(client, cache)
+
+    first = service.classify_intent("Add to cart", "s1")
+    service.set_domain("s1", "interior_designer")
+    second = service.classify_intent("add to cart!", "s1")
+
+    assert len(client.calls) == 1
+    assert first["domain"] == second["domain"] == "cart_manager"
+    assert service.get_current_domain("s1") == "cart_manager"
+    stats = service.stats()
+    assert (stats["llm"], stats["cache"]) == (1, 1)
+    assert stats["routing_cache"]["exact_hits"] == 1
+
+
+def test_key_includes_current_domain(openai_client):
+    client = openai_client()
+    service = service_in_domain(client, RoutingCache(similarity_threshold=2.0, audit_rate=0.0))
+
+    service.classify_intent("checkout", "s1")
+    service.set_domain("s1", "inventory_agent")
+    service.classify_intent("checkout", "s1")
+
+    assert len(client.calls) == 2
+
+
+def test_low_confidence_decisions_are_not_cached(openai_client):
+    client = openai_client(confidence=0.5)
+    cache = RoutingCache(min_confidence=0.8, audit_rate=0.0)
+    service = service_in_domain(client, cache)
+
+    service.classify_intent("maybe this one", "s1")
+    service.set_domain("s1", "interior_designer")
+    service.classify_intent("maybe this one", "s1")
+
+    assert len(client.calls) == 2
+    assert cache.stats()["skipped_low_confidence"] == 2
+
+
+def test_paraphrase_hits_similarity_tier():
+    cache = RoutingCache(similarity_threshold=0.85, audit_rate=0.0)
+    intent = {"domain": "cart_manager", "is_domain_change": True, "confidence": 0.95, "reasoning": "llm"}
+    cache.store("interior_designer", "add this to my cart", intent)
+
+    def confirm(domain):
+        return True
+
+    assert cache.lookup("interior_designer", "please add this to my cart", confirm)["domain"] == "cart_manager"
+    assert cache.lookup("cora", "please add this to my cart", confirm) is None
+    assert cache.lookup("interior_designer", "remove this from my cart", confirm) is None
+    assert cache.lookup("interior_designer", "please add this to my cart") is None
+    assert cache.stats()["similar_hits"] == 1
+
+
+def test_paraphrase_hit_needs_local_classifier_agreement(openai_client):
+    client = openai_client(domain="interior_designer")
+    cache = RoutingCache(similarity_threshold=0.85, audit_rate=0.0)
+    service = HandoffService(
+        client, "gpt", local_classifier=LocalIntentClassifier.from_jsonl(),
+        local_confidence_threshold=2.0, routing_cache=cache,
+    )
+    service.set_domain("s1", "cora")
+    service.classify_intent("show me paint for my bedroom walls", "s1")
+
+    # Close in hashed words, but the rules see a stock question as well
+    service.set_domain("s1", "cora")
+    client.domain = "inventory_agent"
+    result = service.classify_intent("show me paint in stock for my bedroom walls", "s1")
+    assert result["domain"] == "inventory_agent"
+
+    service.set_domain("s1", "cora")
+    result = service.classify_intent("show me paint for my bedroom", "s1")
+    assert result["domain"] == "interior_designer"
+    assert len(client.calls) == 2
+    stats = cache.stats()
+    assert (stats["similar_hits"], stats["similar_unconfirmed"]) == (1, 1)
+
+
+def test_entries_expire_and_are_bounded():
+    intent = {"domain": "cart_manager", "is_domain_change": True, "confidence": 0.95, "reasoning": "llm"}
+    cache = RoutingCache(max_entries=2, ttl_seconds=0.05, similarity_threshold=2.0)
+    cache.store("cora", "a", intent)
+    cache.store("cora", "b", intent)
+    cache.store("cora", "c", intent)
+    assert cache.lookup("cora", "a") is None
+    assert cache.lookup("cora", "c") is not None
+
+    time.sleep(0.06)
+    assert cache.lookup("cora", "c") is None
+    assert cache.lookup("cora", "b") is None
+
+
+def test_similarity_index_is_bounded():
+    intent = {"domain": "cart_manager", "is_domain_change": True, "confidence": 0.95, "reasoning": "llm"}
+    cache = RoutingCache(similarity_entries=2)
+    for message in ("first message", "second message", "third message", "second message"):
+        cache.store("cora", message, intent)
+
+    assert cache._vector_keys == [("cora", "third message"), ("cora", "second message")]
+    assert set(cache._slots) == {("cora", "third message"), ("cora", "second message")}
+
+
+def test_audit_disagreement_replaces_entry_and_reports_drift(openai_client):
+    client = openai_client(domain="cart_manager")
+    cache = RoutingCache(similarity_threshold=2.0, audit_rate=1.0)
+    service = service_in_domain(client, cache)
+    service.classify_intent("checkout", "s1")
+
+    client.domain = "inventory_agent"
+    service.set_domain("s1", "interior_designer")
+    result = service.classify_intent("checkout", "s1")
+
+    assert result["domain"] == "inventory_agent"
+    assert len(client.calls) == 2
+    assert cache.lookup("interior_designer", "checkout")["domain"] == "inventory_agent"
+    stats = cache.stats()
+    assert (stats["audits"], stats["audit_agreement"]) == (1, 0.0)
+
+
+def test_async_classification_uses_cache(openai_client):
+    client = openai_client()
+    service = service_in_domain(client, RoutingCache(audit_rate=0.0))
+
+    async def classify_twice():
+        await service.classify_intent_async("checkout", "s1")
+        service.set_domain("s1", "interior_designer")
+        return await service.classify_intent_async("checkout", "s1")
+
+    result = asyncio.run(classify_twice())
+
+    assert result["reasoning"].startswith("Cached classification")
+    assert len(client.calls) == 1
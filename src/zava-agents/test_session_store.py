@@ -0,0 +1,95 @@
+import threading
+
+import pytest
+
+from services.session_store import (
+    InMemorySessionStore,
+    RedisSessionStore,
+    SessionConflictError,
+    SessionState,
+)
+
+
+def make_stores():
+    stores = [InMemorySessionStore(ttl_seconds=60)]
+    try:
+        import fakeredis
+
+        # Local stand-in for a Redis server (requirements-test.txt)
+        stores.append(RedisSessionStore(fakeredis.FakeRedis(), ttl_seconds=60))
+    except ImportError:
+        pass
+    return stores
+
+
+@pytest.fixture(params=make_stores(), ids=lambda store: type(store).__name__)
+def store(request):
+    return request.param
+
+
+def test_state_round_trip_is_compact():
+    state = SessionState(domain="cart_manager", cart=[{"id": "PROD0001"}], version=3)
+    data = state.to_bytes()
+    assert SessionState.from_bytes(data) == state
+    # Empty fields are not serialized
+    assert SessionState().to_bytes() == b'{"v":0}'
+
+
+def test_new_session_starts_empty(store):
+    state = store.load("missing")
+    assert state.version == 0
+    assert state.cart == []
+
+
+def test_save_and_load(store):
+    state = store.load("s1")
+    state.cart = [{"id": "PROD0001"}]
+    state.domain = "cora"
+    saved = store.save("s1", state)
+    assert saved.version == 1
+
+    loaded = store.load("s1")
+    assert loaded.cart == [{"id": "PROD0001"}]
+    assert loaded.domain == "cora"
+    assert loaded.version == 1
+
+
+def test_stale_save_raises_conflict(store):
+    first = store.load("s2")
+    second = store.load("s2")
+    store.save("s2", first)
+    with pytest.raises(SessionConflictError):
+        store.save("s2", second)
+
+
+def test_update_retries_on_conflict(store):
+    def append(value):
+        def mutate(state):
+            state.raw_io_history = state.raw_io_history + [value]
+        return mutate
+
+    threads = [
+        threading.Thread(target=store.update, args=("s3", append(i)), kwargs={"max_retries": 50})
+        for i in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    state = store.load("s3")
+    assert sorted(state.raw_io_history) == list(range(10))
+    assert state.version == 10
+
+
+def test_delete(store):
+    store.save("s4", store.load("s4"))
+    store.delete("s4")
+    assert store.load("s4").version == 0
+
+
+def test_in_memory_ttl_expiry():
+    store = InMemorySessionStore(ttl_seconds=0)
+    store.save("s5", SessionState(cart=[1]))
+    assert store.load("s5").cart == []
+    assert len(store) == 0
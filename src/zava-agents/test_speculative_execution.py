@@ -0,0 +1,174 @@
+import asyncio
+
+import pytest
+
+from services.speculative_execution import SpeculativeExecutor
+
+REPLY = '{"answer": "We have 4 in stock."}'
+
+
+class FakeAgent:
+    """Agent run that streams REPLY in chunks with a delay per chunk."""
+
+    def __init__(self, chunk_delay=0.01, prompt="inventory prompt"):
+        self.chunk_delay = chunk_delay
+        self.prompt = prompt
+        self.cancelled = False
+        self.runs = 0
+
+    async def prepare(self):
+        return self.prompt
+
+    async def execute(self, prompt, on_delta):
+        self.runs += 1
+        try:
+            for start in range(0, len(REPLY), 8):
+                await asyncio.sleep(self.chunk_delay)
+                await on_delta(REPLY[start:start + 8])
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return REPLY
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_commit_flushes_buffered_deltas_and_saves_classification_time():
+    executor = SpeculativeExecutor(domains=["inventory_agent"])
+    agent = FakeAgent()
+    received = []
+
+    async def forward(delta):
+        received.append(delta)
+
+    async def turn():
+        assert executor.should_speculate("inventory_agent")
+        speculation = executor.start("inventory_agent", agent.prepare, agent.execute)
+        await asyncio.sleep(0.03)  # classification
+        return await executor.resolve(speculation, "inventory_agent", False, forward)
+
+    assert run(turn()) == REPLY
+    assert "".join(received) == REPLY
+    stats = executor.stats()
+    assert (stats["committed"], stats["cancelled"], stats["wasted_tokens"]) == (1, 0, 0)
+    assert stats["saved_ms"] >= 25
+    assert stats["per_domain"]["inventory_agent"]["committed"] == 1
+
+
+def test_domain_change_cancels_the_run_and_counts_wasted_tokens():
+    executor = SpeculativeExecutor(domains=["inventory_agent"])
+    agent = FakeAgent(chunk_delay=0.05)
+    received = []
+
+    async def forward(delta):
+        received.append(delta)
+
+    async def turn():
+        speculation = executor.start("inventory_agent", agent.prepare, agent.execute)
+        await asyncio.sleep(0.12)
+        return await executor.resolve(speculation, "cart_manager", True, forward)
+
+    assert run(turn()) is None
+    assert agent.cancelled
+    assert received == []
+    stats = executor.stats()
+    assert stats["cancelled"] == 1
+    assert stats["wasted_tokens"] == (len("inventory prompt") + 16) // 4
+    assert stats["in_flight"] == 0
+
+
+def test_only_enabled_domains_speculate():
+    executor = SpeculativeExecutor(domains=" inventory_agent, cora ".split(","))
+    assert executor.should_speculate("cora")
+    assert not executor.should_speculate("cart_manager")
+    assert not executor.should_speculate(None)
+    assert not SpeculativeExecutor().should_speculate("cora")
+
+
+def test_in_flight_cap():
+    executor = SpeculativeExecutor(domains=["cora"], max_in_flight=1)
+
+    async def turn():
+        speculation = executor.start("cora", FakeAgent().prepare, FakeAgent().execute)
+        assert not executor.should_speculate("cora")
+        await executor.cancel(speculation)
+        assert executor.should_speculate("cora")
+
+    run(turn())
+    assert executor.stats()["not_started"] == 1
+
+
+def test_waste_budget_pauses_speculation():
+    executor = SpeculativeExecutor(domains=["cora"], waste_budget_tokens=10)
+    agent = FakeAgent(chunk_delay=0.0, prompt="x" * 80)
+
+    async def turn():
+        speculation = executor.start("cora", agent.prepare, agent.execute)
+        await asyncio.sleep(0.01)
+        await executor.resolve(speculation, "interior_designer", True, None)
+
+    run(turn())
+    assert not executor.should_speculate("cora")
+    assert executor.stats()["waste_budget_remaining"] == 0
+
+
+def test_large_prompts_are_not_sent_speculatively():
+    executor = SpeculativeExecutor(domains=["cart_manager"], max_prompt_chars=100)
+    agent = FakeAgent(prompt="RAW_IO_HISTORY" * 20)
+
+    async def turn():
+        speculation = executor.start("cart_manager", agent.prepare, agent.execute)
+        return await executor.resolve(speculation, "cart_manager", False, None)
+
+    assert run(turn()) is None
+    assert agent.runs == 0
+    stats = executor.stats()
+    assert (stats["skipped"], stats["wasted_tokens"]) == (1, 0)
+
+
+def test_failed_forward_cancels_the_run():
+    executor = SpeculativeExecutor(domains=["cora"])
+    agent = FakeAgent(chunk_delay=0.01)
+
+    async def forward(delta):
+        raise ConnectionError("websocket closed")
+
+    async def turn():
+        speculation = executor.start("cora", agent.prepare, agent.execute)
+        await asyncio.sleep(0.03)
+        await executor.resolve(speculation, "cora", False, forward)
+
+    with pytest.raises(ConnectionError):
+        run(turn())
+    assert agent.cancelled
+
+
+def test_run_failing_after_commit_is_reported_not_rerun():
+    executor = SpeculativeExecutor(domains=["inventory_agent"])
+    received = []
+
+    async def forward(delta):
+        received.append(delta)
+
+    async def failing_after_output(prompt, on_delta):
+        await on_delta('{"answer": "We ha')
+        await asyncio.sleep(0.02)
+        raise RuntimeError("stream reset")
+
+    async def failing_before_output(prompt, on_delta):
+        raise RuntimeError("connect timeout")
+
+    async def turn(execute):
+        speculation = executor.start("inventory_agent", FakeAgent().prepare, execute)
+        await asyncio.sleep(0.01)
+        return await executor.resolve(speculation, "inventory_agent", False, forward)
+
+    with pytest.raises(RuntimeError, match="stream reset"):
+        run(turn(failing_after_output))
+    assert received == ['{"answer": "We ha']
+
+    # Nothing was forwarded: the caller may run the agent again
+    assert run(turn(failing_before_output)) is None
+    assert executor.stats()["cancelled"] == 2
@@ -0,0 +1,187 @@
+import asyncio
+from io import BytesIO
+
+import pytest
+
+from utils import storage_utils
+from utils.storage_utils import (
+    AsyncStorageManager,
+    StorageManager,
+    close_async_storage_managers,
+    get_async_storage_manager,
+    get_storage_manager,
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_managers():
+    storage_utils.reset_storage_managers()
+    yield
+    storage_utils.reset_storage_managers()
+
+
+def test_manager_round_trip(blob_server):
+    manager = StorageManager(connection_string=blob_server.connection_string, container_name="zava")
+
+    url = manager.upload_blob("room.png", BytesIO(b"png-bytes"), "image/png")
+
+    assert url == f"{blob_server.account_url}/zava/room.png"
+    assert blob_server.blobs[("zava", "room.png")]["content_type"] == "image/png"
+    assert manager.download_blob("room.png") == b"png-bytes"
+    assert manager.list_blobs() == ["room.png"]
+    assert manager.delete_blob("room.png")
+    assert manager.list_blobs() == []
+
+
+def test_upload_if_absent_keeps_existing_blob(blob_server):
+    manager = StorageManager(connection_string=blob_server.connection_string, container_name="zava")
+
+    first = manager.upload_blob_if_absent("image_abc.png", BytesIO(b"one"), "image/png")
+    second = manager.upload_blob_if_absent("image_abc.png", BytesIO(b"two"), "image/png")
+
+    assert first == second
+    assert blob_server.blobs[("zava", "image_abc.png")]["data"] == b"one"
+
+
+def test_get_storage_manager_is_cached_and_shares_connections(blob_server, monkeypatch):
+    monkeypatch.delenv("storage_account_name", raising=False)
+    monkeypatch.setenv("blob_connection_string", blob_server.connection_string)
+
+    manager = get_storage_manager("zava")
+    assert get_storage_manager("zava") is manager
+    other = get_storage_manager("other")
+    assert other is not manager
+
+    for i in range(5):
+        manager.upload_blob(f"a{i}.png", BytesIO(b"x"))
+        other.upload_blob(f"b{i}.png", BytesIO(b"y"))
+
+    # Both managers go through the shared pooled transport: one keep-alive connection
+    assert blob_server.connections == 1
+
+
+def test_credential_is_created_once(monkeypatch):
+    created = []
+
+    class CountingCredential:
+        def __init__(self):
+            created.append(self)
+
+        def get_token(self, *scopes, **kwargs):
+            raise AssertionError("no request is made")
+
+    monkeypatch.setattr(storage_utils, "DefaultAzureCredential", CountingCredential)
+    monkeypatch.setenv("storage_account_name", "zavastorage")
+
+    first = get_storage_manager("zava")
+    get_storage_manager("zava")
+    second = get_storage_manager("other")
+
+    assert len(created) == 1
+    assert first.get_blob_url("x.png") == "https://zavastorage.blob.core.windows.net/zava/x.png"
+    assert second.blob_service_client.credential is created[0]
+
+
+def test_async_manager_round_trip(blob_server):
+    async def run():
+        manager = AsyncStorageManager(connection_string=blob_server.connection_string, container_name="zava")
+        try:
+            await manager.upload_blob_if_absent("room.png", b"one", "image/png")
+            await manager.upload_blob_if_absent("room.png", b"two", "image/png")
+            data = await manager.download_blob("room.png")
+            names = await manager.list_blobs()
+            await manager.delete_blob("room.png")
+            return data, names, await manager.list_blobs()
+        finally:
+            await manager.close()
+
+    data, names, remaining = asyncio.run(run())
+
+    assert data == b"one"
+    assert names == ["room.png"]
+    assert remaining == []
+
+
+def chunked_manager(server, **kwargs):
+    return StorageManager(
+        connection_string=server.connection_string,
+        container_name="zava",
+        chunk_size=64 * 1024,
+        single_transfer_size=128 * 1024,
+        **kwargs,
+    )
+
+
+def test_large_upload_uses_parallel_blocks(blob_server):
+    blob_server.latency = 0.02
+    payload = bytes(range(256)) * 4096  # 1 MiB
+    manager = chunked_manager(blob_server, max_concurrency=4)
+
+    manager.upload_blob("large.bin", BytesIO(payload))
+
+    assert blob_server.blobs[("zava", "large.bin")]["data"] == payload
+    assert blob_server.count("PUT", "comp=block&") == 16
+    assert blob_server.count("PUT", "comp=blocklist") == 1
+    assert blob_server.max_in_flight > 1
+
+
+def test_download_streams_into_file_stream_and_buffer(blob_server, tmp_path):
+    payload = bytes(range(256)) * 4096
+    manager = chunked_manager(blob_server, max_concurrency=4)
+    manager.upload_blob("large.bin", payload)
+
+    path = tmp_path / "large.bin"
+    assert manager.download_blob_to("large.bin", path) == len(payload)
+    assert path.read_bytes() == payload
+    assert list(tmp_path.iterdir()) == [path]  # no partial file left behind
+
+    stream = BytesIO()
+    manager.download_blob_to("large.bin", stream)
+    assert stream.getvalue() == payload
+
+    buffer = bytearray(len(payload) + 10)
+    manager.download_blob_to("large.bin", buffer)
+    assert buffer[: len(payload)] == payload
+
+    assert manager.download_blob("large.bin", max_concurrency=2) == payload
+    # First range up to the single-transfer size, the rest in chunk-sized ranges
+    assert blob_server.count("GET") >= 4 * (1 + (len(payload) - 128 * 1024) // (64 * 1024))
+
+    with pytest.raises(ValueError):
+        manager.download_blob_to("large.bin", bytearray(10))
+
+
+def test_iter_blobs_pages_lazily(blob_server):
+    manager = chunked_manager(blob_server)
+    for i in range(5):
+        manager.upload_blob(f"image_{i}.png", b"x")
+    manager.upload_blob("other.txt", b"y")
+
+    blobs = manager.iter_blobs(name_starts_with="image_", page_size=2)
+    first = next(blobs)
+    assert first.name == "image_0.png" and first.size == 1
+    assert blob_server.count("GET", "comp=list") == 1
+
+    assert [blob.name for blob in blobs] == [f"image_{i}.png" for i in range(1, 5)]
+    assert blob_server.count("GET", "comp=list") == 3
+    assert manager.list_blobs("image_") == [f"image_{i}.png" for i in range(5)]
+
+
+def test_async_managers_belong_to_their_event_loop(blob_server, monkeypatch):
+    monkeypatch.delenv("storage_account_name", raising=False)
+    monkeypatch.setenv("blob_connection_string", blob_server.connection_string)
+
+    async def get_twice():
+        manager = get_async_storage_manager("zava")
+        assert get_async_storage_manager("zava") is manager
+        return manager
+
+    # The first loop closes without close_async_storage_managers
+    abandoned = asyncio.run(get_twice())
+
+    async def on_a_new_loop():
+        manager = await get_twice()
+        await close_async_storage_managers()
+        return manager
+
+    assert asyncio.run(on_a_new_loop()) is not abandoned
@@ -0,0 +1,79 @@
+from utils.stream_utils import AgentResponseStreamParser
+
+STREAMED_REPLY = '''Here is what I found:
+```json
+[
+  {
+    "answer": "Try \\"Frosted Blue\\" \\u2014 it's calm.\\nWant a sample?",
+    "image_output": "",
+    "discount_percentage": 10,
+    "products": [
+      {"id": "PROD0022", "name": "Frosted Blue [matte]", "price": "$48.99"}
+    ],
+    "cart": []
+  }
+]
+```'''
+
+
+def feed_in_chunks(parser, text, chunk_size):
+    events = []
+    for i in range(0, len(text), chunk_size):
+        events.extend(parser.feed(text[i:i + chunk_size]))
+    return events
+
+
+def test_answer_streams_progressively():
+    parser = AgentResponseStreamParser()
+    events = feed_in_chunks(parser, STREAMED_REPLY, 3)
+
+    deltas = [e.value for e in events if e.kind == "answer_delta"]
+    assert len(deltas) > 1
+    assert "".join(deltas) == "Try \"Frosted Blue\" — it's calm.\nWant a sample?"
+    assert parser.answer == "".join(deltas)
+
+
+def test_fields_are_returned_when_closed():
+    for chunk_size in (1, 2, 7, 64, len(STREAMED_REPLY)):
+        parser = AgentResponseStreamParser()
+        events = feed_in_chunks(parser, STREAMED_REPLY, chunk_size)
+
+        fields = {e.name: e.value for e in events if e.kind == "field"}
+        assert fields["products"][0]["name"] == "Frosted Blue [matte]"
+        assert fields["cart"] == []
+        assert fields["discount_percentage"] == 10
+        assert events[-1].kind == "complete"
+        assert parser.done
+
+
+def test_products_arrive_before_reply_ends():
+    parser = AgentResponseStreamParser()
+    cut = STREAMED_REPLY.index('"cart"')
+    events = parser.feed(STREAMED_REPLY[:cut])
+    assert any(e.kind == "field" and e.name == "products" for e in events)
+    assert not parser.done
+
+
+def test_split_surrogate_pair_is_held_back():
+    parser = AgentResponseStreamParser()
+    text = '{"answer": "paint \\ud83c\\udfa8 day"}'
+    split = text.index("\\udfa8")
+    first = parser.feed(text[:split])
+    second = parser.feed(text[split:])
+    deltas = [e.value for e in first + second if e.kind == "answer_delta"]
+    assert "".join(deltas) == "paint \U0001F3A8 day"
+
+
+def test_plain_text_reply_has_no_events():
+    parser = AgentResponseStreamParser()
+    assert feed_in_chunks(parser, "Sorry (see [1]) I can't help.", 4) == []
+    assert not parser.started
+
+
+if __name__ == "__main__":
+    test_answer_streams_progressively()
+    test_fields_are_returned_when_closed()
+    test_products_arrive_before_reply_ends()
+    test_split_surrogate_pair_is_held_back()
+    test_plain_text_reply_has_no_events()
+    print("All stream parsing tests passed.")
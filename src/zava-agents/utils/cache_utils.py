@@ -0,0 +1,149 @@
+"""
+In-process caching helpers: a thread-safe LRU cache with optional TTL and
+size bound, and hit/miss statistics.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by entry count and/or total size, with optional TTL.
+
+    Args:
+        max_entries: Maximum number of entries (None for unbounded)
+        max_bytes: Maximum total size as measured by ``sizeof`` (None for unbounded)
+        ttl_seconds: Entry lifetime in seconds (None for no expiry)
+        sizeof: Function returning the size of a value; defaults to 1 per entry
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._sizeof = sizeof or (lambda value: 1)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, size, expires_at)
+        self._total_size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value (marking it most recently used), or ``default``."""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            if entry[2] is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value without updating LRU order or statistics."""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING or (entry[2] is not None and entry[2] <= time.monotonic()):
+                return default
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Insert or replace a value, evicting least recently used entries as needed."""
+        size = self._sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # Larger than the whole cache
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self._total_size += size
+            while (self.max_entries is not None and len(self._entries) > self.max_entries) or (
+                self.max_bytes is not None and self._total_size > self.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def touch(self, key: Hashable) -> bool:
+        """Renew an entry's TTL and mark it most recently used; returns whether it was present."""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING or (entry[2] is not None and entry[2] <= time.monotonic()):
+                return False
+            if self.ttl_seconds is not None:
+                self._entries[key] = (entry[0], entry[1], time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            return True
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove an entry and return its value, or ``default``."""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            self._remove(key)
+            return entry[0]
+
+    def purge_expired(self) -> int:
+        """Drop expired entries; returns how many were removed."""
+        if self.ttl_seconds is None:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, entry in self._entries.items() if entry[2] <= now]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+            return len(expired)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_size = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            return entry is not _MISSING and (entry[2] is None or entry[2] > time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_size(self) -> int:
+        return self._total_size
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size": self._total_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        value, size, _ = self._entries.pop(key)
+        self._total_size -= size
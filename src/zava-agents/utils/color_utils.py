@@ -0,0 +1,294 @@
+"""
+Color conversion and difference helpers (NumPy, vectorized).
+
+Colors are compared in CIE Lab (D65), where Euclidean-ish distances track
+perceived differences far better than RGB. ``delta_e`` implements CIEDE2000
+and broadcasts, so one call ranks a batch of query colors against a whole
+palette.
+"""
+import re
+from typing import Iterable, Tuple, Union
+
+import numpy as np
+
+HEX_COLOR_PATTERN = re.compile(r"#(?:[0-9a-fA-F]{6}|[0-9a-fA-F]{3})\b")
+
+# sRGB (D65) -> XYZ
+_RGB_TO_XYZ = np.array(
+    [
+        [0.4124564, 0.3575761, 0.1804375],
+        [0.2126729, 0.7151522, 0.0721750],
+        [0.0193339, 0.1191920, 0.9503041],
+    ]
+)
+_D65_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+# Reference colors for common color words, used to place free-text colors in Lab.
+# Modifiers such as "light" or "dark" are handled by the caller.
+COMMON_COLORS = {
+    "red": "#c62828",
+    "crimson": "#b0182d",
+    "burgundy": "#7b2235",
+    "maroon": "#7b1e1e",
+    "pink": "#e8b4bc",
+    "blush": "#e8c3b9",
+    "rose": "#c98a8a",
+    "coral": "#e0765a",
+    "orange": "#e8792b",
+    "peach": "#f2c3a0",
+    "terracotta": "#c0654a",
+    "rust": "#a4502c",
+    "brown": "#7a5a45",
+    "tan": "#c9ad8b",
+    "beige": "#d8cbb3",
+    "cream": "#efe6cf",
+    "ivory": "#f3efe0",
+    "yellow": "#f2d43c",
+    "lemon": "#efe58a",
+    "gold": "#cfa64a",
+    "mustard": "#c9a12c",
+    "green": "#4f8a4b",
+    "olive": "#7d7b45",
+    "sage": "#a7b6a0",
+    "mint": "#b5dcc3",
+    "jade": "#4f8f6e",
+    "emerald": "#2e7d5b",
+    "teal": "#2f7f7f",
+    "turquoise": "#3fb9b0",
+    "aqua": "#7fd3d3",
+    "blue": "#4a78b5",
+    "navy": "#1f2f55",
+    "sky": "#a7c7e7",
+    "indigo": "#3f3f8f",
+    "purple": "#7b4f9e",
+    "violet": "#8a6fc1",
+    "lavender": "#c3b5d6",
+    "lilac": "#c9b6d9",
+    "mauve": "#a98ca5",
+    "gray": "#8f9193",
+    "grey": "#8f9193",
+    "charcoal": "#4a4c4e",
+    "silver": "#c0c2c4",
+    "white": "#f7f7f5",
+    "black": "#1c1c1c",
+}
+
+# Words that push a color far outside a muted, interior-paint palette
+# ("bright" is not one: "bright white" is an ordinary paint request)
+VIVID_MODIFIERS = ("neon", "fluorescent", "electric", "hot", "vivid", "day-glo", "dayglo")
+
+
+def hex_to_rgb(hex_code: str) -> Tuple[int, int, int]:
+    """Parse #rgb or #rrggbb into an (r, g, b) tuple of 0-255 ints."""
+    value = hex_code.lstrip("#")
+    if len(value) == 3:
+        value = "".join(ch * 2 for ch in value)
+    if len(value) != 6:
+        raise ValueError(f"Invalid hex color: {hex_code!r}")
+    return int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16)
+
+
+def rgb_to_hex(rgb: Iterable[float]) -> str:
+    r, g, b = (int(round(min(255, max(0, c)))) for c in rgb)
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def rgb_to_lab(rgb: Union[np.ndarray, Iterable]) -> np.ndarray:
+    """
+    Convert sRGB (0-255) to CIE Lab.
+
+    Args:
+        rgb: Array-like of shape (..., 3)
+
+    Returns:
+        float64 array of shape (..., 3) with L, a, b
+    """
+    srgb = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(srgb <= 0.04045, srgb / 12.92, ((srgb + 0.055) / 1.055) ** 2.4)
+    xyz = (linear @ _RGB_TO_XYZ.T) / _D65_WHITE
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    lab = np.empty_like(f)
+    lab[..., 0] = 116 * f[..., 1] - 16
+    lab[..., 1] = 500 * (f[..., 0] - f[..., 1])
+    lab[..., 2] = 200 * (f[..., 1] - f[..., 2])
+    return lab
+
+
+def hex_to_lab(hex_codes: Union[str, Iterable[str]]) -> np.ndarray:
+    """Lab coordinates of one hex code (shape (3,)) or a sequence of them (shape (n, 3))."""
+    if isinstance(hex_codes, str):
+        return rgb_to_lab(hex_to_rgb(hex_codes))
+    return rgb_to_lab([hex_to_rgb(code) for code in hex_codes])
+
+
+def delta_e(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    """
+    CIEDE2000 color difference, broadcasting over leading dimensions.
+
+    ``delta_e(queries[:, None, :], palette[None, :, :])`` gives the full
+    (n_queries, n_palette) distance matrix in one call.
+    """
+    lab1 = np.asarray(lab1, dtype=np.float64)
+    lab2 = np.asarray(lab2, dtype=np.float64)
+    L1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    L2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+
+    c_mean = (np.hypot(a1, b1) + np.hypot(a2, b2)) / 2
+    g = 0.5 * (1 - np.sqrt(c_mean**7 / (c_mean**7 + 25.0**7)))
+    a1p, a2p = (1 + g) * a1, (1 + g) * a2
+    c1p, c2p = np.hypot(a1p, b1), np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+
+    dLp = L2 - L1
+    dCp = c2p - c1p
+    dhp = h2p - h1p
+    dhp = np.where(dhp > 180, dhp - 360, np.where(dhp < -180, dhp + 360, dhp))
+    dhp = np.where(c1p * c2p == 0, 0, dhp)
+    dHp = 2 * np.sqrt(c1p * c2p) * np.sin(np.radians(dhp) / 2)
+
+    Lp_mean = (L1 + L2) / 2
+    Cp_mean = (c1p + c2p) / 2
+    h_sum = h1p + h2p
+    hp_mean = np.where(
+        c1p * c2p == 0,
+        h_sum,
+        np.where(
+            np.abs(h1p - h2p) <= 180,
+            h_sum / 2,
+            np.where(h_sum < 360, (h_sum + 360) / 2, (h_sum - 360) / 2),
+        ),
+    )
+
+    t = (
+        1
+        - 0.17 * np.cos(np.radians(hp_mean - 30))
+        + 0.24 * np.cos(np.radians(2 * hp_mean))
+        + 0.32 * np.cos(np.radians(3 * hp_mean + 6))
+        - 0.20 * np.cos(np.radians(4 * hp_mean - 63))
+    )
+    d_theta = 30 * np.exp(-(((hp_mean - 275) / 25) ** 2))
+    r_c = 2 * np.sqrt(Cp_mean**7 / (Cp_mean**7 + 25.0**7))
+    s_l = 1 + 0.015 * (Lp_mean - 50) ** 2 / np.sqrt(20 + (Lp_mean - 50) ** 2)
+    s_c = 1 + 0.045 * Cp_mean
+    s_h = 1 + 0.015 * Cp_mean * t
+    r_t = -np.sin(np.radians(2 * d_theta)) * r_c
+
+    return np.sqrt(
+        (dLp / s_l) ** 2
+        + (dCp / s_c) ** 2
+        + (dHp / s_h) ** 2
+        + r_t * (dCp / s_c) * (dHp / s_h)
+    )
+
+
+def kmeans_colors(
+    lab_pixels: np.ndarray,
+    k: int = 5,
+    iterations: int = 12,
+    seed: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Dominant colors of a set of Lab pixels by vectorized k-means.
+
+    Uses k-means++ seeding with a fixed seed (deterministic results) and
+    squared Euclidean distance in Lab, which is fast and close enough to
+    perceptual distance for clustering.
+
+    Args:
+        lab_pixels: Array of shape (n, 3)
+        k: Number of clusters
+        iterations: Maximum Lloyd iterations
+
+    Returns:
+        (centers, weights): (k', 3) Lab centers and their pixel shares, sorted
+        by share, largest first. k' < k if there are fewer distinct colors.
+    """
+    pixels = np.asarray(lab_pixels, dtype=np.float64).reshape(-1, 3)
+    k = min(k, len(np.unique(pixels.round(1), axis=0)))
+    rng = np.random.default_rng(seed)
+
+    centers = np.empty((k, 3))
+    centers[0] = pixels[rng.integers(len(pixels))]
+    closest = ((pixels - centers[0]) ** 2).sum(axis=1)
+    for i in range(1, k):
+        centers[i] = pixels[rng.choice(len(pixels), p=closest / closest.sum())]
+        closest = np.minimum(closest, ((pixels - centers[i]) ** 2).sum(axis=1))
+
+    for _ in range(iterations):
+        distances = ((pixels[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, pixels)
+        new_centers = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers)
+        if np.allclose(new_centers, centers, atol=0.05):
+            break
+        centers = new_centers
+
+    weights = np.bincount(labels, minlength=k) / len(pixels)
+    order = np.argsort(-weights)
+    return centers[order], weights[order]
+
+
+def lab_to_rgb(lab: np.ndarray) -> np.ndarray:
+    """Convert CIE Lab back to sRGB (0-255, clipped), shape (..., 3)."""
+    lab = np.asarray(lab, dtype=np.float64)
+    fy = (lab[..., 0] + 16) / 116
+    f = np.stack([fy + lab[..., 1] / 500, fy, fy - lab[..., 2] / 200], axis=-1)
+    xyz = np.where(f > 6 / 29, f**3, 3 * (6 / 29) ** 2 * (f - 4 / 29)) * _D65_WHITE
+    linear = xyz @ np.linalg.inv(_RGB_TO_XYZ).T
+    linear = np.clip(linear, 0, 1)
+    srgb = np.where(linear <= 0.0031308, 12.92 * linear, 1.055 * linear ** (1 / 2.4) - 0.055)
+    return np.clip(srgb * 255, 0, 255)
+
+
+class ColorIndex:
+    """
+    Nearest-color search over a fixed set of named colors.
+
+    Lab coordinates are computed once into an (n, 3) array; queries are
+    answered in batches with one broadcast CIEDE2000 computation.
+
+    Args:
+        entries: Dicts with at least a "hex" key; returned (copied) with matches
+    """
+
+    def __init__(self, entries: Iterable[dict]):
+        self.entries = [dict(entry) for entry in entries]
+        self.lab = hex_to_lab([entry["hex"] for entry in self.entries]).reshape(-1, 3)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def distances(self, query_lab: np.ndarray) -> np.ndarray:
+        """Delta-E matrix of shape (n_queries, n_entries)."""
+        query_lab = np.asarray(query_lab, dtype=np.float64).reshape(-1, 3)
+        return delta_e(query_lab[:, None, :], self.lab[None, :, :])
+
+    def nearest_lab(self, query_lab: np.ndarray, k: int = 3, max_delta_e: float = None) -> list:
+        """
+        k nearest entries for each Lab query, closest first.
+
+        Returns:
+            One list per query of entry dicts with an added "delta_e"
+        """
+        distances = self.distances(query_lab)
+        k = min(k, len(self.entries))
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(distances, nearest, axis=1).argsort(axis=1)
+        nearest = np.take_along_axis(nearest, order, axis=1)
+
+        results = []
+        for row, indices in zip(distances, nearest):
+            matches = []
+            for i in indices:
+                if max_delta_e is not None and row[i] > max_delta_e:
+                    break
+                matches.append({**self.entries[i], "delta_e": round(float(row[i]), 2)})
+            results.append(matches)
+        return results
+
+    def nearest(self, hex_codes: Iterable[str], k: int = 3, max_delta_e: float = None) -> list:
+        """k nearest entries for each hex code (see nearest_lab)."""
+        return self.nearest_lab(hex_to_lab(list(hex_codes)), k, max_delta_e)
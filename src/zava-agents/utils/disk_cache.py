@@ -0,0 +1,379 @@
+"""
+Read-through local disk cache for image URL and blob fetches.
+
+Source photos for edits and previously generated images are fetched again on
+every use. DiskCache keeps their bytes on local disk, so a hot image is read
+from disk instead of the network:
+
+- objects/<sha256>: content files, one per distinct content, so different
+  URLs with the same bytes share storage
+- keys/<sha256 of key>.json: per-URL entry (content hash, ETag,
+  Last-Modified, when it was last validated)
+
+Entries are served without any request for DISK_CACHE_FRESH_SECONDS. After
+that they are revalidated with a conditional request (If-None-Match /
+If-Modified-Since); a 304 renews the entry without a download. If
+revalidation fails the stale copy is served. The total size of the objects is
+bounded, and the least recently used ones are evicted. File modification
+times record recency, so the LRU order survives restarts.
+
+Worker processes may share the directory: the bound is enforced from the
+directory itself (objects/ is rescanned whenever a new object is stored), so
+all workers together stay under DISK_CACHE_MAX_BYTES and none counts files
+another one already evicted. Whenever objects are evicted, the entries in
+keys/ that point at no object any more are deleted too, so one-off URLs (a
+new SAS query string each time) do not pile up.
+
+Every file is written to tmp/ and renamed into place, so readers (including
+other worker processes sharing the directory) never see a partial file.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+import orjson
+import requests
+
+logger = logging.getLogger(__name__)
+
+DISK_CACHE_DIR = os.getenv("DISK_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "zava-disk-cache")
+DISK_CACHE_MAX_BYTES = int(os.getenv("DISK_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+DISK_CACHE_FRESH_SECONDS = float(os.getenv("DISK_CACHE_FRESH_SECONDS", "300"))
+
+
+@dataclass
+class Fetched:
+    """Result of an origin fetch; ``not_modified`` means the cached copy is still current."""
+
+    data: Optional[bytes] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_type: Optional[str] = None
+    not_modified: bool = False
+
+
+# fetch(validators) -> Fetched, where validators holds the cached "etag" and
+# "last_modified" (empty on a miss)
+FetchFunction = Callable[[Dict[str, str]], Fetched]
+
+
+class DiskCache:
+    """
+    Size-bounded LRU cache of fetched content on local disk.
+
+    Args:
+        directory: Cache directory (created if missing)
+        max_bytes: Total size bound of the cached content; 0 disables the cache
+        fresh_seconds: How long an entry is served without revalidation
+    """
+
+    def __init__(
+        self,
+        directory: str = DISK_CACHE_DIR,
+        max_bytes: int = DISK_CACHE_MAX_BYTES,
+        fresh_seconds: float = DISK_CACHE_FRESH_SECONDS,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_seconds
+        self._objects_dir = os.path.join(directory, "objects")
+        self._keys_dir = os.path.join(directory, "keys")
+        self._tmp_dir = os.path.join(directory, "tmp")
+        self._lock = threading.Lock()
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()  # content hash -> size, LRU first
+        self._total_bytes = 0
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.stale_served = 0
+        self.evictions = 0
+        self.entries_pruned = 0
+        self.bytes_served = 0
+        if self.enabled:
+            for path in (self._objects_dir, self._keys_dir, self._tmp_dir):
+                os.makedirs(path, exist_ok=True)
+            self._load()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get_or_fetch(self, key: str, fetch: FetchFunction) -> bytes:
+        """
+        Return the content for ``key`` from disk, revalidating or fetching as needed.
+
+        Args:
+            key: Cache key, normally the URL of the content
+            fetch: Origin fetch, called with the cached validators
+
+        Returns:
+            Content bytes
+        """
+        if not self.enabled:
+            return fetch({}).data
+
+        entry = self._read_entry(key)
+        data = self._read_object(entry["hash"]) if entry else None
+        if data is not None:
+            if time.time() - entry["validated_at"] < self.fresh_seconds:
+                return self._served(data, "hits")
+            validators = {name: entry[name] for name in ("etag", "last_modified") if entry.get(name)}
+            try:
+                result = fetch(validators)
+            except Exception as e:
+                logger.warning(f"[DISK_CACHE] Revalidation failed, serving stale copy of {key[:80]}: {e}")
+                return self._served(data, "stale_served")
+            if result.not_modified:
+                entry["validated_at"] = time.time()
+                self._write_entry(key, entry)
+                return self._served(data, "revalidated")
+        else:
+            result = fetch({})
+
+        with self._lock:
+            self.misses += 1
+        self._store(key, result)
+        return result.data
+
+    def fetch_url(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 30.0,
+        max_bytes: Optional[int] = None,
+    ) -> bytes:
+        """
+        Read-through HTTP GET of ``url``, revalidated with ETag / Last-Modified.
+
+        With ``max_bytes`` the body is streamed and the download aborted with
+        ValueError as soon as it is larger (an oversized cached copy too).
+        """
+
+        def fetch(validators: Dict[str, str]) -> Fetched:
+            request_headers = dict(headers or {})
+            if "etag" in validators:
+                request_headers["If-None-Match"] = validators["etag"]
+            if "last_modified" in validators:
+                request_headers["If-Modified-Since"] = validators["last_modified"]
+            with requests.get(url, headers=request_headers, timeout=timeout, stream=True) as response:
+                if response.status_code == 304:
+                    return Fetched(not_modified=True)
+                response.raise_for_status()
+                data = _read_limited(response, url, max_bytes)
+            return Fetched(
+                data=data,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+                content_type=response.headers.get("Content-Type"),
+            )
+
+        data = self.get_or_fetch(url, fetch)
+        if max_bytes is not None and len(data) > max_bytes:
+            raise ValueError(f"{url[:80]} exceeds {max_bytes} bytes")
+        return data
+
+    def clear(self) -> None:
+        with self._lock:
+            for digest in list(self._sizes):
+                self._remove_object(digest)
+        for name in os.listdir(self._keys_dir):
+            self._unlink(os.path.join(self._keys_dir, name))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.revalidated + self.misses + self.stale_served
+            return {
+                "enabled": self.enabled,
+                "objects": len(self._sizes),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "stale_served": self.stale_served,
+                "evictions": self.evictions,
+                "entries_pruned": self.entries_pruned,
+                "bytes_served": self.bytes_served,
+                "hit_rate": round((lookups - self.misses) / lookups, 3) if lookups else 0.0,
+            }
+
+    # --- storage ---
+
+    def _load(self) -> None:
+        with self._lock:
+            scanned_at = self._rescan()
+            self._evict()
+            self._prune_entries(scanned_at)
+        # Leftovers of writes interrupted by a crash; recent files may belong
+        # to another worker writing right now
+        for name in os.listdir(self._tmp_dir):
+            path = os.path.join(self._tmp_dir, name)
+            try:
+                if time.time() - os.path.getmtime(path) > 3600:
+                    self._unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _served(self, data: bytes, counter: str) -> bytes:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            self.bytes_served += len(data)
+        return data
+
+    def _store(self, key: str, result: Fetched) -> None:
+        digest = hashlib.sha256(result.data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            self._atomic_write(path, result.data)
+        else:
+            os.utime(path)
+        self._write_entry(key, {
+            "key": key,
+            "hash": digest,
+            "etag": result.etag,
+            "last_modified": result.last_modified,
+            "content_type": result.content_type,
+            "validated_at": time.time(),
+        })
+        with self._lock:
+            if digest in self._sizes:
+                self._sizes.move_to_end(digest)
+                return
+            # New object: measure the shared directory and evict from it
+            scanned_at = self._rescan()
+            if self._evict():
+                self._prune_entries(scanned_at)
+
+    def _read_object(self, digest: str) -> Optional[bytes]:
+        path = self._object_path(digest)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted (possibly by another worker sharing the directory)
+            with self._lock:
+                size = self._sizes.pop(digest, None)
+                if size is not None:
+                    self._total_bytes -= size
+            return None
+        with self._lock:
+            if digest in self._sizes:
+                self._sizes.move_to_end(digest)
+        return data
+
+    def _rescan(self) -> float:
+        # Caller holds the lock. Sizes and LRU order from objects/ on disk, which
+        # other workers sharing the directory write to and evict from as well
+        # Equal mtimes (coarse clocks) keep this worker's own LRU order
+        # Returns when the scan started (see _prune_entries)
+        scanned_at = time.time()
+        local_order = {digest: index for index, digest in enumerate(self._sizes)}
+        objects = []
+        for name in os.listdir(self._objects_dir):
+            try:
+                stat = os.stat(os.path.join(self._objects_dir, name))
+            except FileNotFoundError:
+                continue
+            objects.append((stat.st_mtime, local_order.get(name, -1), name, stat.st_size))
+        self._sizes = OrderedDict((digest, size) for _, _, digest, size in sorted(objects))
+        self._total_bytes = sum(self._sizes.values())
+        return scanned_at
+
+    def _evict(self) -> int:
+        # Caller holds the lock; the newest object is kept even if it alone exceeds the bound
+        # Returns the number of objects evicted
+        evicted = 0
+        while self._total_bytes > self.max_bytes and len(self._sizes) > 1:
+            digest = next(iter(self._sizes))
+            self._remove_object(digest)
+            evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def _prune_entries(self, scanned_at: float) -> None:
+        # Caller holds the lock, right after _rescan. Deletes the entries whose
+        # object is gone (evicted here or by another worker); entries written
+        # since the scan may point at an object another worker stored after it
+        for name in os.listdir(self._keys_dir):
+            path = os.path.join(self._keys_dir, name)
+            try:
+                if os.path.getmtime(path) >= scanned_at:
+                    continue
+                with open(path, "rb") as file:
+                    digest = orjson.loads(file.read()).get("hash")
+            except (FileNotFoundError, orjson.JSONDecodeError):
+                continue
+            if digest not in self._sizes:
+                self._unlink(path)
+                self.entries_pruned += 1
+
+    def _remove_object(self, digest: str) -> None:
+        # Entries pointing at it are deleted by _prune_entries
+        self._total_bytes -= self._sizes.pop(digest)
+        self._unlink(self._object_path(digest))
+
+    def _read_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._entry_path(key)
+        try:
+            with open(path, "rb") as file:
+                entry = orjson.loads(file.read())
+        except FileNotFoundError:
+            return None
+        if entry.get("key") != key:
+            return None
+        return entry
+
+    def _write_entry(self, key: str, entry: Dict[str, Any]) -> None:
+        self._atomic_write(self._entry_path(key), orjson.dumps(entry))
+
+    def _atomic_write(self, path: str, data: bytes) -> None:
+        temp_path = os.path.join(self._tmp_dir, uuid.uuid4().hex)
+        try:
+            with open(temp_path, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            self._unlink(temp_path)
+            raise
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self._objects_dir, digest)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self._keys_dir, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _read_limited(response, url: str, max_bytes: Optional[int]) -> bytes:
+    """Read a streamed response body, raising ValueError once it exceeds ``max_bytes``."""
+    if max_bytes is None:
+        return response.content
+    declared = response.headers.get("Content-Length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise ValueError(f"{url[:80]} exceeds {max_bytes} bytes ({declared} declared)")
+    chunks = []
+    received = 0
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        received += len(chunk)
+        if received > max_bytes:
+            raise ValueError(f"{url[:80]} exceeds {max_bytes} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+# Process-wide instance used by load_image_bytes and StorageManager.download_blob_cached
+disk_cache = DiskCache()
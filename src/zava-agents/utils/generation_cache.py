@@ -0,0 +1,108 @@
+"""
+Cache of generated images keyed by what was asked for.
+
+Users often retry the same request ("make this room Sage Harmony") on the same
+photo, and each retry used to pay for a new gpt-image-1 edit. The key is the
+SHA-256 of the normalized prompt, the content hash of the source image and the
+model parameters; the value is the URL of the stored result.
+
+Reuse is governed by a policy:
+- "always": reuse a cached result while it is within the TTL
+- "never": always generate (results are still recorded, e.g. to warm up)
+- max_reuses > 0 caps how many times one result is served before a fresh
+  generation replaces it, so persistent retries eventually get a new variation
+"""
+import hashlib
+import os
+import re
+import threading
+from typing import Any, Dict, Optional
+
+import orjson
+
+from utils.cache_utils import LRUCache
+
+IMAGE_GENERATION_CACHE_POLICY = os.getenv("IMAGE_GENERATION_CACHE_POLICY", "always")
+IMAGE_GENERATION_CACHE_TTL_SECONDS = float(os.getenv("IMAGE_GENERATION_CACHE_TTL_SECONDS", "86400"))
+IMAGE_GENERATION_CACHE_MAX_REUSES = int(os.getenv("IMAGE_GENERATION_CACHE_MAX_REUSES", "0"))
+IMAGE_GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_GENERATION_CACHE_MAX_ENTRIES", "5000"))
+
+REUSE_POLICIES = ("always", "never")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation."""
+    return _WHITESPACE.sub(" ", prompt).strip().rstrip(".!?").casefold()
+
+
+def generation_key(prompt: str, source_hash: str, **model_params: Any) -> str:
+    """Content address of a generation request."""
+    payload = orjson.dumps(
+        {"prompt": normalize_prompt(prompt), "source": source_hash, "params": model_params},
+        option=orjson.OPT_SORT_KEYS,
+    )
+    return hashlib.sha256(payload).hexdigest()
+
+
+class GenerationCache:
+    """
+    Maps generation keys to stored image URLs.
+
+    Args:
+        policy: "always" or "never" (see module docstring)
+        ttl_seconds: How long a result may be reused (None for no expiry)
+        max_reuses: Serve one result at most this many times (0 for unlimited)
+        max_entries: LRU bound on the number of cached results
+    """
+
+    def __init__(
+        self,
+        policy: str = IMAGE_GENERATION_CACHE_POLICY,
+        ttl_seconds: Optional[float] = IMAGE_GENERATION_CACHE_TTL_SECONDS,
+        max_reuses: int = IMAGE_GENERATION_CACHE_MAX_REUSES,
+        max_entries: int = IMAGE_GENERATION_CACHE_MAX_ENTRIES,
+    ):
+        if policy not in REUSE_POLICIES:
+            raise ValueError(f"Unknown image generation cache policy {policy!r}, expected one of {REUSE_POLICIES}")
+        self.policy = policy
+        self.max_reuses = max_reuses
+        self._entries = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.stored = 0
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Return a reusable image URL for ``key``, or None if a new generation is needed."""
+        if self.policy == "never":
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self.max_reuses and entry["reuses"] >= self.max_reuses:
+                self._entries.pop(key)
+                return None
+            entry["reuses"] += 1
+            self.reused += 1
+            return entry["url"]
+
+    def store(self, key: str, url: str) -> None:
+        with self._lock:
+            self._entries.set(key, {"url": url, "reuses": 0})
+            self.stored += 1
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._entries.stats()
+        return {
+            "policy": self.policy,
+            "entries": entries["entries"],
+            "reused": self.reused,
+            "stored": self.stored,
+            "hit_rate": entries["hit_rate"],
+        }
+
+
+# Process-wide instance used by create_image
+generation_cache = GenerationCache()
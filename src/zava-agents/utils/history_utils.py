@@ -1,10 +1,11 @@
 from collections import deque
-from typing import Deque, Tuple
+from typing import Deque, Optional, Tuple
 import json
 import orjson
 import time
 import logging
 from utils.log_utils import log_timing
+from utils.message_utils import fast_json_dumps
 
 logger = logging.getLogger(__name__)
 
@@ -87,4 +88,78 @@ def parse_conversation_history(conversation_history: str, chat_history: Deque[Tu
     except Exception as e:
         logger.error("Error parsing conversation history", exc_info=True)
         chat_history.append(("user", user_message))
-    return chat_history
\ No newline at end of file
+    return chat_history
+
+
+def io_entries_since(io_history, anchor: Optional[int], limit: int) -> list:
+    """
+    Session I/O entries recorded after ``anchor``, at most the last ``limit``.
+
+    ``anchor`` is the ``seq`` of the entry that was last when an agent replied
+    (entries carry a per-session sequence number that is stored with them, so
+    the anchor survives the history being reloaded from the session store);
+    if it is None, or that entry is no longer in the (bounded) history, the
+    last ``limit`` entries are returned.
+    """
+    entries = list(io_history)
+    if anchor is not None:
+        entries = [entry for entry in entries if entry.get("seq", 0) > anchor]
+    return entries[-limit:] if limit > 0 else []
+
+
+def format_io_history(io_entries) -> str:
+    """Format session I/O entries ({"input": ...} / {"output": ...}) like format_chat_history."""
+    history = deque()
+    for entry in io_entries:
+        if "input" in entry:
+            history.append(("user", entry["input"]))
+        elif "output" in entry:
+            history.append(("bot", entry["output"]))
+    return format_chat_history(clean_conversation_history(history))
+
+
+def build_agent_context(
+    agent_name: str,
+    enriched_message: str,
+    formatted_history: str,
+    raw_io_history,
+    chat_turns: int,
+    conversation=None,
+) -> str:
+    """
+    Context tailored to each agent type:
+    - cart_manager: Full raw I/O history for tracking cart state changes
+    - cora: Formatted conversation history for contextual responses
+    - Others: Enriched message with multimodal + product data
+
+    When ``conversation`` (an AgentConversation) continues the agent's
+    server-side conversation, which already holds its earlier turns, only the
+    session I/O since the agent's last reply is added (turns other agents
+    handled meanwhile). The last ``raw_io_history`` entry is this turn's
+    input, already in ``enriched_message``; cora gets at most ``chat_turns``
+    entries.
+    """
+    if conversation is not None and conversation.persistent:
+        entries = list(raw_io_history)[:-1]
+        unseen = io_entries_since(
+            entries, conversation.io_anchor, len(entries) if agent_name == "cart_manager" else chat_turns
+        )
+        if not unseen or agent_name not in ("cart_manager", "cora"):
+            return enriched_message
+        if agent_name == "cart_manager":
+            return f"{enriched_message}\n\nRAW_IO_HISTORY (since your last reply):\n{fast_json_dumps(unseen, option=orjson.OPT_INDENT_2)}"
+        return f"{format_io_history(unseen)}\n\nUser: {enriched_message}"
+
+    # Cart manager needs full raw_io_history for state management
+    if agent_name == "cart_manager":
+        # Provide complete interaction history so cart_manager can track
+        # all add/remove operations and maintain accurate cart state
+        return f"{enriched_message}\n\nRAW_IO_HISTORY:\n{fast_json_dumps(list(raw_io_history), option=orjson.OPT_INDENT_2)}"
+
+    # Cora needs conversation history for contextual dialogue
+    if agent_name == "cora":
+        # Provide formatted chat history so cora can reference previous
+        # conversation turns and maintain coherent multi-turn dialogue
+        return f"{formatted_history}\n\nUser: {enriched_message}"
+
+    return enriched_message
@@ -0,0 +1,157 @@
+"""
+Process-wide cache of image descriptions keyed by image content.
+
+The same photo is often uploaded by several users, or sent again after a
+reconnect, under the same or a different URL. Descriptions are therefore
+stored by the SHA-256 of the image bytes, with the URL (hashed if it is a data
+URI or long) as a secondary key that skips the download on repeat requests.
+The cache is bounded by the byte size of the stored descriptions (LRU) and
+entries expire after a TTL. Concurrent requests for the same URL or the same
+content share a single vision call.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Callable, Dict, Optional
+
+from utils.cache_utils import LRUCache
+from utils.image_utils import prepare_image, url_cache_key
+
+logger = logging.getLogger(__name__)
+
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+IMAGE_CACHE_TTL_SECONDS = float(os.getenv("IMAGE_CACHE_TTL_SECONDS", "3600"))
+IMAGE_CACHE_MAX_URLS = int(os.getenv("IMAGE_CACHE_MAX_URLS", "10000"))
+
+
+class ImageDescriptionCache:
+    """Content-addressed, size-bounded image description cache with single-flight lookups."""
+
+    def __init__(
+        self,
+        max_bytes: int = IMAGE_CACHE_MAX_BYTES,
+        ttl_seconds: Optional[float] = IMAGE_CACHE_TTL_SECONDS,
+        max_urls: int = IMAGE_CACHE_MAX_URLS,
+    ):
+        self._descriptions = LRUCache(
+            max_bytes=max_bytes,
+            ttl_seconds=ttl_seconds,
+            sizeof=lambda description: len(description.encode("utf-8")),
+        )
+        self._url_to_key = LRUCache(max_entries=max_urls, ttl_seconds=ttl_seconds)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.url_hits = 0
+        self.content_hits = 0
+        self.misses = 0
+        self.inflight_joins = 0
+        self.failures = 0
+
+    async def get_description(
+        self,
+        image_url: str,
+        describe: Callable[[str], str],
+        executor=None,
+    ) -> str:
+        """
+        Return the description of an image, calling ``describe(image_url)`` only on a miss.
+
+        Blocking work (download, hashing, the vision call) runs in ``executor``.
+        """
+        url_key = url_cache_key(image_url)
+        content_key = self._url_to_key.get(url_key)
+        if content_key is not None:
+            description = self._descriptions.get(content_key)
+            if description is not None:
+                self.url_hits += 1
+                return description
+        return await self._single_flight(
+            f"url:{url_key}", lambda: self._resolve(image_url, url_key, describe, executor)
+        )
+
+    def is_cached(self, image_url: str) -> bool:
+        """True if a description for this URL is cached (without touching LRU order or stats)."""
+        content_key = self._url_to_key.peek(url_cache_key(image_url))
+        return content_key is not None and content_key in self._descriptions
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss metrics for logging and monitoring."""
+        lookups = self.url_hits + self.content_hits + self.misses
+        descriptions = self._descriptions.stats()
+        return {
+            "entries": descriptions["entries"],
+            "bytes": descriptions["size"],
+            "url_hits": self.url_hits,
+            "content_hits": self.content_hits,
+            "misses": self.misses,
+            "inflight_joins": self.inflight_joins,
+            "failures": self.failures,
+            "hit_rate": (self.url_hits + self.content_hits) / lookups if lookups else 0.0,
+            "evictions": descriptions["evictions"],
+            "expirations": descriptions["expirations"],
+        }
+
+    def log_stats(self) -> None:
+        logger.info("Image description cache", extra=self.stats())
+
+    async def _resolve(self, image_url: str, url_key: str, describe, executor) -> str:
+        loop = asyncio.get_running_loop()
+        try:
+            content_key = await loop.run_in_executor(executor, self._fetch_content_key, image_url)
+        except Exception as e:
+            # The model may still reach the image even if we cannot; cache by URL only
+            logger.warning(f"Could not fetch image for hashing, caching by URL: {e}")
+            content_key = f"url:{url_key}"
+        self._url_to_key.set(url_key, content_key)
+
+        description = self._descriptions.get(content_key)
+        if description is not None:
+            self.content_hits += 1
+            return description
+        return await self._single_flight(
+            f"content:{content_key}",
+            lambda: self._describe(content_key, image_url, describe, executor),
+        )
+
+    @staticmethod
+    def _fetch_content_key(image_url: str) -> str:
+        # Also warms the preprocessing cache used by the describe call
+        return prepare_image(image_url).content_hash
+
+    async def _describe(self, content_key: str, image_url: str, describe, executor) -> str:
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        try:
+            description = await loop.run_in_executor(executor, describe, image_url)
+        except Exception:
+            self.failures += 1
+            raise
+        if description:
+            self._descriptions.set(content_key, description)
+        return description
+
+    async def _single_flight(self, key: str, factory) -> str:
+        """Run ``factory()`` once per key; concurrent callers await the same result."""
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.inflight_joins += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await factory()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # Mark as retrieved when nobody joined
+            raise
+        finally:
+            del self._inflight[key]
+
+
+# Process-wide instance shared by all sessions of this worker
+image_description_cache = ImageDescriptionCache()
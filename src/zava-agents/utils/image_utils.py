@@ -0,0 +1,317 @@
+"""
+Image helpers shared by the image tools and the chat app.
+
+prepare_image is the common preprocessing stage for the vision and image-edit
+calls: the source is downloaded and decoded once, downscaled to
+IMAGE_MAX_DIMENSION, recompressed, and the normalized bytes are cached by the
+SHA-256 of the original content. Phone photos are often 4000px+ and several MB;
+sending them as-is inflates upload time and vision token cost for no visible
+gain at the resolutions the models work at.
+"""
+import base64
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Any, Dict, Optional, Tuple, Union
+
+
+from utils.cache_utils import LRUCache
+from utils.disk_cache import disk_cache
+
+DOWNLOAD_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/114.0.0.0 Safari/537.36"
+}
+
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1536"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+IMAGE_PREP_CACHE_MAX_BYTES = int(os.getenv("IMAGE_PREP_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+IMAGE_PREP_CACHE_TTL_SECONDS = float(os.getenv("IMAGE_PREP_CACHE_TTL_SECONDS", "3600"))
+
+
+# Largest source image accepted, downloaded or decoded from a data URI
+IMAGE_MAX_SOURCE_BYTES = int(os.getenv("IMAGE_MAX_SOURCE_BYTES", str(20 * 1024 * 1024)))
+
+
+def validate_image_source(image_source: str) -> str:
+    """
+    Check that an image source may be fetched: an http(s) URL or a data:image/ URI.
+
+    Image URLs come from websocket clients, so anything else (local paths,
+    file:// or other schemes) is rejected before any read.
+
+    Raises:
+        ValueError: If the source is not an http(s) URL or a base64 image data URI
+    """
+    if not isinstance(image_source, str):
+        raise ValueError("Image source must be a URL")
+    if image_source.startswith(("http://", "https://")):
+        return image_source
+    if image_source.startswith("data:image/") and ";base64," in image_source.split(",", 1)[0] + ",":
+        return image_source
+    raise ValueError("Unsupported image source: only http(s) URLs and data:image/ URIs are accepted")
+
+
+def load_image_bytes(
+    image_source: str, timeout: float = 30.0, max_bytes: int = IMAGE_MAX_SOURCE_BYTES
+) -> bytes:
+    """
+    Load the raw bytes of an image.
+
+    URLs are read through the local disk cache, so images used repeatedly
+    (edit sources, earlier generations) are not downloaded again.
+
+    Args:
+        image_source: http(s) URL or base64 data URI (data:image/...;base64,...)
+        timeout: HTTP timeout in seconds
+        max_bytes: Larger images are rejected
+
+    Returns:
+        Image bytes
+
+    Raises:
+        ValueError: If the source is not accepted (see validate_image_source) or too large
+    """
+    validate_image_source(image_source)
+    if image_source.startswith(("http://", "https://")):
+        return disk_cache.fetch_url(
+            image_source, headers=DOWNLOAD_HEADERS, timeout=timeout, max_bytes=max_bytes
+        )
+    encoded = image_source.split(",", 1)[1]
+    # Checked before decoding: base64 holds 3 bytes per 4 characters
+    if len(encoded) > (max_bytes + 2) // 3 * 4:
+        raise ValueError(f"Image data URI exceeds {max_bytes} bytes")
+    data = base64.b64decode(encoded)
+    if len(data) > max_bytes:
+        raise ValueError(f"Image data URI exceeds {max_bytes} bytes")
+    return data
+
+
+def content_hash(data: bytes) -> str:
+    """Return the SHA-256 hex digest used to key image caches."""
+    return hashlib.sha256(data).hexdigest()
+
+
+# URLs longer than this are hashed before being used as cache keys
+MAX_URL_KEY_LENGTH = 512
+
+
+def url_cache_key(image_url: str) -> str:
+    """
+    Cache key for an image URL: the URL itself, or its SHA-256 for data URIs and
+    long URLs, so entry-count-bounded URL maps stay small in bytes too.
+    """
+    if image_url.startswith("data:") or len(image_url) > MAX_URL_KEY_LENGTH:
+        return "sha256:" + hashlib.sha256(image_url.encode("utf-8")).hexdigest()
+    return image_url
+
+
+_IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def sniff_image_type(data) -> Optional[str]:
+    """
+    Return the MIME type of PNG/JPEG/GIF/WebP bytes from their signature, without decoding.
+
+    Args:
+        data: bytes, bytearray or memoryview (only the first 12 bytes are read)
+
+    Returns:
+        MIME type, or None if the format is not recognised
+    """
+    head = bytes(data[:12])
+    for signature, mime_type in _IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def decode_b64_image(b64_data: str) -> Tuple[bytes, str]:
+    """
+    Decode a base64 image (e.g. b64_json from the images API) into uploadable bytes.
+
+    Recognised formats are returned as-is; only unrecognised payloads are decoded
+    with PIL, which validates them, and re-encoded as PNG.
+
+    Returns:
+        (image bytes, content type)
+    """
+    image_bytes = base64.b64decode(b64_data)
+    content_type = sniff_image_type(image_bytes)
+    if content_type is None:
+        from PIL import Image
+
+        output = BytesIO()
+        with Image.open(BytesIO(image_bytes)) as image:
+            image.save(output, format="PNG")
+        image_bytes, content_type = output.getvalue(), "image/png"
+    return image_bytes, content_type
+
+
+@dataclass(frozen=True)
+class PreparedImage:
+    """Normalized image bytes ready to send to a model."""
+
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_size: int
+    content_hash: str  # SHA-256 of the original bytes
+
+    @property
+    def filename(self) -> str:
+        return "image.png" if self.mime_type == "image/png" else "image.jpg"
+
+    def to_data_uri(self) -> str:
+        return f"data:{self.mime_type};base64,{base64.b64encode(self.data).decode('ascii')}"
+
+
+class _PreprocessingStats:
+    """Running totals used to report what preprocessing saves."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.images = 0
+        self.cache_hits = 0
+        self.original_bytes = 0
+        self.prepared_bytes = 0
+        self.decode_seconds = 0.0
+
+    def record(self, prepared: PreparedImage, seconds: float, cache_hit: bool) -> None:
+        with self._lock:
+            self.images += 1
+            self.original_bytes += prepared.original_size
+            self.prepared_bytes += len(prepared.data)
+            if cache_hit:
+                self.cache_hits += 1
+            else:
+                self.decode_seconds += seconds
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            processed = self.images - self.cache_hits
+            avg_decode = self.decode_seconds / processed if processed else 0.0
+            return {
+                "images": self.images,
+                "cache_hits": self.cache_hits,
+                "original_bytes": self.original_bytes,
+                "prepared_bytes": self.prepared_bytes,
+                "bytes_saved": self.original_bytes - self.prepared_bytes,
+                "size_ratio": self.prepared_bytes / self.original_bytes if self.original_bytes else 1.0,
+                "decode_seconds": self.decode_seconds,
+                # Every cache hit skips one download + decode + encode
+                "cached_seconds_saved": self.cache_hits * avg_decode,
+            }
+
+
+_prepared_cache = LRUCache(
+    max_bytes=IMAGE_PREP_CACHE_MAX_BYTES,
+    ttl_seconds=IMAGE_PREP_CACHE_TTL_SECONDS,
+    sizeof=lambda prepared: len(prepared.data),
+)
+_stats = _PreprocessingStats()
+
+
+def normalize_image_bytes(
+    data: bytes,
+    max_dimension: int = IMAGE_MAX_DIMENSION,
+    jpeg_quality: int = IMAGE_JPEG_QUALITY,
+) -> tuple:
+    """
+    Decode, downscale and recompress image bytes.
+
+    Images with transparency are kept as PNG, everything else becomes JPEG. If
+    the image is already within ``max_dimension`` and recompressing would not
+    make it smaller, the original bytes are returned unchanged.
+
+    Returns:
+        (bytes, mime_type, width, height)
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(BytesIO(data)) as image:
+        source_format = image.format
+        if max(image.size) > max_dimension:
+            # JPEG draft mode decodes at 1/2, 1/4 or 1/8 scale, never below the target size
+            scale = max_dimension / max(image.size)
+            image.draft("RGB", (int(image.width * scale), int(image.height * scale)))
+        image = ImageOps.exif_transpose(image)  # Phone photos carry their rotation in EXIF
+        resized = max(image.size) > max_dimension
+        if resized:
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        output = BytesIO()
+        if has_alpha:
+            image.save(output, format="PNG", optimize=True)
+            mime_type = "image/png"
+        else:
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            image.save(output, format="JPEG", quality=jpeg_quality, optimize=True)
+            mime_type = "image/jpeg"
+        width, height = image.size
+
+    if not resized and output.tell() >= len(data) and source_format in ("JPEG", "PNG"):
+        return data, f"image/{source_format.lower()}", width, height
+    return output.getvalue(), mime_type, width, height
+
+
+def prepare_image(
+    image_source: Union[str, bytes],
+    max_dimension: int = IMAGE_MAX_DIMENSION,
+) -> PreparedImage:
+    """
+    Load, normalize and cache an image for a vision or image-edit call.
+
+    Args:
+        image_source: http(s) URL, data URI or raw bytes
+        max_dimension: Longest side of the normalized image in pixels
+
+    Returns:
+        PreparedImage with the normalized bytes
+    """
+    start_time = time.perf_counter()
+    # URLs always go through load_image_bytes: the disk cache serves hot ones
+    # and revalidates them, so changed content is not answered from memory
+    data = image_source if isinstance(image_source, bytes) else load_image_bytes(image_source)
+    if not data:
+        raise ValueError("Image is empty")
+    digest = content_hash(data)
+
+    prepared = _prepared_cache.get((digest, max_dimension))
+    if prepared is not None:
+        _stats.record(prepared, time.perf_counter() - start_time, cache_hit=True)
+        return prepared
+
+    normalized, mime_type, width, height = normalize_image_bytes(data, max_dimension)
+    prepared = PreparedImage(
+        data=normalized,
+        mime_type=mime_type,
+        width=width,
+        height=height,
+        original_size=len(data),
+        content_hash=digest,
+    )
+    _prepared_cache.set((digest, max_dimension), prepared)
+    _stats.record(prepared, time.perf_counter() - start_time, cache_hit=False)
+    return prepared
+
+
+def image_preprocessing_report() -> Dict[str, Any]:
+    """Bytes and time saved by image preprocessing in this process."""
+    report = _stats.report()
+    report["cache"] = _prepared_cache.stats()
+    return report
@@ -0,0 +1,339 @@
+"""
+Zava paint palette and local validation of image-generation requests.
+
+gpt-image-1 is told to reject colors outside the palette (see HEXCODES in
+imageCreationTool), but only after a paid, multi-second edit call. The
+validator here catches off-palette requests locally: it parses palette names,
+hex codes and common color words from the user's request, places them in Lab
+space and suggests the nearest in-palette paints (with their catalog
+ProductIDs) when a color cannot be matched.
+"""
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from io import BytesIO
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from utils.color_utils import (
+    COMMON_COLORS,
+    ColorIndex,
+    HEX_COLOR_PATTERN,
+    VIVID_MODIFIERS,
+    hex_to_lab,
+    kmeans_colors,
+    lab_to_rgb,
+    rgb_to_hex,
+    rgb_to_lab,
+)
+
+logger = logging.getLogger(__name__)
+
+# Zava paint palette (name -> hex), the colors gpt-image-1 is allowed to use
+PAINT_PALETTE: Dict[str, str] = {
+    "Pale Meadow": "#b6c9bb",
+    "Tranquil Lavender": "#bdb4bf",
+    "Whispering Blue": "#9fbbc2",
+    "Whispering Blush": "#d4b9a4",
+    "Ocean Mist": "#aec3b7",
+    "Sunset Coral": "#d25e2e",
+    "Forest Whisper": "#788c6f",
+    "Morning Dew": "#596c76",
+    "Dusty Rose": "#ac9187",
+    "Sage Harmony": "#bec7be",
+    "Vanilla Dream": "#a39b8b",
+    "Charcoal Storm": "#6b6c6a",
+    "Golden Wheat": "#cfac5b",
+    "Soft Pebble": "#bfb8a9",
+    "Misty Gray": "#9da2a3",
+    "Rustic Clay": "#a78982",
+    "Ivory Pearl": "#937c6e",
+    "Deep Forest": "#4a5846",
+    "Autumn Spice": "#bc8567",
+    "Coastal Whisper": "#acb7b9",
+    "Effervescent Jade": "#586e57",
+    "Frosted Blue": "#cacec8",
+    "Frosted Lemon": "#d2ce8d",
+    "Honeydew Sunrise": "#d6ca9d",
+    "Lavender Whisper": "#dbdadf",
+    "Lilac Mist": "#cdcddb",
+    "Soft Creamsicle": "#ddbba6",
+}
+
+CATALOG_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "product_catalog.json"
+)
+
+# A hex code this close (CIEDE2000) to a palette color counts as that color
+HEX_MATCH_MAX_DELTA_E = 3.0
+# A plain color word ("blue", "sage") is fine if a palette color is this close.
+# Lenient on purpose: a false rejection costs the user, a false accept costs one
+# edit call (which still enforces the palette).
+COLOR_WORD_MAX_DELTA_E = 18.0
+# Lightness shift applied for "light"/"dark" style modifiers
+_LIGHTNESS_MODIFIERS = {"light": 20, "pale": 20, "soft": 10, "bright": 10, "dark": -20, "deep": -20}
+
+# Color words only count when they name a paint color, so "add a black sofa" or
+# "paint the walls Sage Harmony and keep the black sofa" is not rejected: the
+# color must modify a paint target ("navy ceiling") or, ending its phrase,
+# follow a paint word in the same clause ("paint the walls light blue"). A color
+# followed by any other noun describes that object. Hex codes always count.
+_PAINT_CONTEXT = re.compile(r"\b(paint\w*|repaint\w*|walls?|colou?r\w*|shades?|ceilings?|trim|accent)\b", re.I)
+_CLAUSE_BOUNDARY = re.compile(r"[.,;:!?]|\b(?:and|but|while|with|then|or)\b", re.I)
+_NEXT_WORD = re.compile(r"[\s-]*([A-Za-z][\w'-]*)")
+# Words that may follow a paint color without making it an object's color
+_PHRASE_WORDS = frozenset(
+    "a an the and or but with while then please too also instead now again so to for "
+    "in on of at by near next beside behind above below around against "
+    "like it this that these those one ones is are be would will".split()
+)
+_MODIFIER_WORDS = "|".join(re.escape(word) for word in (*VIVID_MODIFIERS, *_LIGHTNESS_MODIFIERS))
+_COLOR_WORD_PATTERN = re.compile(
+    rf"\b(?:({_MODIFIER_WORDS})[\s-]+)?({'|'.join(sorted(COMMON_COLORS, key=len, reverse=True))})\b",
+    re.I,
+)
+_PALETTE_NAME_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(name) for name in sorted(PAINT_PALETTE, key=len, reverse=True)) + r")\b",
+    re.I,
+)
+
+@lru_cache(maxsize=1)
+def load_paint_shade_products() -> Dict[str, str]:
+    """Map paint name to catalog ProductID for products in the "Paint Shades" category."""
+    try:
+        with open(CATALOG_PATH, "r", encoding="utf-8") as catalog_file:
+            catalog = json.load(catalog_file)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not load product catalog: {e}")
+        return {}
+    return {
+        product["ProductName"]: product["ProductID"]
+        for product in catalog
+        if product.get("ProductCategory") == "Paint Shades"
+    }
+
+
+@lru_cache(maxsize=1)
+def get_paint_color_index() -> ColorIndex:
+    """Color index over the Zava palette, with catalog ProductIDs for the "Paint Shades" products."""
+    products = load_paint_shade_products()
+    return ColorIndex(
+        {"name": name, "hex": hex_code, "product_id": products.get(name)}
+        for name, hex_code in PAINT_PALETTE.items()
+    )
+
+
+def nearest_palette_colors(lab: np.ndarray, count: int = 3) -> List[dict]:
+    """Nearest palette colors to a Lab color, closest first."""
+    return get_paint_color_index().nearest_lab(lab, count)[0]
+
+
+@dataclass
+class PaletteValidation:
+    """Outcome of validating an image request against the paint palette."""
+
+    is_valid: bool
+    matched: List[str] = field(default_factory=list)  # palette colors the request maps to
+    rejected: List[str] = field(default_factory=list)  # requested colors outside the palette
+    suggestions: List[dict] = field(default_factory=list)
+
+    @property
+    def message(self) -> str:
+        """User-facing explanation for a rejected request."""
+        if self.is_valid:
+            return ""
+        names = ", ".join(f"{s['name']} ({s['hex']})" for s in self.suggestions)
+        requested = " and ".join(self.rejected)
+        verb = "isn't" if len(self.rejected) == 1 else "aren't"
+        return (
+            f"Sorry, {requested} {verb} part of the Zava paint palette. "
+            f"The closest shades we offer are {names}. Would you like me to use one of those?"
+        )
+
+
+def _color_word_lab(modifier: str, word: str) -> np.ndarray:
+    lab = hex_to_lab(COMMON_COLORS[word.lower()]).copy()
+    lab[0] = min(100.0, max(0.0, lab[0] + _LIGHTNESS_MODIFIERS.get(modifier.lower(), 0)))
+    return lab
+
+
+def resolve_color(text: str) -> Optional[np.ndarray]:
+    """Lab coordinates of a hex code, palette name or (modified) color word, or None."""
+    text = text.strip()
+    if HEX_COLOR_PATTERN.fullmatch(text):
+        return hex_to_lab(text)
+    palette_name = next((name for name in PAINT_PALETTE if name.lower() == text.lower()), None)
+    if palette_name:
+        return hex_to_lab(PAINT_PALETTE[palette_name])
+    match = _COLOR_WORD_PATTERN.fullmatch(text)
+    if match:
+        return _color_word_lab(match.group(1) or "", match.group(2))
+    return None
+
+
+def find_similar_paints(colors: List[str], count: int = 3, max_delta_e: Optional[float] = None) -> List[dict]:
+    """
+    Zava paints closest to each requested color, ranked by CIEDE2000.
+
+    All resolvable colors are matched in one batched index query.
+
+    Args:
+        colors: Hex codes ("#a0b0c0"), palette names or color words ("light blue")
+        count: Matches per color
+        max_delta_e: Only return matches at most this far away
+
+    Returns:
+        One {"query", "matches"} (or {"query", "error"}) dict per requested color
+    """
+    resolved = [(query, resolve_color(query)) for query in colors]
+    labs = [lab for _, lab in resolved if lab is not None]
+    matches = iter(get_paint_color_index().nearest_lab(np.array(labs), count, max_delta_e) if labs else [])
+    return [
+        {"query": query, "matches": next(matches)}
+        if lab is not None
+        else {"query": query, "error": "Unrecognised color; use a hex code like #a0b0c0 or a color name"}
+        for query, lab in resolved
+    ]
+
+
+def _is_paint_color(text: str, match: "re.Match") -> bool:
+    """Whether the color word at ``match`` names a paint color (see _PAINT_CONTEXT)."""
+    following = _NEXT_WORD.match(text, match.end())
+    next_word = following.group(1).lower() if following else ""
+    if next_word and _PAINT_CONTEXT.fullmatch(next_word):
+        return True
+    if next_word and next_word not in _PHRASE_WORDS and not _COLOR_WORD_PATTERN.fullmatch(next_word):
+        return False
+    clause_start = max((b.end() for b in _CLAUSE_BOUNDARY.finditer(text, 0, match.start())), default=0)
+    return bool(_PAINT_CONTEXT.search(text, clause_start, match.start()))
+
+
+def validate_paint_request(prompt: str, max_suggestions: int = 3) -> PaletteValidation:
+    """
+    Check that every color requested in ``prompt`` is available in the Zava palette.
+
+    Args:
+        prompt: The user's request (not enriched with image descriptions, which
+            describe the existing room and may mention any color)
+        max_suggestions: Nearest palette colors to suggest per rejected color
+
+    Returns:
+        PaletteValidation; requests without any color are valid
+    """
+    matched: List[str] = []
+    rejected: List[str] = []
+    suggestions: List[dict] = []
+
+    def reject(label: str, lab: np.ndarray) -> None:
+        rejected.append(label)
+        for suggestion in nearest_palette_colors(lab, max_suggestions):
+            if suggestion["name"] not in {s["name"] for s in suggestions}:
+                suggestions.append(suggestion)
+
+    for match in _PALETTE_NAME_PATTERN.finditer(prompt):
+        name = next(n for n in PAINT_PALETTE if n.lower() == match.group(1).lower())
+        matched.append(name)
+    # Palette names contain color words ("Whispering Blue"); don't parse them twice
+    remaining = _PALETTE_NAME_PATTERN.sub(" ", prompt)
+
+    for match in HEX_COLOR_PATTERN.finditer(remaining):
+        lab = hex_to_lab(match.group(0))
+        nearest = nearest_palette_colors(lab, 1)[0]
+        if nearest["delta_e"] <= HEX_MATCH_MAX_DELTA_E:
+            matched.append(nearest["name"])
+        else:
+            reject(match.group(0), lab)
+
+    for match in _COLOR_WORD_PATTERN.finditer(remaining):
+        if _is_paint_color(remaining, match):
+            modifier = (match.group(1) or "").lower()
+            lab = _color_word_lab(modifier, match.group(2))
+            nearest = nearest_palette_colors(lab, 1)[0]
+            if modifier in VIVID_MODIFIERS or nearest["delta_e"] > COLOR_WORD_MAX_DELTA_E:
+                reject(match.group(0), lab)
+            else:
+                matched.append(nearest["name"])
+
+    return PaletteValidation(
+        is_valid=not rejected,
+        matched=list(dict.fromkeys(matched)),
+        rejected=rejected,
+        suggestions=suggestions[: max_suggestions * max(1, len(rejected))],
+    )
+
+
+def format_palette_prompt(palette: Optional[Dict[str, str]] = None) -> str:
+    """Palette instructions appended to gpt-image-1 prompts."""
+    palette = palette or PAINT_PALETTE
+    hexcodes = ", ".join(f"{name}: {code}" for name, code in palette.items())
+    return (
+        f"\n\n Hexcodes to strictly follow for paint: \n {hexcodes}. \n\n"
+        " If image is outside of these colors or something different is asked, "
+        "please reject the request and ask for a different color or theme. \n\n"
+    )
+
+
+# Longest side of the image used for color analysis; 64px keeps 4096 pixels,
+# plenty for dominant colors and fast enough to run inline (a few ms)
+ROOM_COLOR_SAMPLE_SIZE = 64
+
+
+def analyze_room_colors(
+    image_source: Union[str, bytes],
+    color_count: int = 5,
+    min_share: float = 0.05,
+) -> List[dict]:
+    """
+    Dominant colors of a room photo mapped to the nearest Zava paints.
+
+    The image goes through the shared preprocessing stage (so a photo that was
+    already downloaded for the vision call is not fetched again), is reduced to
+    ROOM_COLOR_SAMPLE_SIZE pixels on its longest side and clustered with
+    k-means in Lab space.
+
+    Args:
+        image_source: http(s) URL, data URI or raw bytes
+        color_count: Number of dominant colors to extract
+        min_share: Drop colors covering less than this fraction of the image
+
+    Returns:
+        List of {"hex", "share", "palette_match": {name, hex, product_id, delta_e}},
+        largest share first
+    """
+    from PIL import Image
+
+    from utils.image_utils import prepare_image
+
+    prepared = prepare_image(image_source)
+    with Image.open(BytesIO(prepared.data)) as image:
+        # JPEG draft mode decodes at a reduced scale directly
+        image.draft("RGB", (ROOM_COLOR_SAMPLE_SIZE * 2, ROOM_COLOR_SAMPLE_SIZE * 2))
+        image = image.convert("RGB")
+        image.thumbnail((ROOM_COLOR_SAMPLE_SIZE, ROOM_COLOR_SAMPLE_SIZE))
+        pixels = np.asarray(image, dtype=np.float64).reshape(-1, 3)
+
+    centers, shares = kmeans_colors(rgb_to_lab(pixels), k=color_count)
+    matches = get_paint_color_index().nearest_lab(centers, k=1)
+    return [
+        {
+            "hex": rgb_to_hex(lab_to_rgb(center)),
+            "share": round(float(share), 3),
+            "palette_match": match[0],
+        }
+        for center, share, match in zip(centers, shares, matches)
+        if share >= min_share
+    ]
+
+
+def describe_room_colors(colors: List[dict]) -> str:
+    """One-line summary of analyze_room_colors output for prompts and search queries."""
+    return ", ".join(
+        f"{color['hex']} ({color['share']:.0%}, closest Zava paint {color['palette_match']['name']}"
+        + (f" {color['palette_match']['product_id']}" if color["palette_match"]["product_id"] else "")
+        + ")"
+        for color in colors
+    )
@@ -1,6 +1,7 @@
 import json
 import re
 import orjson
+from typing import Tuple
 from utils.message_utils import fast_json_dumps
 
 def extract_bot_reply(msg) -> str:
@@ -51,6 +52,176 @@ def extract_product_names_from_response(response_data) -> str:
     except Exception:
         return ""
 
+_JSON_WHITESPACE = " \t\r\n"
+# Balanced but invalid nested candidates decoded before a reply is treated as prose
+MAX_JSON_CANDIDATES = 32
+
+
+def _can_open_json(text: str, index: int) -> bool:
+    """Whether the bracket at ``index`` is followed by a character that can follow it in JSON."""
+    length = len(text)
+    j = index + 1
+    while j < length and text[j] in _JSON_WHITESPACE:
+        j += 1
+    following = text[j] if j < length else ""
+    if text[index] == "{":
+        return following in ('"', "}")
+    return bool(following) and following in '{["]'
+
+
+def _find_json_start(text: str, start: int = 0) -> int:
+    """
+    Return the index of the first bracket that can open a JSON object or array, or -1.
+
+    An opening bracket only counts when the next significant character can
+    follow it in an agent reply, so prose such as "(see [1])" is skipped.
+    """
+    # Next "{" and "[" positions; only the one consumed is searched again, so
+    # prose full of "[x" brackets stays linear
+    brace = text.find("{", start)
+    bracket = text.find("[", start)
+    while brace != -1 or bracket != -1:
+        candidate = bracket if brace == -1 or (bracket != -1 and bracket < brace) else brace
+        if _can_open_json(text, candidate):
+            return candidate
+        if candidate == brace:
+            brace = text.find("{", candidate + 1)
+        else:
+            bracket = text.find("[", candidate + 1)
+    return -1
+
+
+def find_json_span(text: str, start: int = 0):
+    """
+    Locate the first balanced JSON object or array in text, in a single pass.
+
+    Leading prose and ```json code fences are skipped (see _find_json_start);
+    brackets inside strings are ignored while matching.
+
+    Args:
+        text: Text to search
+        start: Index to start searching from
+
+    Returns:
+        (start, end) slice indices of the value, or None if there is none.
+    """
+    value_start = _find_json_start(text, start)
+    if value_start == -1:
+        return None
+    length = len(text)
+    depth = 0
+    k = value_start
+    while k < length:
+        char = text[k]
+        if char == '"':
+            k = _skip_json_string(text, k + 1)
+            if k == -1:
+                return None
+            continue
+        if char == "{" or char == "[":
+            depth += 1
+        elif char == "}" or char == "]":
+            depth -= 1
+            if depth == 0:
+                return value_start, k + 1
+        k += 1
+    return None
+
+
+def _skip_json_string(text: str, k: int) -> int:
+    """Index just after the string whose opening quote is at ``k - 1``, or -1 if it is unterminated."""
+    while True:
+        quote = text.find('"', k)
+        if quote == -1:
+            return -1
+        backslashes = 0
+        while text[quote - 1 - backslashes] == "\\":
+            backslashes += 1
+        k = quote + 1
+        if backslashes % 2 == 0:
+            return k
+
+
+def _json_candidate_spans(text: str, start: int) -> Tuple[list, list]:
+    """
+    Balanced spans opened by a bracket that can open JSON, in one bracket-matching pass.
+
+    Returns:
+        (top_level, nested): outermost spans and the spans inside them
+        ("[[x]]" holds "[x]"), each ordered by start
+    """
+    top_level = []
+    nested = []
+    open_brackets = []  # start of each open bracket, None if it cannot open JSON
+    length = len(text)
+    k = start
+    while k < length:
+        if not open_brackets:
+            k = _find_json_start(text, k)
+            if k == -1:
+                break
+            open_brackets.append(k)
+            k += 1
+            continue
+        char = text[k]
+        if char == '"':
+            k = _skip_json_string(text, k + 1)
+            if k == -1:
+                break
+            continue
+        if char == "{" or char == "[":
+            open_brackets.append(k if _can_open_json(text, k) else None)
+        elif char == "}" or char == "]":
+            opened = open_brackets.pop()
+            if opened is not None:
+                (nested if open_brackets else top_level).append((opened, k + 1))
+        k += 1
+    nested.sort()
+    return top_level, nested
+
+
+def _decode_json_value(text: str):
+    """
+    Decode the first JSON object or array embedded in text, or return None.
+
+    Fast path: the value usually runs up to the last matching closing bracket
+    (the reply is JSON, optionally followed by a code fence or a sentence), so
+    a single orjson call on that slice succeeds without a Python-level scan.
+    Otherwise try the balanced candidates collected in one pass (see
+    _json_candidate_spans): every outermost one (they do not overlap, so
+    this is linear), then at most MAX_JSON_CANDIDATES nested ones.
+    """
+    start = _find_json_start(text)
+    if start == -1:
+        return None
+    end = text.rfind("}" if text[start] == "{" else "]") + 1
+    if end > start:
+        try:
+            return orjson.loads(text[start:end])
+        except orjson.JSONDecodeError:
+            pass
+    top_level, nested = _json_candidate_spans(text, start)
+    for span_start, span_end in top_level + nested[:MAX_JSON_CANDIDATES]:
+        try:
+            return orjson.loads(text[span_start:span_end])
+        except orjson.JSONDecodeError:
+            # Balanced but not valid JSON, try the next candidate
+            continue
+    return None
+
+
+def _empty_agent_response(answer: str) -> dict:
+    return {
+        "answer": answer,
+        "agent": "",
+        "products": "",
+        "discount_percentage": "",
+        "image_url": "",
+        "additional_data": "",
+        "cart": []
+    }
+
+
 def parse_agent_response(response: str) -> dict:
     """
     Parse agent response to check if it's JSON format.
@@ -58,83 +229,58 @@ def parse_agent_response(response: str) -> dict:
     both objects and arrays, and also plain JSON strings.
     If it's JSON, map the fields accordingly.
     If it's not JSON, return it as "answer" with other fields empty.
+
+    The JSON value is located without regexes (see _decode_json_value) and
+    decoded with orjson.
     """
-    # Try to extract JSON (object or array) from code block
-    codeblock_match = re.search(r'```(?:json)?\s*([\[{].*[\]}])\s*```', response, re.DOTALL)
-    if codeblock_match:
-        response = codeblock_match.group(1).strip()
-    else:
-        # If not in code block, try to extract a JSON object or array from the string
-        json_match = re.search(r'([\[{].*[\]}])', response, re.DOTALL)
-        if json_match:
-            response = json_match.group(1).strip()
-    try:
-        parsed_response = json.loads(response)
-        if isinstance(parsed_response, list) and len(parsed_response) > 0:
-            first_item = parsed_response[0]
-            if isinstance(first_item, dict):
-                answer = first_item.get("answer", "")
-                products = first_item.get("products", "")
-                image_output = first_item.get("image_output", "")
-                discount_percentage = first_item.get("discount_percentage", "")
-                cart = first_item.get("cart", [])
-                if products and not isinstance(products, str):
-                    products = json.dumps(products)
-                return {
-                    "answer": answer,
-                    "agent": "",
-                    "products": products,
-                    "discount_percentage": str(discount_percentage) if discount_percentage else "",
-                    "image_url": image_output,
-                    "additional_data": "",
-                    "cart": cart
-                }
-            else:
-                return {
-                    "answer": str(parsed_response),
-                    "agent": "",
-                    "products": "",
-                    "discount_percentage": "",
-                    "image_url": "",
-                    "additional_data": ""
-                }
-        elif isinstance(parsed_response, dict):
-            answer = parsed_response.get("answer", "")
-            if isinstance(answer, str) and answer.startswith('[') and answer.endswith(']'):
-                try:
-                    nested_json = json.loads(answer)
-                    if isinstance(nested_json, list) and len(nested_json) > 0:
-                        first_item = nested_json[0]
-                        if isinstance(first_item, dict) and "answer" in first_item:
-                            answer = first_item["answer"]
-                except json.JSONDecodeError:
-                    pass
-            return {
-                "answer": answer,
-                "agent": parsed_response.get("agent", ""),
-                "products": parsed_response.get("products", ""),
-                "discount_percentage": str(parsed_response.get("discount_percentage", "")) if parsed_response.get("discount_percentage") else "",
-                "image_url": parsed_response.get("image_url", ""),
-                "additional_data": parsed_response.get("additional_data", ""),
-                "cart": parsed_response.get("cart", [])
-            }
-        else:
-            return {
-                "answer": str(parsed_response),
-                "agent": "",
-                "products": "",
-                "discount_percentage": "",
-                "image_url": "",
-                "additional_data": "",
-                "cart": []
-            }
-    except (json.JSONDecodeError, TypeError) as e:
+    if not isinstance(response, str):
+        return _empty_agent_response(str(response))
+    parsed_response = _decode_json_value(response)
+    if parsed_response is None:
+        # A bare JSON scalar reply ("hello", 42) is answered with its value, unquoted
+        try:
+            scalar = orjson.loads(response.strip())
+        except orjson.JSONDecodeError:
+            return _empty_agent_response(response)
+        return _empty_agent_response(str(scalar))
+
+    # List format: [{"answer": ..., "products": [...], "image_output": ..., "cart": [...]}]
+    if isinstance(parsed_response, list):
+        first_item = parsed_response[0] if parsed_response else None
+        if not isinstance(first_item, dict):
+            return _empty_agent_response(str(parsed_response))
+        products = first_item.get("products", "")
+        if products and not isinstance(products, str):
+            products = fast_json_dumps(products)
+        discount_percentage = first_item.get("discount_percentage", "")
         return {
-            "answer": str(response),
+            "answer": first_item.get("answer", ""),
             "agent": "",
-            "products": "",
-            "discount_percentage": "",
-            "image_url": "",
+            "products": products,
+            "discount_percentage": str(discount_percentage) if discount_percentage else "",
+            "image_url": first_item.get("image_output", ""),
             "additional_data": "",
-            "cart": []
+            "cart": first_item.get("cart", [])
         }
+
+    # Dict format: {"answer": ..., "agent": ..., "products": ..., "image_url": ...}
+    answer = parsed_response.get("answer", "")
+    if isinstance(answer, str) and answer.startswith('[') and answer.endswith(']'):
+        try:
+            nested_json = orjson.loads(answer)
+            if isinstance(nested_json, list) and len(nested_json) > 0:
+                first_item = nested_json[0]
+                if isinstance(first_item, dict) and "answer" in first_item:
+                    answer = first_item["answer"]
+        except orjson.JSONDecodeError:
+            pass
+    discount_percentage = parsed_response.get("discount_percentage")
+    return {
+        "answer": answer,
+        "agent": parsed_response.get("agent", ""),
+        "products": parsed_response.get("products", ""),
+        "discount_percentage": str(discount_percentage) if discount_percentage else "",
+        "image_url": parsed_response.get("image_url", ""),
+        "additional_data": parsed_response.get("additional_data", ""),
+        "cart": parsed_response.get("cart", [])
+    }
@@ -1,14 +1,40 @@
 """
 Azure Storage utilities for Microsoft Foundry integration
 Provides helper functions for accessing Azure Blob Storage using Managed Identity
+
+StorageManager instances are process-wide: get_storage_manager() returns one
+cached manager per container, all sharing a single DefaultAzureCredential (so
+credential discovery and token acquisition happen once and the token is
+reused until it nears expiry) and a single pooled HTTP transport. The
+container client is created once per manager instead of per operation.
+AsyncStorageManager is the azure.storage.blob.aio counterpart for async code.
+
+Large objects are transferred in chunks: uploads above the single-transfer
+size are split into blocks and downloads into ranged GETs, with up to
+max_concurrency chunks in flight. download_blob_to() streams into a file or a
+caller-provided buffer instead of materializing the blob, and iter_blobs()
+lists lazily, one page at a time.
 """
 
+import asyncio
+import io
 import os
+import threading
+import uuid
+import weakref
+from email.utils import format_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from azure.core.pipeline.transport import RequestsTransport
 from azure.identity import DefaultAzureCredential, ManagedIdentityCredential
+from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
 from azure.storage.blob import BlobServiceClient, ContentSettings
-from azure.core.exceptions import ClientAuthenticationError
+from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
+from azure.core import MatchConditions
+from azure.core.exceptions import HttpResponseError, ResourceExistsError
 from dotenv import load_dotenv
-from typing import Optional, BinaryIO
+from typing import Dict, Iterator, Optional, BinaryIO
+from utils.disk_cache import Fetched, disk_cache
 import logging
 
 load_dotenv()
@@ -16,84 +42,179 @@ load_dotenv()
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Connection pool of the shared transport (per host, across all managers)
+STORAGE_POOL_CONNECTIONS = int(os.getenv("STORAGE_POOL_CONNECTIONS", "10"))
+STORAGE_POOL_MAXSIZE = int(os.getenv("STORAGE_POOL_MAXSIZE", "32"))
+
+# Chunked transfers: parallel chunks per transfer, chunk (block / range) size,
+# and the size up to which a blob is sent or fetched in a single request
+STORAGE_MAX_CONCURRENCY = int(os.getenv("STORAGE_MAX_CONCURRENCY", "4"))
+STORAGE_CHUNK_SIZE = int(os.getenv("STORAGE_CHUNK_SIZE", str(8 * 1024 * 1024)))
+STORAGE_SINGLE_TRANSFER_SIZE = int(os.getenv("STORAGE_SINGLE_TRANSFER_SIZE", str(32 * 1024 * 1024)))
+STORAGE_LIST_PAGE_SIZE = int(os.getenv("STORAGE_LIST_PAGE_SIZE", "1000"))
+
+_shared_lock = threading.Lock()
+_credential = None
+_transport = None
+
+
+def get_credential() -> DefaultAzureCredential:
+    """
+    Process-wide DefaultAzureCredential
+    
+    Credential discovery runs once and acquired tokens are cached by the
+    credential, so every client sharing it reuses the same token.
+    """
+    global _credential
+    with _shared_lock:
+        if _credential is None:
+            logger.info("Creating shared DefaultAzureCredential (Managed Identity)")
+            _credential = DefaultAzureCredential()
+        return _credential
+
+
+def get_shared_transport() -> RequestsTransport:
+    """
+    Process-wide HTTP transport with a pooled requests.Session
+    
+    Passed to every BlobServiceClient so all managers reuse the same
+    keep-alive connections.
+    """
+    global _transport
+    with _shared_lock:
+        if _transport is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=STORAGE_POOL_CONNECTIONS, pool_maxsize=STORAGE_POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _transport = RequestsTransport(session=session, session_owner=False)
+        return _transport
+
+
+def _resolve_account(storage_account_name: str = None, connection_string: str = None):
+    """
+    Pick the authentication method: an explicit connection string, then
+    Managed Identity for the configured account, then the connection string
+    from the environment (local development, Azurite).
+    
+    Returns:
+        (storage_account_name, connection_string) with exactly one set
+    """
+    if connection_string:
+        return "", connection_string
+    storage_account_name = storage_account_name or os.getenv("storage_account_name", "")
+    if storage_account_name:
+        return storage_account_name, ""
+    blob_connection_string = os.getenv("blob_connection_string", "")
+    if blob_connection_string:
+        logger.info("No storage account name configured, using connection string authentication")
+        return "", blob_connection_string
+    raise ValueError("storage_account_name or blob_connection_string is required")
+
+
 class StorageManager:
     """
     Manages Azure Blob Storage access with Managed Identity authentication
     """
     
-    def __init__(self, storage_account_name: str = None, container_name: str = None):
+    def __init__(
+        self,
+        storage_account_name: str = None,
+        container_name: str = None,
+        connection_string: str = None,
+        credential=None,
+        transport=None,
+        max_concurrency: int = STORAGE_MAX_CONCURRENCY,
+        chunk_size: int = STORAGE_CHUNK_SIZE,
+        single_transfer_size: int = STORAGE_SINGLE_TRANSFER_SIZE,
+    ):
         """
         Initialize StorageManager with authentication
         
         Args:
             storage_account_name: Azure Storage Account name
             container_name: Blob container name
+            connection_string: Connection string to use instead of Managed Identity
+            credential: Token credential (defaults to the shared DefaultAzureCredential)
+            transport: HTTP transport (defaults to the shared pooled transport)
+            max_concurrency: Default number of chunks transferred in parallel
+            chunk_size: Block size for uploads and range size for downloads
+            single_transfer_size: Blobs up to this size use a single request
         """
-        self.storage_account_name = storage_account_name or os.getenv("storage_account_name", "")
+        self.storage_account_name, self.connection_string = _resolve_account(storage_account_name, connection_string)
         self.container_name = container_name or os.getenv("storage_container_name", "zava")
-        self.blob_service_client = self._create_blob_service_client()
+        self.max_concurrency = max_concurrency
+        self._transfer_options = {
+            "max_block_size": chunk_size,
+            "max_single_put_size": single_transfer_size,
+            "max_chunk_get_size": chunk_size,
+            "max_single_get_size": single_transfer_size,
+        }
+        self.blob_service_client = self._create_blob_service_client(credential, transport or get_shared_transport())
+        self.container_client = self.blob_service_client.get_container_client(self.container_name)
     
-    def _create_blob_service_client(self) -> BlobServiceClient:
+    def _create_blob_service_client(self, credential, transport) -> BlobServiceClient:
         """
         Create BlobServiceClient with appropriate authentication method
         
         Returns:
             Configured BlobServiceClient instance
         """
-        if not self.storage_account_name:
-            raise ValueError("storage_account_name is required")
+        if self.connection_string:
+            return BlobServiceClient.from_connection_string(
+                self.connection_string, transport=transport, **self._transfer_options
+            )
         
         account_url = f"https://{self.storage_account_name}.blob.core.windows.net"
-        
-        try:
-            # Try Managed Identity first (works in Microsoft Foundry, App Service, etc.)
-            logger.info("Attempting authentication with DefaultAzureCredential (Managed Identity)")
-            credential = DefaultAzureCredential()
-            return BlobServiceClient(account_url=account_url, credential=credential)
-            
-        except ClientAuthenticationError as e:
-            logger.warning(f"Managed Identity authentication failed: {e}")
-            
-            # Fallback to connection string for local development
-            blob_connection_string = os.getenv("blob_connection_string", "")
-            if blob_connection_string:
-                logger.info("Falling back to connection string authentication")
-                return BlobServiceClient.from_connection_string(blob_connection_string)
-            else:
-                logger.error("No valid authentication method available")
-                raise Exception("No valid authentication method available for Azure Blob Storage")
+        # Managed Identity (works in Microsoft Foundry, App Service, etc.)
+        return BlobServiceClient(
+            account_url=account_url,
+            credential=credential or get_credential(),
+            transport=transport,
+            **self._transfer_options,
+        )
     
-    def upload_blob(self, blob_name: str, data: BinaryIO, content_type: str = None, overwrite: bool = True) -> str:
+    def upload_blob(
+        self,
+        blob_name: str,
+        data: BinaryIO,
+        content_type: str = None,
+        overwrite: bool = True,
+        max_concurrency: int = None,
+    ) -> str:
         """
         Upload a blob to the container
         
+        Data larger than the single-transfer size is uploaded as blocks, up
+        to max_concurrency at a time, and committed with one block list.
+        
         Args:
             blob_name: Name for the blob
-            data: Binary data to upload
+            data: Binary data to upload (bytes or a readable stream)
             content_type: MIME type of the content
             overwrite: Whether to overwrite existing blob
+            max_concurrency: Parallel block uploads (defaults to the manager's setting)
             
         Returns:
             URL of the uploaded blob
         """
         try:
-            container_client = self.blob_service_client.get_container_client(self.container_name)
-            
             # Set content settings if content_type is provided
             content_settings = None
             if content_type:
                 content_settings = ContentSettings(content_type=content_type)
             
             # Upload the blob
-            container_client.upload_blob(
+            self.container_client.upload_blob(
                 name=blob_name,
                 data=data,
                 overwrite=overwrite,
-                content_settings=content_settings
+                content_settings=content_settings,
+                max_concurrency=max_concurrency or self.max_concurrency,
             )
             
             # Return the blob URL
-            blob_url = f"https://{self.storage_account_name}.blob.core.windows.net/{self.container_name}/{blob_name}"
+            blob_url = self.get_blob_url(blob_name)
             logger.info(f"Successfully uploaded blob: {blob_url}")
             return blob_url
             
@@ -101,21 +222,68 @@ class StorageManager:
             logger.error(f"Error uploading blob '{blob_name}': {e}")
             raise
     
-    def download_blob(self, blob_name: str) -> bytes:
+    def upload_blob_if_absent(
+        self, blob_name: str, data: BinaryIO, content_type: str = None, max_concurrency: int = None
+    ) -> str:
+        """
+        Upload a blob unless one with the same name already exists
+        
+        Meant for content-addressed blob names, where an existing blob already
+        holds the same bytes and the upload can be skipped.
+        
+        Args:
+            blob_name: Name for the blob
+            data: Binary data to upload
+            content_type: MIME type of the content
+            max_concurrency: Parallel block uploads (defaults to the manager's setting)
+            
+        Returns:
+            URL of the new or existing blob
+        """
+        content_settings = ContentSettings(content_type=content_type) if content_type else None
+        try:
+            self.container_client.upload_blob(
+                name=blob_name,
+                data=data,
+                overwrite=False,
+                content_settings=content_settings,
+                max_concurrency=max_concurrency or self.max_concurrency,
+            )
+            logger.info(f"Successfully uploaded blob: {blob_name}")
+        except ResourceExistsError:
+            logger.info(f"Blob already stored, skipped upload: {blob_name}")
+        return self.get_blob_url(blob_name)
+    
+    def get_blob_url(self, blob_name: str) -> str:
+        """
+        Get the URL of a blob in the container
+        
+        Args:
+            blob_name: Name of the blob
+            
+        Returns:
+            Blob URL
+        """
+        return self.container_client.get_blob_client(blob_name).url
+    
+    def download_blob(self, blob_name: str, max_concurrency: int = None) -> bytes:
         """
         Download a blob from the container
         
+        Large blobs are fetched as parallel ranged requests; use
+        download_blob_to() to avoid holding the whole blob in memory.
+        
         Args:
             blob_name: Name of the blob to download
+            max_concurrency: Parallel range requests (defaults to the manager's setting)
             
         Returns:
             Blob content as bytes
         """
         try:
-            container_client = self.blob_service_client.get_container_client(self.container_name)
-            blob_client = container_client.get_blob_client(blob_name)
+            blob_client = self.container_client.get_blob_client(blob_name)
             
-            blob_data = blob_client.download_blob().readall()
+            blob_data = blob_client.download_blob(max_concurrency=max_concurrency or self.max_concurrency).readall()
             logger.info(f"Successfully downloaded blob: {blob_name}")
             return blob_data
             
@@ -123,6 +291,101 @@ class StorageManager:
             logger.error(f"Error downloading blob '{blob_name}': {e}")
             raise
     
+    def download_blob_cached(self, blob_name: str) -> bytes:
+        """
+        Download a blob through the local disk cache
+        
+        Repeat reads are served from disk; once the cached copy is older than
+        the freshness window it is revalidated by ETag, which costs a 304
+        instead of a download when the blob is unchanged.
+        
+        Args:
+            blob_name: Name of the blob to download
+            
+        Returns:
+            Blob content as bytes
+        """
+        blob_client = self.container_client.get_blob_client(blob_name)
+        
+        def fetch(validators: Dict[str, str]) -> Fetched:
+            conditions = {}
+            if "etag" in validators:
+                conditions = {"etag": validators["etag"], "match_condition": MatchConditions.IfModified}
+            try:
+                downloader = blob_client.download_blob(max_concurrency=self.max_concurrency, **conditions)
+            except HttpResponseError as e:
+                # The storage layer surfaces 304 as a plain HttpResponseError
+                if e.status_code == 304:
+                    return Fetched(not_modified=True)
+                raise
+            properties = downloader.properties
+            return Fetched(
+                data=downloader.readall(),
+                etag=properties.etag,
+                last_modified=format_datetime(properties.last_modified, usegmt=True) if properties.last_modified else None,
+                content_type=properties.content_settings.content_type,
+            )
+        
+        return disk_cache.get_or_fetch(blob_client.url, fetch)
+    
+    def download_blob_to(self, blob_name: str, target, max_concurrency: int = None) -> int:
+        """
+        Stream a blob into a file or buffer without materializing it
+        
+        Chunks are written at their offsets as the parallel range requests
+        complete. A path is written to a temporary file and renamed into
+        place, so readers never see a partial download.
+        
+        Args:
+            blob_name: Name of the blob to download
+            target: File path, seekable binary stream, or writable buffer
+                (bytearray, memoryview, ...) at least as large as the blob
+            max_concurrency: Parallel range requests (defaults to the manager's setting)
+            
+        Returns:
+            Number of bytes written
+        """
+        blob_client = self.container_client.get_blob_client(blob_name)
+        downloader = blob_client.download_blob(max_concurrency=max_concurrency or self.max_concurrency)
+        
+        if isinstance(target, (str, os.PathLike)):
+            partial_path = f"{os.fspath(target)}.{uuid.uuid4().hex}.part"
+            try:
+                with open(partial_path, "wb") as file:
+                    size = downloader.readinto(file)
+                os.replace(partial_path, target)
+            except BaseException:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                raise
+        elif hasattr(target, "write"):
+            size = downloader.readinto(target)
+        else:
+            size = downloader.readinto(_BufferWriter(target, downloader.size))
+        logger.info(f"Successfully downloaded blob: {blob_name} ({size} bytes)")
+        return size
+    
+    def iter_blobs(self, name_starts_with: str = None, page_size: int = None) -> Iterator:
+        """
+        Lazily iterate over the blobs in the container
+        
+        Pages of page_size results are requested only as iteration reaches
+        them, so large containers are never listed in full up front.
+        
+        Args:
+            name_starts_with: Optional prefix filter
+            page_size: Results per list request
+            
+        Yields:
+            BlobProperties (name, size, etag, last_modified, content_settings, ...)
+        """
+        pages = self.container_client.list_blobs(
+            name_starts_with=name_starts_with,
+            results_per_page=page_size or STORAGE_LIST_PAGE_SIZE,
+        ).by_page()
+        for page in pages:
+            yield from page
+    
     def list_blobs(self, name_starts_with: str = None) -> list:
         """
         List blobs in the container
@@ -134,10 +397,7 @@ class StorageManager:
             List of blob names
         """
         try:
-            container_client = self.blob_service_client.get_container_client(self.container_name)
-            blob_list = container_client.list_blobs(name_starts_with=name_starts_with)
-            
-            blob_names = [blob.name for blob in blob_list]
+            blob_names = [blob.name for blob in self.iter_blobs(name_starts_with)]
             logger.info(f"Found {len(blob_names)} blobs in container '{self.container_name}'")
             return blob_names
             
@@ -156,8 +416,7 @@ class StorageManager:
             True if deletion was successful
         """
         try:
-            container_client = self.blob_service_client.get_container_client(self.container_name)
-            blob_client = container_client.get_blob_client(blob_name)
+            blob_client = self.container_client.get_blob_client(blob_name)
             
             blob_client.delete_blob()
             logger.info(f"Successfully deleted blob: {blob_name}")
@@ -167,14 +426,193 @@ class StorageManager:
             logger.error(f"Error deleting blob '{blob_name}': {e}")
             raise
 
-def get_storage_manager() -> StorageManager:
+
+class _BufferWriter(io.RawIOBase):
+    """Seekable write-only stream over a caller-provided buffer"""
+    
+    def __init__(self, buffer, required_size: int):
+        self._view = memoryview(buffer).cast("B")
+        if len(self._view) < required_size:
+            raise ValueError(f"Buffer of {len(self._view)} bytes is too small for {required_size} bytes")
+        self._position = 0
+    
+    def writable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = base + offset
+        return self._position
+    
+    def write(self, data) -> int:
+        end = self._position + len(data)
+        self._view[self._position:end] = data
+        self._position = end
+        return len(data)
+
+
+class AsyncStorageManager:
     """
-    Get a configured StorageManager instance
+    azure.storage.blob.aio counterpart of StorageManager for async callers
+    
+    Its HTTP session is bound to the event loop it is first used on; use
+    get_async_storage_manager() to get the instance for the running loop.
+    """
+    
+    def __init__(
+        self,
+        storage_account_name: str = None,
+        container_name: str = None,
+        connection_string: str = None,
+        credential=None,
+        max_concurrency: int = STORAGE_MAX_CONCURRENCY,
+        chunk_size: int = STORAGE_CHUNK_SIZE,
+        single_transfer_size: int = STORAGE_SINGLE_TRANSFER_SIZE,
+    ):
+        self.storage_account_name, self.connection_string = _resolve_account(storage_account_name, connection_string)
+        self.container_name = container_name or os.getenv("storage_container_name", "zava")
+        self.max_concurrency = max_concurrency
+        transfer_options = {
+            "max_block_size": chunk_size,
+            "max_single_put_size": single_transfer_size,
+            "max_chunk_get_size": chunk_size,
+            "max_single_get_size": single_transfer_size,
+        }
+        self._credential = None
+        if self.connection_string:
+            self.blob_service_client = AsyncBlobServiceClient.from_connection_string(
+                self.connection_string, **transfer_options
+            )
+        else:
+            if credential is None:
+                # Owned by this manager: async credentials hold loop-bound sessions
+                credential = self._credential = AsyncDefaultAzureCredential()
+            self.blob_service_client = AsyncBlobServiceClient(
+                account_url=f"https://{self.storage_account_name}.blob.core.windows.net",
+                credential=credential,
+                **transfer_options,
+            )
+        self.container_client = self.blob_service_client.get_container_client(self.container_name)
+    
+    async def upload_blob(
+        self, blob_name: str, data, content_type: str = None, overwrite: bool = True, max_concurrency: int = None
+    ) -> str:
+        content_settings = ContentSettings(content_type=content_type) if content_type else None
+        await self.container_client.upload_blob(
+            name=blob_name,
+            data=data,
+            overwrite=overwrite,
+            content_settings=content_settings,
+            max_concurrency=max_concurrency or self.max_concurrency,
+        )
+        logger.info(f"Successfully uploaded blob: {blob_name}")
+        return self.get_blob_url(blob_name)
+    
+    async def upload_blob_if_absent(
+        self, blob_name: str, data, content_type: str = None, max_concurrency: int = None
+    ) -> str:
+        try:
+            return await self.upload_blob(blob_name, data, content_type, overwrite=False, max_concurrency=max_concurrency)
+        except ResourceExistsError:
+            logger.info(f"Blob already stored, skipped upload: {blob_name}")
+            return self.get_blob_url(blob_name)
+    
+    def get_blob_url(self, blob_name: str) -> str:
+        return self.container_client.get_blob_client(blob_name).url
+    
+    async def download_blob(self, blob_name: str, max_concurrency: int = None) -> bytes:
+        downloader = await self.container_client.get_blob_client(blob_name).download_blob(
+            max_concurrency=max_concurrency or self.max_concurrency
+        )
+        return await downloader.readall()
+    
+    async def iter_blobs(self, name_starts_with: str = None, page_size: int = None):
+        pages = self.container_client.list_blobs(
+            name_starts_with=name_starts_with,
+            results_per_page=page_size or STORAGE_LIST_PAGE_SIZE,
+        ).by_page()
+        async for page in pages:
+            async for blob in page:
+                yield blob
+    
+    async def list_blobs(self, name_starts_with: str = None) -> list:
+        return [blob.name async for blob in self.iter_blobs(name_starts_with)]
+    
+    async def delete_blob(self, blob_name: str) -> bool:
+        await self.container_client.get_blob_client(blob_name).delete_blob()
+        logger.info(f"Successfully deleted blob: {blob_name}")
+        return True
+    
+    async def close(self) -> None:
+        await self.blob_service_client.close()
+        if self._credential is not None:
+            await self._credential.close()
+
+
+_managers: Dict[str, StorageManager] = {}
+# Event loop -> container -> manager. Keyed by the loop object itself: a new
+# loop may reuse the id() of a closed one, whose aiohttp sessions are dead
+_async_managers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, AsyncStorageManager]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_storage_manager(container_name: str = None) -> StorageManager:
+    """
+    Get the process-wide StorageManager for a container
+    
+    The first call creates it; later calls return the same instance, so the
+    credential, token, transport and container client are reused.
+    
+    Args:
+        container_name: Blob container name (defaults to storage_container_name)
     
     Returns:
         StorageManager instance ready for use
     """
-    return StorageManager()
+    container_name = container_name or os.getenv("storage_container_name", "zava")
+    manager = _managers.get(container_name)
+    if manager is None:
+        manager = StorageManager(container_name=container_name)
+        with _shared_lock:
+            manager = _managers.setdefault(container_name, manager)
+    return manager
+
+
+def get_async_storage_manager(container_name: str = None) -> AsyncStorageManager:
+    """
+    Get the AsyncStorageManager for a container on the running event loop
+    
+    Must be called from a coroutine.
+    """
+    container_name = container_name or os.getenv("storage_container_name", "zava")
+    loop_managers = _async_managers.setdefault(asyncio.get_running_loop(), {})
+    manager = loop_managers.get(container_name)
+    if manager is None:
+        manager = loop_managers[container_name] = AsyncStorageManager(container_name=container_name)
+    return manager
+
+
+async def close_async_storage_managers() -> None:
+    """Close the async managers of the running event loop (call on shutdown)."""
+    for manager in _async_managers.pop(asyncio.get_running_loop(), {}).values():
+        await manager.close()
+
+
+def reset_storage_managers() -> None:
+    """Drop the cached managers, credential and transport (tests, credential rotation)."""
+    global _credential, _transport
+    with _shared_lock:
+        _managers.clear()
+        _async_managers.clear()
+        _credential = None
+        _transport = None
 
 # Convenience function for quick access
 def upload_file_to_blob(file_path: str, blob_name: str = None, content_type: str = None) -> str:
@@ -0,0 +1,293 @@
+"""
+Incremental JSON extraction for streamed agent responses.
+
+Agents answer with JSON such as [{"answer": "...", "products": [...], "cart": [...]}],
+possibly wrapped in a ```json code fence or preceded by a short sentence. The
+parser below consumes the reply chunk by chunk, resumes where the previous
+chunk stopped, and reports:
+
+- the "answer" string progressively, as soon as its characters arrive
+- every other top-level field (products, cart, discount_percentage, ...) once its value closes
+- the completed response object once it closes
+"""
+import logging
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = " \t\r\n"
+
+
+class StreamEvent(NamedTuple):
+    """Event produced by AgentResponseStreamParser.feed."""
+
+    kind: str  # "answer_delta", "field" or "complete"
+    name: Optional[str]
+    value: Any
+
+
+class AgentResponseStreamParser:
+    """
+    Resumable, single-pass extractor for streamed agent JSON replies.
+
+    Every character is scanned once: the scan position is kept between calls
+    and consumed text is dropped from the buffer, except for the value that is
+    currently being captured.
+    """
+
+    def __init__(self, stream_field: str = "answer"):
+        self.stream_field = stream_field
+        self.fields: Dict[str, Any] = {}
+        self.answer = ""
+        self.done = False
+
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self._stack: List[list] = []  # frames: [is_object, expect_key, key]
+        self._target_depth: Optional[int] = None
+        self._target_closed = False
+
+        self._in_string = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._streaming = False
+        self._emitted = 0
+
+        self._value_start = -1
+        self._value_key: Optional[str] = None
+
+    def feed(self, chunk: str) -> List[StreamEvent]:
+        """Consume the next chunk of the reply and return the events it completes."""
+        events: List[StreamEvent] = []
+        if self.done or not chunk:
+            return events
+        self._buffer += chunk
+        if not self._started and not self._seek_start():
+            return events
+        self._scan(events)
+        self._compact()
+        return events
+
+    @property
+    def started(self) -> bool:
+        """True once the start of the JSON value has been located."""
+        return self._started
+
+    # ------------------------------------------------------------------
+    # Scanning
+    # ------------------------------------------------------------------
+    def _seek_start(self) -> bool:
+        """Skip leading prose and code fences up to the first plausible JSON value."""
+        buffer = self._buffer
+        length = len(buffer)
+        i = self._pos
+        while i < length:
+            char = buffer[i]
+            if char in "[{":
+                j = i + 1
+                while j < length and buffer[j] in _WHITESPACE:
+                    j += 1
+                if j == length:
+                    # Need the next significant character to decide
+                    self._pos = i
+                    return False
+                following = buffer[j]
+                if (char == "{" and following in '"}') or (
+                    char == "[" and following in '{["]'
+                ):
+                    self._started = True
+                    self._pos = i
+                    return True
+            i += 1
+        self._pos = i
+        return False
+
+    def _scan(self, events: List[StreamEvent]) -> None:
+        buffer = self._buffer
+        length = len(buffer)
+        i = self._pos
+        stack = self._stack
+
+        while i < length and not self.done:
+            if self._in_string:
+                i = self._scan_string(i, events)
+                if self._in_string:
+                    break
+                continue
+
+            char = buffer[i]
+            depth = len(stack)
+            at_target = (
+                self._target_depth is not None
+                and not self._target_closed
+                and depth == self._target_depth
+            )
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i + 1
+                self._string_is_key = bool(stack) and stack[-1][0] and stack[-1][1]
+                if at_target and not self._string_is_key:
+                    self._value_start = i
+                    self._value_key = stack[-1][2]
+                    if self._value_key == self.stream_field:
+                        self._streaming = True
+                        self._emitted = i + 1
+                i += 1
+                continue
+
+            if char in "{[":
+                if at_target and not stack[-1][1]:
+                    self._value_start = i
+                    self._value_key = stack[-1][2]
+                stack.append([char == "{", char == "{", None])
+                if (
+                    self._target_depth is None
+                    and char == "{"
+                    and (len(stack) == 1 or (len(stack) == 2 and not stack[0][0]))
+                ):
+                    self._target_depth = len(stack)
+            elif char in "}]":
+                if at_target:
+                    self._finish_scalar(i, events)
+                stack.pop()
+                new_depth = len(stack)
+                if (
+                    self._target_depth is not None
+                    and not self._target_closed
+                ):
+                    if new_depth == self._target_depth and self._value_start >= 0:
+                        self._emit_field(
+                            buffer[self._value_start:i + 1], events
+                        )
+                    elif new_depth == self._target_depth - 1:
+                        self._target_closed = True
+                        events.append(StreamEvent("complete", None, dict(self.fields)))
+                if not stack:
+                    self.done = True
+            elif char == ",":
+                if at_target:
+                    self._finish_scalar(i, events)
+                if stack and stack[-1][0]:
+                    stack[-1][1] = True
+            elif char == ":":
+                pass
+            elif char not in _WHITESPACE:
+                if at_target and self._value_start < 0 and not stack[-1][1]:
+                    # Start of a number / true / false / null
+                    self._value_start = i
+                    self._value_key = stack[-1][2]
+            i += 1
+
+        self._pos = i
+
+    def _scan_string(self, i: int, events: List[StreamEvent]) -> int:
+        """Advance through a string; returns the position after it, or where input ran out."""
+        buffer = self._buffer
+        length = len(buffer)
+        quote = buffer.find('"', i)
+        backslash = buffer.find("\\", i)
+        while True:
+            if backslash != -1 and (quote == -1 or backslash < quote):
+                step = 6 if buffer[backslash + 1:backslash + 2] == "u" else 2
+                if backslash + step > length:
+                    i = backslash
+                    break
+                i = backslash + step
+                backslash = buffer.find("\\", i)
+                if quote != -1 and quote < i:
+                    quote = buffer.find('"', i)
+                continue
+            if quote == -1:
+                i = length
+                break
+            # Closing quote found
+            raw = buffer[self._string_start:quote]
+            self._in_string = False
+            if self._streaming:
+                self._emit_answer(buffer[self._emitted:quote], events)
+                self._streaming = False
+            if self._string_is_key:
+                frame = self._stack[-1]
+                frame[2] = self._decode(raw)
+                frame[1] = False
+            elif self._value_start >= 0 and len(self._stack) == self._target_depth:
+                self._emit_field(buffer[self._value_start:quote + 1], events)
+            return quote + 1
+
+        if self._streaming:
+            safe_end = i
+            # Hold back a high surrogate until its low half arrives
+            escape = safe_end - 6
+            if escape >= self._emitted and buffer[escape:escape + 2] == "\\u":
+                code = buffer[escape + 2:safe_end].lower()
+                if "d800" <= code <= "dbff" and self._is_escape(escape):
+                    safe_end = escape
+            if safe_end > self._emitted:
+                self._emit_answer(buffer[self._emitted:safe_end], events)
+                self._emitted = safe_end
+        return i
+
+    # ------------------------------------------------------------------
+    # Emission helpers
+    # ------------------------------------------------------------------
+    def _emit_answer(self, raw: str, events: List[StreamEvent]) -> None:
+        if not raw:
+            return
+        text = self._decode(raw)
+        if text:
+            self.answer += text
+            events.append(StreamEvent("answer_delta", self.stream_field, text))
+
+    def _emit_field(self, raw: str, events: List[StreamEvent]) -> None:
+        key = self._value_key
+        self._value_start = -1
+        self._value_key = None
+        if key is None:
+            return
+        try:
+            value = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            logger.warning(f"Could not decode streamed field '{key}'")
+            return
+        self.fields[key] = value
+        events.append(StreamEvent("field", key, value))
+
+    def _finish_scalar(self, end: int, events: List[StreamEvent]) -> None:
+        if self._value_start >= 0:
+            self._emit_field(self._buffer[self._value_start:end].strip(), events)
+
+    def _is_escape(self, position: int) -> bool:
+        """True if the backslash at position starts an escape (is not itself escaped)."""
+        run = 0
+        while position - run - 1 >= self._string_start and self._buffer[position - run - 1] == "\\":
+            run += 1
+        return run % 2 == 0
+
+    @staticmethod
+    def _decode(raw: str) -> str:
+        try:
+            return orjson.loads(f'"{raw}"')
+        except orjson.JSONDecodeError:
+            return raw
+
+    def _compact(self) -> None:
+        """Drop consumed text so the buffer only holds the value in progress."""
+        keep_from = self._pos
+        if self._in_string:
+            keep_from = min(keep_from, self._string_start)
+        if self._streaming:
+            keep_from = min(keep_from, self._emitted)
+        if self._value_start >= 0:
+            keep_from = min(keep_from, self._value_start)
+        if keep_from <= 0:
+            return
+        self._buffer = self._buffer[keep_from:]
+        self._pos -= keep_from
+        self._string_start -= keep_from
+        self._emitted -= keep_from
+        if self._value_start >= 0:
+            self._value_start -= keep_from
@@ -0,0 +1,33 @@
+"""
+Process-wide telemetry setup.
+
+configure_azure_monitor and the OpenAI instrumentor must run exactly once per
+process. With several uvicorn workers every worker is its own process, so each
+one calls configure_telemetry() at startup; repeated calls in the same process
+(chat_app and agent_processor both need telemetry) are no-ops.
+"""
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+_configured_pid = None
+_lock = threading.Lock()
+
+
+def configure_telemetry() -> None:
+    """Configure Azure Monitor and OpenAI instrumentation once for the current process."""
+    global _configured_pid
+    with _lock:
+        if _configured_pid == os.getpid():
+            return
+        from azure.monitor.opentelemetry import configure_azure_monitor
+        from opentelemetry.instrumentation.openai_v2 import OpenAIInstrumentor
+
+        configure_azure_monitor(
+            connection_string=os.environ["APPLICATIONINSIGHTS_CONNECTION_STRING"]
+        )
+        OpenAIInstrumentor().instrument()
+        _configured_pid = os.getpid()
+        logger.info(f"Telemetry configured for process {_configured_pid}")